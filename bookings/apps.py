@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class BookingsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'bookings'
+
+    def ready(self):
+        # connects the signal receivers invalidating the office cache and
+        # updating the squad presence index
+        from bookings import cache, presence  # noqa: F401
@@ -0,0 +1,97 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Max
+
+from bookings.models import ArchivedBooking, Booking
+
+ARCHIVED_UNTIL_KEY = "bookings:archived-until"
+
+
+def get_archived_until():
+    """The date of the latest archived booking, ``None`` while there is none."""
+    # wrapped so that an empty archive is cached too
+    archived_until = cache.get(ARCHIVED_UNTIL_KEY)
+    if archived_until is None:
+        # read from the primary, a replica may not have the latest batch yet
+        archived = ArchivedBooking.objects.using(DEFAULT_DB_ALIAS)
+        archived_until = (archived.aggregate(date=Max("date"))["date"],)
+        cache.set(
+            ARCHIVED_UNTIL_KEY, archived_until, settings.BOOKINGS_ARCHIVE_CACHE_TIMEOUT
+        )
+    return archived_until[0]
+
+
+def get_archived_dates(user, dates):
+    """The ``dates`` on which ``user`` has archived bookings.
+
+    Archived bookings are out of reach of the uniqueness of a user's dates
+    in ``Booking``, so new bookings on past dates are checked against them.
+    """
+    archived_until = get_archived_until()
+    dates = {day for day in dates if day is not None}
+    if archived_until is None or not dates or min(dates) > archived_until:
+        return set()
+    return set(
+        ArchivedBooking.objects.filter(user=user, date__in=dates).values_list(
+            "date", flat=True
+        )
+    )
+
+
+def filter_archive(filters, after=None):
+    """Archived bookings matching the ``BookingFilter`` lookups in ``filters``.
+
+    Returns ``None`` when the dates asked for, or those after the ``(date,
+    uuid)`` key of the ``after`` cursor, all come after the archive.
+    """
+    dates_from = [filters.get("date"), filters.get("date__gte"), after and after[0]]
+    date_from = max(filter(None, dates_from), default=None)
+    archived_until = get_archived_until()
+    if archived_until is None or (date_from is not None and date_from > archived_until):
+        return None
+    archived = ArchivedBooking.objects.all()
+    for name in ("office_id", "user__squad", "date", "date__gte", "date__lte"):
+        if filters.get(name) is not None:
+            archived = archived.filter(**{name: filters[name]})
+    return archived
+
+
+def as_bookings(archived):
+    """Archived bookings as unsaved ``Booking`` instances, to be resolved and
+    merged like any other."""
+    for row in archived:
+        yield Booking(
+            uuid=row.uuid, office_id=row.office_id, user_id=row.user_id, date=row.date
+        )
+
+
+def archive_bookings(before, batch_size=1000, progress=None):
+    """Move the bookings dated before ``before`` to the archive, oldest first.
+
+    Each batch is copied and deleted in one transaction, so that bookings
+    are always in exactly one of the tables. ``progress`` is called with
+    the bookings moved so far after each batch. Returns how many moved.
+    """
+    bookings = Booking.objects.filter(date__lt=before).order_by("date", "uuid")
+    moved = 0
+    while True:
+        with transaction.atomic():
+            batch = list(bookings[:batch_size])
+            if not batch:
+                break
+            ArchivedBooking.objects.bulk_create(
+                ArchivedBooking(
+                    uuid=booking.uuid,
+                    office_id=booking.office_id,
+                    user_id=booking.user_id,
+                    date=booking.date,
+                )
+                for booking in batch
+            )
+            Booking.objects.filter(pk__in=[booking.pk for booking in batch]).delete()
+        cache.delete(ARCHIVED_UNTIL_KEY)
+        moved += len(batch)
+        if progress is not None:
+            progress(moved)
+    return moved
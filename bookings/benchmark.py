@@ -0,0 +1,148 @@
+import json
+import random
+import resource
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from io import StringIO
+from itertools import islice
+from math import ceil
+from uuid import uuid4
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test.utils import (
+    override_settings,
+    setup_test_environment,
+    teardown_test_environment,
+)
+from graphql_auth.models import UserStatus
+from graphql_jwt.settings import jwt_settings
+from graphql_jwt.shortcuts import get_token
+
+from bookings.models import Booking, Office
+
+PASSWORD = "benchmark_password123"
+
+BATCH_SIZE = 5000
+
+
+@contextmanager
+def test_database():
+    """Run the block against a throwaway copy of the schema.
+
+    Benchmarks seed and write plenty of rows, which must never land in the
+    database the app is configured with. Reads go to the throwaway database
+    too rather than to the replicas of the real one.
+    """
+    setup_test_environment()
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        with override_settings(DATABASE_REPLICAS=[]):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def batches(objs, size=BATCH_SIZE):
+    objs = iter(objs)
+    while batch := list(islice(objs, size)):
+        yield batch
+
+
+def create_org(users, bookings, offices=50, start=None, seed=0):
+    """Bulk insert a synthetic org and return its offices and users.
+
+    Bookings are spread evenly over the users, each booking consecutive
+    days from ``start`` in a random office. All users share one password,
+    ``PASSWORD``, hashed once.
+    """
+    rng = random.Random(seed)
+    start = start or date.today()
+    User = get_user_model()
+    squads = User.Squad.values
+    password = make_password(PASSWORD)
+    with transaction.atomic():
+        offices = Office.objects.bulk_create(
+            Office(uuid=uuid4(), name="office %03d" % i) for i in range(offices)
+        )
+        for batch in batches(
+            User(
+                username="user%07d" % i,
+                email="user%07d@example.com" % i,
+                password=password,
+                squad=squads[i % len(squads)],
+            )
+            for i in range(users)
+        ):
+            User.objects.bulk_create(batch)
+        # SQLite doesn't return the ids of bulk inserted rows
+        users = list(User.objects.filter(username__startswith="user").order_by("id"))
+        for batch in batches(UserStatus(user=user, verified=True) for user in users):
+            UserStatus.objects.bulk_create(batch)
+
+        per_user = -(-bookings // len(users))
+        rows = (
+            Booking(
+                uuid=uuid4(),
+                user_id=user.id,
+                office_id=rng.choice(offices).uuid,
+                date=start + timedelta(days=day),
+            )
+            for day in range(per_user)
+            for user in users
+        )
+        for batch in batches(islice(rows, bookings)):
+            Booking.objects.bulk_create(batch)
+        call_command("rebuild_occupancy", stdout=StringIO())
+    return offices, users
+
+
+def authorization(user):
+    return "%s %s" % (jwt_settings.JWT_AUTH_HEADER_PREFIX, get_token(user))
+
+
+def percentile(latencies, percent):
+    """Nearest-rank percentile of sorted ``latencies``."""
+    return latencies[max(ceil(len(latencies) * percent / 100) - 1, 0)]
+
+
+def summarize(latencies, elapsed=None, errors=0):
+    """Latency percentiles in milliseconds and throughput of one run."""
+    latencies = sorted(latencies)
+    summary = {"requests": len(latencies), "errors": errors}
+    if elapsed is not None:
+        summary["qps"] = round(len(latencies) / elapsed, 1)
+    if latencies:
+        for percent in (50, 95, 99):
+            summary["p%s_ms" % percent] = round(
+                percentile(latencies, percent) * 1000, 2
+            )
+        summary["max_ms"] = round(latencies[-1] * 1000, 2)
+    return summary
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+class Timer:
+    def __init__(self):
+        self.latencies = []
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+
+def dump(results):
+    return json.dumps(results, indent=2)
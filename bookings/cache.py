@@ -0,0 +1,84 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from bookings.models import Office
+
+VERSION_KEY = "offices:version"
+
+
+def get_cache():
+    return caches[settings.OFFICE_CACHE_ALIAS]
+
+
+def new_version():
+    # never reuse the version of entries that outlived an evicted counter
+    return time.time_ns()
+
+
+def get_version():
+    cache = get_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, new_version(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def make_key(version, name):
+    return "offices:%s:%s" % (version, name)
+
+
+def get_offices():
+    """Return every office but retired ones ordered by name, from the cache
+    when possible."""
+    cache = get_cache()
+    key = make_key(get_version(), "all")
+    offices = cache.get(key)
+    if offices is None:
+        # a lagging replica would cache rows older than the version
+        offices = list(
+            Office.objects.using(DEFAULT_DB_ALIAS)
+            .filter(retired_at__isnull=True)
+            .order_by("name", "uuid")
+        )
+        cache.set(key, offices, settings.OFFICE_CACHE_TIMEOUT)
+    return offices
+
+
+def get_offices_by_uuid(uuids):
+    """Map each of ``uuids`` to its office, loading only uncached ones."""
+    cache = get_cache()
+    version = get_version()
+    keys = {make_key(version, uuid): uuid for uuid in uuids}
+    offices = {keys[key]: office for key, office in cache.get_many(keys).items()}
+    missing = [uuid for uuid in uuids if uuid not in offices]
+    if missing:
+        loaded = Office.objects.using(DEFAULT_DB_ALIAS).in_bulk(missing)
+        cache.set_many(
+            {make_key(version, uuid): office for uuid, office in loaded.items()},
+            settings.OFFICE_CACHE_TIMEOUT,
+        )
+        offices.update(loaded)
+    return offices
+
+
+def invalidate_offices():
+    # entries of older versions are never read again and simply expire
+    cache = get_cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, new_version(), None)
+
+
+@receiver(post_save, sender=Office)
+@receiver(post_delete, sender=Office)
+def office_changed(sender, **kwargs):
+    invalidate_offices()
+    # readers may have cached the old row again before the write committed
+    transaction.on_commit(invalidate_offices)
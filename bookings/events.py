@@ -0,0 +1,138 @@
+import threading
+from datetime import date
+from functools import lru_cache
+from uuid import UUID
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+from rx import Observable
+
+CREATED = "created"
+UPDATED = "updated"
+DELETED = "deleted"
+
+# every event is published here too, for consumers of all offices
+ALL_CHANNEL = "bookings"
+
+
+class InProcessBackend:
+    """Pub/sub between the threads of one process.
+
+    Messages are delivered in the publisher's thread, so subscribers should
+    only hand them over to wherever they are processed. Backends sharing
+    events between processes implement the same two methods.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}
+
+    def subscribe(self, channel, callback):
+        """Call ``callback`` with each message on ``channel``.
+
+        Returns a function that cancels the subscription.
+        """
+        with self.lock:
+            self.subscribers.setdefault(channel, []).append(callback)
+
+        def unsubscribe():
+            with self.lock:
+                callbacks = self.subscribers.get(channel, [])
+                if callback in callbacks:
+                    callbacks.remove(callback)
+                if not callbacks:
+                    self.subscribers.pop(channel, None)
+
+        return unsubscribe
+
+    def publish(self, channel, message):
+        with self.lock:
+            callbacks = list(self.subscribers.get(channel, ()))
+        for callback in callbacks:
+            callback(message)
+
+
+@lru_cache(maxsize=None)
+def load_backend(path):
+    return import_string(path)()
+
+
+def get_backend():
+    return load_backend(settings.BOOKINGS_EVENTS_BACKEND)
+
+
+def office_channel(office_id):
+    return "bookings:%s" % office_id
+
+
+def to_message(kind, booking, previous_key=None):
+    previous_office_id, previous_date = previous_key or (None, None)
+    return {
+        "kind": kind,
+        "uuid": str(booking.uuid),
+        "office_id": str(booking.office_id),
+        "user_id": booking.user_id,
+        "date": booking.date.isoformat(),
+        "previous_office_id": previous_office_id and str(previous_office_id),
+        "previous_date": previous_date and previous_date.isoformat(),
+    }
+
+
+def from_message(message):
+    """Parse a message back, with uuids and dates as such."""
+    event = dict(message)
+    for name in ("uuid", "office_id", "previous_office_id"):
+        if event[name] is not None:
+            event[name] = UUID(event[name])
+    for name in ("date", "previous_date"):
+        if event[name] is not None:
+            event[name] = date.fromisoformat(event[name])
+    return event
+
+
+def publish(kind, bookings, previous_keys=None):
+    """Publish an event per booking once the current transaction commits.
+
+    Each goes to ``ALL_CHANNEL``, to the channel of the booking's office,
+    and to that of the office it was in before when it moved.
+    ``previous_keys`` maps uuids to the office and date of bookings before
+    they were changed.
+    """
+    previous_keys = previous_keys or {}
+    messages = []
+    for booking in bookings:
+        previous_key = previous_keys.get(booking.uuid)
+        message = to_message(kind, booking, previous_key)
+        messages.append((ALL_CHANNEL, message))
+        messages.append((office_channel(booking.office_id), message))
+        if previous_key is not None and previous_key[0] != booking.office_id:
+            messages.append((office_channel(previous_key[0]), message))
+    if not messages:
+        return
+
+    def send():
+        backend = get_backend()
+        for channel, message in messages:
+            backend.publish(channel, message)
+
+    transaction.on_commit(send)
+
+
+def observe(office_id, schedule=None):
+    """An observable of the events of an office.
+
+    ``schedule(function, event)`` runs the observer's ``on_next`` where the
+    events are meant to be processed, by default straight away.
+    """
+
+    def subscribe(observer):
+        def on_message(message):
+            if schedule is None:
+                observer.on_next(from_message(message))
+            else:
+                schedule(observer.on_next, from_message(message))
+
+        return get_backend().subscribe(office_channel(office_id), on_message)
+
+    return Observable.create(subscribe)
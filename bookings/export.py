@@ -0,0 +1,84 @@
+import csv
+import heapq
+import json
+from datetime import date
+
+from django.conf import settings
+from django_filters.constants import EMPTY_VALUES
+
+from bookings import archive
+from bookings.filters import BookingFilter
+from bookings.models import Booking
+from bookings.pagination import order_by_key
+
+FIELDS = {
+    "uuid": "uuid",
+    "date": "date",
+    "office_id": "office_id",
+    "office_name": "office__name",
+    "username": "user__username",
+    "squad": "user__squad",
+}
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def filter_bookings(office_id=None, date_from=None, date_to=None):
+    """Return the filter set selecting the bookings to export."""
+    data = {"office_id": office_id, "date__gte": date_from, "date__lte": date_to}
+    return BookingFilter(
+        {key: value for key, value in data.items() if value is not None},
+        queryset=Booking.objects.all(),
+    )
+
+
+def row_key(row):
+    # null dates sort first, as in order_by_key
+    uuid, day = row[0], row[1]
+    return day is not None, day or date.min, uuid
+
+
+def iter_rows(filterset, chunk_size=None):
+    """Stream the filtered bookings as dicts, holding one chunk at a time.
+
+    Archived bookings are merged in, in the same ``(date, uuid)`` order.
+    Occurrences of recurring bookings are not, being no rows of their own.
+    """
+    chunk_size = chunk_size or settings.BOOKINGS_EXPORT_CHUNK_SIZE
+    querysets = [filterset.qs]
+    # as the filter set does, empty values don't filter
+    filters = {
+        name: value
+        for name, value in filterset.form.cleaned_data.items()
+        if value not in EMPTY_VALUES
+    }
+    archived = archive.filter_archive(filters)
+    if archived is not None:
+        querysets.append(archived)
+    tables = [
+        order_by_key(queryset).values_list(*FIELDS.values()).iterator(chunk_size)
+        for queryset in querysets
+    ]
+    for row in heapq.merge(*tables, key=row_key):
+        yield dict(zip(FIELDS, row))
+
+
+def iter_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(FIELDS)
+    for row in rows:
+        yield writer.writerow(row.values())
+
+
+def iter_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, default=str) + "\n"
+
+
+FORMATS = {
+    "csv": ("text/csv", iter_csv),
+    "ndjson": ("application/x-ndjson", iter_ndjson),
+}
@@ -0,0 +1,15 @@
+import django_filters
+
+from bookings.models import Booking
+
+
+class BookingFilter(django_filters.FilterSet):
+    # filters on the raw key, as offices aren't relay nodes with global ids
+    office_id = django_filters.UUIDFilter(field_name="office_id")
+
+    class Meta:
+        model = Booking
+        fields = {
+            "user__squad": ["exact"],
+            "date": ["exact", "gte", "lte"],
+        }
@@ -0,0 +1,271 @@
+import csv
+import json
+import time
+from datetime import date
+from uuid import UUID, uuid4
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from graphql_auth.models import UserStatus
+
+from bookings import archive, recurrence, services
+from bookings.cache import invalidate_offices
+from bookings.models import ArchivedBooking, Booking, Office
+
+UNKNOWN_OFFICE = "unknown office"
+UNKNOWN_USER = "unknown user"
+INVALID_ROW = "invalid row"
+DOUBLE_BOOKING = "user already booked that day"
+EXISTING_BOOKING = "booking already exists"
+CONFLICTING_BOOKING = "booking conflicts with one made meanwhile"
+
+# rejected rows kept to show when they aren't written anywhere
+REJECTED_SAMPLE_SIZE = 10
+
+
+def read_csv(file):
+    """Yield the rows of ``file`` with the line each ends on."""
+    reader = csv.DictReader(file)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_ndjson(file):
+    """Yield the rows of ``file`` with their line, malformed ones as text."""
+    for line, text in enumerate(file, 1):
+        if not text.strip():
+            continue
+        try:
+            yield line, json.loads(text)
+        except ValueError:
+            yield line, text.rstrip("\n")
+
+
+READERS = {"csv": read_csv, "ndjson": read_ndjson}
+
+
+class Rejected(Exception):
+    pass
+
+
+class BookingImporter:
+    """Import bookings in batches, one transaction per batch.
+
+    Rows use the columns of booking exports. Offices are found by
+    ``office_id`` or ``office_name`` and users by ``username``, through maps
+    filled a batch at a time. Unknown ones are created when asked to and
+    otherwise reject their rows, as do rows breaking the one booking per
+    user and day rule, occurrences of recurring bookings included. Rows of
+    retired offices are rejected as unknown. Capacities are not enforced,
+    pre-booked desks are taken as they are.
+
+    Rows come as ``(line, row)`` pairs from ``READERS``. Rejected rows are
+    written to ``rejects`` as they come, only their count and the first few
+    are kept.
+    """
+
+    def __init__(
+        self, batch_size=1000, create_offices=False, create_users=False, rejects=None
+    ):
+        self.batch_size = batch_size
+        self.create_offices = create_offices
+        self.create_users = create_users
+        self.rejects = rejects
+        self.offices = {}
+        self.office_names = {}
+        self.users = {}
+        self.imported = 0
+        self.rejected = 0
+        self.rejected_sample = []
+        self.elapsed = 0
+
+    def run(self, rows):
+        start = time.perf_counter()
+        self.load_offices()
+        batch = []
+        for line, row in rows:
+            batch.append((line, row))
+            if len(batch) == self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+        self.elapsed = time.perf_counter() - start
+        return self
+
+    @property
+    def rows_per_second(self):
+        rows = self.imported + self.rejected
+        return rows / self.elapsed if self.elapsed else 0
+
+    def load_offices(self):
+        offices = Office.objects.filter(retired_at__isnull=True)
+        for uuid, name in offices.values_list("uuid", "name"):
+            self.offices[uuid] = uuid
+            self.office_names.setdefault(name, uuid)
+
+    def reject(self, line, row, reason):
+        rejected = {"line": line, "reason": reason, "row": row}
+        self.rejected += 1
+        if len(self.rejected_sample) < REJECTED_SAMPLE_SIZE:
+            self.rejected_sample.append(rejected)
+        if self.rejects is not None:
+            self.rejects.write(json.dumps(rejected) + "\n")
+
+    @transaction.atomic
+    def import_batch(self, batch):
+        rows = [row for _, row in batch if isinstance(row, dict)]
+        self.resolve_offices(rows)
+        self.resolve_users(rows)
+        bookings = []
+        for line, row in batch:
+            try:
+                bookings.append((line, row, self.make_booking(row)))
+            except Rejected as e:
+                self.reject(line, row, str(e))
+
+        # offices retired since they were loaded, or created as a retired one
+        retired = set(
+            Office.objects.filter(
+                uuid__in={booking.office_id for _, _, booking in bookings},
+                retired_at__isnull=False,
+            ).values_list("uuid", flat=True)
+        )
+        uuids = [booking.uuid for _, _, booking in bookings]
+        days = {
+            "user_id__in": {booking.user_id for _, _, booking in bookings},
+            "date__in": {booking.date for _, _, booking in bookings},
+        }
+        existing_uuids = set(
+            Booking.objects.filter(uuid__in=uuids).values_list("uuid", flat=True)
+        )
+        booked = set(Booking.objects.filter(**days).values_list("user_id", "date"))
+        booked.update(
+            recurrence.get_booked_days(
+                (booking.user_id, booking.date) for _, _, booking in bookings
+            )
+        )
+        # archived bookings are out of reach of the constraints on Booking
+        archived_until = archive.get_archived_until()
+        if archived_until is not None and any(
+            booking.date <= archived_until for _, _, booking in bookings
+        ):
+            archived = ArchivedBooking.objects.all()
+            existing_uuids.update(
+                archived.filter(uuid__in=uuids).values_list("uuid", flat=True)
+            )
+            booked.update(archived.filter(**days).values_list("user_id", "date"))
+        valid = []
+        for line, row, booking in bookings:
+            if booking.office_id in retired:
+                self.reject(line, row, UNKNOWN_OFFICE)
+            elif booking.uuid in existing_uuids:
+                self.reject(line, row, EXISTING_BOOKING)
+            elif (booking.user_id, booking.date) in booked:
+                self.reject(line, row, DOUBLE_BOOKING)
+            else:
+                existing_uuids.add(booking.uuid)
+                booked.add((booking.user_id, booking.date))
+                valid.append((line, row, booking))
+        if not valid:
+            return
+        # the checks above make conflicts unlikely, not impossible
+        Booking.objects.bulk_create(
+            [booking for _, _, booking in valid], ignore_conflicts=True
+        )
+        inserted = set(
+            Booking.objects.filter(
+                uuid__in=[booking.uuid for _, _, booking in valid]
+            ).values_list("uuid", "user_id", "date")
+        )
+        dates = []
+        offices = set()
+        for line, row, booking in valid:
+            if (booking.uuid, booking.user_id, booking.date) in inserted:
+                dates.append(booking.date)
+                offices.add(booking.office_id)
+            else:
+                self.reject(line, row, CONFLICTING_BOOKING)
+        if dates:
+            services.recount_days(offices, min(dates), max(dates))
+        self.imported += len(dates)
+
+    def make_booking(self, row):
+        if not isinstance(row, dict):
+            raise Rejected(INVALID_ROW)
+        office_id = self.find_office(row)
+        if office_id is None:
+            raise Rejected(UNKNOWN_OFFICE)
+        user_id = self.users.get(row.get("username"))
+        if user_id is None:
+            raise Rejected(UNKNOWN_USER)
+        try:
+            uuid = UUID(row["uuid"]) if row.get("uuid") else uuid4()
+            booking_date = date.fromisoformat(row["date"])
+        except (KeyError, TypeError, ValueError):
+            raise Rejected(INVALID_ROW)
+        return Booking(
+            uuid=uuid, office_id=office_id, user_id=user_id, date=booking_date
+        )
+
+    def find_office(self, row):
+        try:
+            office_id = UUID(row["office_id"]) if row.get("office_id") else None
+        except (TypeError, ValueError):
+            return None
+        if office_id is not None:
+            return self.offices.get(office_id)
+        return self.office_names.get(row.get("office_name"))
+
+    def resolve_offices(self, rows):
+        if not self.create_offices:
+            return
+        missing = {}
+        for row in rows:
+            if self.find_office(row) is not None or not row.get("office_name"):
+                continue
+            try:
+                uuid = UUID(row["office_id"]) if row.get("office_id") else uuid4()
+            except (TypeError, ValueError):
+                continue
+            if uuid not in self.offices:
+                missing.setdefault(row["office_name"], uuid)
+        offices = [Office(uuid=uuid, name=name) for name, uuid in missing.items()]
+        if not offices:
+            return
+        Office.objects.bulk_create(offices, ignore_conflicts=True)
+        # bulk inserts send no post_save for the office cache to see
+        transaction.on_commit(invalidate_offices)
+        for office in offices:
+            self.offices[office.uuid] = office.uuid
+            self.office_names.setdefault(office.name, office.uuid)
+
+    def resolve_users(self, rows):
+        User = get_user_model()
+        usernames = {row.get("username") for row in rows} - self.users.keys() - {None}
+        if not usernames:
+            return
+        self.users.update(
+            User.objects.filter(username__in=usernames).values_list("username", "id")
+        )
+        missing = usernames - self.users.keys()
+        if not missing or not self.create_users:
+            return
+        squads = {row.get("username"): row.get("squad") or None for row in rows}
+        emails = {row.get("username"): row.get("email") or "" for row in rows}
+        users = [
+            User(username=username, email=emails[username], squad=squads[username])
+            for username in missing
+        ]
+        for user in users:
+            user.set_unusable_password()
+        User.objects.bulk_create(users, ignore_conflicts=True)
+        # SQLite doesn't return the ids of bulk inserted rows
+        created = dict(
+            User.objects.filter(username__in=missing).values_list("username", "id")
+        )
+        UserStatus.objects.bulk_create(
+            [UserStatus(user_id=user_id) for user_id in created.values()],
+            ignore_conflicts=True,
+        )
+        self.users.update(created)
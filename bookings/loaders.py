@@ -0,0 +1,39 @@
+from django.contrib.auth import get_user_model
+from promise import Promise
+from promise.dataloader import DataLoader
+
+from bookings.cache import get_offices_by_uuid
+
+
+class ModelLoader(DataLoader):
+    model = None
+
+    def batch_load_fn(self, keys):
+        instances = self.model.objects.in_bulk(keys)
+        return Promise.resolve([instances.get(key) for key in keys])
+
+
+class OfficeLoader(DataLoader):
+    def batch_load_fn(self, keys):
+        offices = get_offices_by_uuid(keys)
+        return Promise.resolve([offices.get(key) for key in keys])
+
+
+class UserLoader(ModelLoader):
+    model = get_user_model()
+
+
+class Loaders:
+    def __init__(self):
+        self.office = OfficeLoader()
+        self.user = UserLoader()
+
+
+def get_loaders(info):
+    # one set of loaders per request so that cached rows never outlive it
+    context = info.context
+    loaders = getattr(context, "loaders", None)
+    if loaders is None:
+        loaders = Loaders()
+        context.loaders = loaders
+    return loaders
@@ -0,0 +1,32 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from bookings.archive import archive_bookings
+
+
+class Command(BaseCommand):
+    help = (
+        "Move bookings dated before a day out of the bookings table into the "
+        "archive, in batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--before",
+            type=date.fromisoformat,
+            required=True,
+            help="Archive bookings dated before this day, as YYYY-MM-DD.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        moved = archive_bookings(
+            options["before"],
+            options["batch_size"],
+            lambda moved: self.stdout.write("%s bookings archived" % moved),
+        )
+        self.stdout.write(
+            "%s bookings dated before %s archived"
+            % (moved, options["before"].isoformat())
+        )
@@ -0,0 +1,278 @@
+import json
+import random
+import subprocess
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from itertools import count
+from threading import Lock
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.test import Client, RequestFactory
+from graphene_django.settings import graphene_settings
+
+from bookings import benchmark
+from config.backend import CachedDocumentBackend
+from config.schema import schema
+
+ALL_BOOKINGS = """
+query allBookings($first: Int) {
+  allBookings(first: $first) { uuid date office { name } user { username } }
+}
+"""
+
+FILTER_BOOKINGS = """
+query filterBookings($squad: String, $date: Date) {
+  filterBookings(first: 50, user_Squad: $squad, date: $date) {
+    edges { node { uuid date office { name } user { username squad } } }
+    pageInfo { hasNextPage endCursor }
+  }
+}
+"""
+
+CREATE_BOOKING = """
+mutation createBooking($officeId: UUID!, $date: Date!) {
+  createBooking(officeId: $officeId, date: $date) { booking { uuid } }
+}
+"""
+
+TOKEN_AUTH = """
+mutation tokenAuth($username: String!, $password: String!) {
+  tokenAuth(username: $username, password: $password) { success token }
+}
+"""
+
+DEFAULT_MIX = "allBookings=40,filterBookings=30,createBooking=20,tokenAuth=10"
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name not in Workload.operations:
+            raise CommandError("unknown operation %r" % name)
+        mix[name] = int(weight or 1)
+    return mix
+
+
+class Workload:
+    """A reproducible sequence of operations drawn from a weighted mix.
+
+    Each operation is ``(name, query, variables, user)``, run as ``user``
+    or anonymously if that is ``None``.
+    """
+
+    operations = {
+        "allBookings": "all_bookings",
+        "filterBookings": "filter_bookings",
+        "createBooking": "create_booking",
+        "tokenAuth": "token_auth",
+    }
+
+    def __init__(self, offices, users, mix, seed, start, days):
+        self.rng = random.Random(seed)
+        self.offices = offices
+        self.users = users
+        self.mix = mix
+        self.start = start
+        self.days = days
+        # every booking created is on a day of its own so none is refused
+        self.free_days = count(days + 1)
+
+    def generate(self, requests):
+        names = self.rng.choices(list(self.mix), list(self.mix.values()), k=requests)
+        return [getattr(self, self.operations[name])() for name in names]
+
+    def date(self, days):
+        return (self.start + timedelta(days=days)).isoformat()
+
+    def all_bookings(self):
+        variables = {"first": self.rng.choice([10, 50, 100])}
+        return "allBookings", ALL_BOOKINGS, variables, self.rng.choice(self.users)
+
+    def filter_bookings(self):
+        user = self.rng.choice(self.users)
+        variables = {
+            "squad": user.squad,
+            "date": self.date(self.rng.randrange(self.days)),
+        }
+        return "filterBookings", FILTER_BOOKINGS, variables, user
+
+    def create_booking(self):
+        variables = {
+            "officeId": str(self.rng.choice(self.offices).uuid),
+            "date": self.date(next(self.free_days)),
+        }
+        return "createBooking", CREATE_BOOKING, variables, self.rng.choice(self.users)
+
+    def token_auth(self):
+        variables = {
+            "username": self.rng.choice(self.users).username,
+            "password": benchmark.PASSWORD,
+        }
+        return "tokenAuth", TOKEN_AUTH, variables, None
+
+
+def has_errors(result):
+    if result.get("errors"):
+        return True
+    token_auth = (result.get("data") or {}).get("tokenAuth")
+    return token_auth is not None and not token_auth["success"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a synthetic org into a throwaway database, replay a mix of "
+        "GraphQL operations in-process and over WSGI and print latency "
+        "percentiles, QPS and peak RSS as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--bookings", type=int, default=100000)
+        parser.add_argument("--offices", type=int, default=50)
+        parser.add_argument("--requests", type=int, default=1000)
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=8,
+            help="Threads sending requests over WSGI.",
+        )
+        parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX))
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--transport",
+            choices=["in-process", "wsgi", "both"],
+            default="both",
+        )
+        parser.add_argument("--output", help="Write the results to this file.")
+
+    def handle(self, *args, **options):
+        results = {
+            "commit": self.get_commit(),
+            "scale": {
+                "users": options["users"],
+                "bookings": options["bookings"],
+                "offices": options["offices"],
+            },
+            "requests": options["requests"],
+            "concurrency": options["concurrency"],
+            "mix": options["mix"],
+            "seed": options["seed"],
+        }
+        self.backend = CachedDocumentBackend()
+        self.middleware = [middleware() for middleware in graphene_settings.MIDDLEWARE]
+        with benchmark.test_database():
+            start = time.perf_counter()
+            start_date = date.today()
+            offices, users = benchmark.create_org(
+                users=options["users"],
+                bookings=options["bookings"],
+                offices=options["offices"],
+                start=start_date,
+                seed=options["seed"],
+            )
+            results["seed_seconds"] = round(time.perf_counter() - start, 1)
+            workload = Workload(
+                offices,
+                users,
+                options["mix"],
+                options["seed"],
+                start_date,
+                days=-(-options["bookings"] // options["users"]),
+            )
+            tokens = {}
+            if options["transport"] in ("in-process", "both"):
+                plan = workload.generate(options["requests"])
+                results["in_process"] = self.run(plan, self.execute_in_process, tokens)
+            if options["transport"] in ("wsgi", "both"):
+                plan = workload.generate(options["requests"])
+                results["wsgi"] = self.run(
+                    plan, self.post_wsgi, tokens, options["concurrency"]
+                )
+        results["peak_rss_mb"] = benchmark.peak_rss_mb()
+
+        output = benchmark.dump(results)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output)
+        self.stdout.write(output)
+
+    def run(self, plan, send, tokens, concurrency=1):
+        # tokens are issued up front so that signing them isn't measured
+        for _, _, _, user in plan:
+            if user is not None and user.pk not in tokens:
+                tokens[user.pk] = benchmark.authorization(user)
+        timers = {name: benchmark.Timer() for name, _, _, _ in plan}
+        errors = Counter()
+        lock = Lock()
+
+        def replay(operation):
+            name, query, variables, user = operation
+            authorization = tokens[user.pk] if user is not None else None
+            with timers[name].time():
+                result = send(query, variables, authorization)
+            if has_errors(result):
+                with lock:
+                    errors[name] += 1
+
+        start = time.perf_counter()
+        if concurrency > 1:
+            with ThreadPoolExecutor(concurrency) as executor:
+                list(executor.map(replay, plan))
+        else:
+            for operation in plan:
+                replay(operation)
+        elapsed = time.perf_counter() - start
+
+        latencies = [
+            latency for timer in timers.values() for latency in timer.latencies
+        ]
+        return {
+            "total": benchmark.summarize(latencies, elapsed, sum(errors.values())),
+            "operations": {
+                name: benchmark.summarize(timer.latencies, errors=errors[name])
+                for name, timer in sorted(timers.items())
+            },
+        }
+
+    def execute_in_process(self, query, variables, authorization):
+        extra = {"HTTP_AUTHORIZATION": authorization} if authorization else {}
+        request = RequestFactory().post("/graphql", **extra)
+        request.user = AnonymousUser()
+        result = schema.execute(
+            query,
+            variable_values=variables,
+            context_value=request,
+            middleware=self.middleware,
+            backend=self.backend,
+        )
+        return result.to_dict()
+
+    def post_wsgi(self, query, variables, authorization):
+        extra = {"HTTP_AUTHORIZATION": authorization} if authorization else {}
+        try:
+            response = Client().post(
+                "/graphql",
+                json.dumps({"query": query, "variables": variables}),
+                content_type="application/json",
+                **extra,
+            )
+        finally:
+            close_old_connections()
+        return response.json()
+
+    @staticmethod
+    def get_commit():
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "HEAD"],
+                capture_output=True,
+                check=True,
+                text=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,81 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.test import AsyncClient, Client
+
+from bookings import benchmark
+
+QUERY = """
+query {
+  allOffices { uuid name }
+  allBookings(first: 50) { uuid date office { name } user { username } }
+}
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare GraphQL throughput and latency of the WSGI endpoint against "
+        "the ASGI one on a throwaway database, printing the results as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=32)
+        parser.add_argument("--bookings", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        with benchmark.test_database():
+            _, users = benchmark.create_org(users=100, bookings=options["bookings"])
+            user = users[0]
+            payload = json.dumps({"query": QUERY})
+            authorization = benchmark.authorization(user)
+            results = {
+                "wsgi": self.run_wsgi(payload, authorization, **options),
+                "asgi": asyncio.run(self.run_asgi(payload, authorization, **options)),
+                "peak_rss_mb": benchmark.peak_rss_mb(),
+            }
+        self.stdout.write(benchmark.dump(results))
+
+    def run_wsgi(self, payload, authorization, **options):
+        timer = benchmark.Timer()
+
+        def post(_):
+            with timer.time():
+                response = Client().post(
+                    "/graphql",
+                    payload,
+                    content_type="application/json",
+                    HTTP_AUTHORIZATION=authorization,
+                )
+            close_old_connections()
+            assert response.status_code == 200, response.content
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(options["concurrency"]) as executor:
+            list(executor.map(post, range(options["requests"])))
+        return benchmark.summarize(timer.latencies, time.perf_counter() - start)
+
+    async def run_asgi(self, payload, authorization, **options):
+        timer = benchmark.Timer()
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(options["concurrency"])
+
+        async def post():
+            async with semaphore:
+                with timer.time():
+                    response = await client.post(
+                        "/graphql/async",
+                        payload,
+                        content_type="application/json",
+                        authorization=authorization,
+                    )
+            assert response.status_code == 200, response.content
+
+        start = time.perf_counter()
+        await asyncio.gather(*[post() for _ in range(options["requests"])])
+        return benchmark.summarize(timer.latencies, time.perf_counter() - start)
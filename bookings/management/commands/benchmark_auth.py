@@ -0,0 +1,71 @@
+import json
+from itertools import cycle, islice
+
+from django.contrib.auth import authenticate
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from bookings import benchmark
+from users.backends import token_cache
+
+QUERY = json.dumps({"query": "query { allOffices { uuid } }"})
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the cost of authenticating requests with and without the "
+        "JWT verification cache on a throwaway database, printing latencies "
+        "and queries per request as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--requests", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        timeout = token_cache.timeout
+        results = {}
+        with benchmark.test_database():
+            _, users = benchmark.create_org(users=options["users"], bookings=0)
+            authorizations = [benchmark.authorization(user) for user in users]
+            plan = list(islice(cycle(authorizations), options["requests"]))
+            try:
+                for name, cache_timeout in [("uncached", 0), ("cached", timeout)]:
+                    token_cache.clear()
+                    token_cache.timeout = cache_timeout
+                    results[name] = {
+                        "authenticate": self.run(plan, self.authenticate),
+                        "request": self.run(plan, self.post),
+                    }
+            finally:
+                token_cache.timeout = timeout
+                token_cache.clear()
+        results["peak_rss_mb"] = benchmark.peak_rss_mb()
+        self.stdout.write(benchmark.dump(results))
+
+    def run(self, plan, send):
+        timer = benchmark.Timer()
+        with CaptureQueriesContext(connection) as queries:
+            for authorization in plan:
+                with timer.time():
+                    send(authorization)
+        summary = benchmark.summarize(timer.latencies)
+        summary["queries_per_request"] = round(len(queries) / len(plan), 2)
+        return summary
+
+    @staticmethod
+    def authenticate(authorization):
+        request = RequestFactory().post("/graphql", HTTP_AUTHORIZATION=authorization)
+        assert authenticate(request=request) is not None
+
+    @staticmethod
+    def post(authorization):
+        response = Client().post(
+            "/graphql",
+            QUERY,
+            content_type="application/json",
+            HTTP_AUTHORIZATION=authorization,
+        )
+        assert "errors" not in response.json(), response.content
@@ -0,0 +1,66 @@
+import re
+from datetime import date, timedelta
+from itertools import combinations
+from uuid import uuid4
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bookings.filters import BookingFilter
+from bookings.models import Booking, Office
+from bookings.pagination import get_max_page_size, order_by_key
+
+# plan lines reading a whole table or index on SQLite and PostgreSQL, only
+# SEARCH lines are bounded by an index condition
+FULL_SCAN = re.compile(r"\bSCAN (?!CONSTANT ROW)|Seq Scan")
+
+# walking the index of the (date, uuid) order stops after one page
+PAGE_SCAN = re.compile(r"\bSCAN \w+ USING (COVERING )?INDEX booking_date_uuid_idx$")
+
+
+def is_full_scan(line):
+    return bool(FULL_SCAN.search(line)) and not PAGE_SCAN.search(line)
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the query filterBookings runs for each combination of its "
+        "filters and flag plans that scan a whole table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fail-on-scan",
+            action="store_true",
+            help="Exit with an error if any plan scans a whole table.",
+        )
+
+    def handle(self, *args, **options):
+        office = Office.objects.only("uuid").first()
+        today = date.today()
+        filters = {
+            "officeId": {"office_id": office.uuid if office else uuid4()},
+            "userSquad": {"user__squad": "lunar"},
+            "date": {"date": today},
+            "dateRange": {"date__gte": today, "date__lte": today + timedelta(days=6)},
+        }
+        scans = []
+        for size in range(len(filters) + 1):
+            for names in combinations(filters, size):
+                if "date" in names and "dateRange" in names:
+                    continue
+                data = {}
+                for name in names:
+                    data.update(filters[name])
+                queryset = BookingFilter(data, queryset=Booking.objects.all()).qs
+                plan = order_by_key(queryset)[: get_max_page_size() + 1].explain()
+                label = " + ".join(names) or "no filters"
+                full_scan = any(map(is_full_scan, plan.splitlines()))
+                if full_scan:
+                    scans.append(label)
+                self.stdout.write(
+                    "%s: %s" % (label, "FULL SCAN" if full_scan else "indexed")
+                )
+                for line in plan.splitlines():
+                    self.stdout.write("    %s" % line)
+        if scans and options["fail_on_scan"]:
+            raise CommandError("full table scans for: %s" % ", ".join(scans))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from bookings.export import FORMATS, filter_bookings, iter_rows
+
+
+class Command(BaseCommand):
+    help = "Stream bookings as CSV or NDJSON, filtered by office and date range."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+        parser.add_argument("--office", help="UUID of the office.")
+        parser.add_argument("--from", dest="date_from", help="First date, inclusive.")
+        parser.add_argument("--to", dest="date_to", help="Last date, inclusive.")
+        parser.add_argument("--chunk-size", type=int)
+        parser.add_argument("--output", help="File to write to instead of stdout.")
+
+    def handle(self, *args, **options):
+        filterset = filter_bookings(
+            options["office"], options["date_from"], options["date_to"]
+        )
+        if not filterset.is_valid():
+            raise CommandError(filterset.errors.as_text())
+        _, write = FORMATS[options["format"]]
+        lines = write(iter_rows(filterset, options["chunk_size"]))
+        if options["output"]:
+            with open(options["output"], "w", newline="") as f:
+                f.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending="")
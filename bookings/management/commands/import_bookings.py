@@ -0,0 +1,71 @@
+import os
+import sys
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bookings.imports import READERS, BookingImporter
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream bookings from a CSV or NDJSON file in the format of "
+        "export_bookings into the database in batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, - for stdin.")
+        parser.add_argument(
+            "--format",
+            choices=sorted(READERS),
+            help="Defaults to the extension of the file.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--create-offices",
+            action="store_true",
+            help="Create offices that don't exist from office_id and office_name.",
+        )
+        parser.add_argument(
+            "--create-users",
+            action="store_true",
+            help="Create users that don't exist, without a usable password.",
+        )
+        parser.add_argument(
+            "--rejects", help="Write rejected rows to this file as NDJSON."
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        import_format = options["format"] or os.path.splitext(path)[1].lstrip(".")
+        if import_format not in READERS:
+            raise CommandError("Pass --format to import %s" % path)
+
+        with ExitStack() as stack:
+            rejects = None
+            if options["rejects"]:
+                rejects = stack.enter_context(open(options["rejects"], "w"))
+            importer = BookingImporter(
+                batch_size=options["batch_size"],
+                create_offices=options["create_offices"],
+                create_users=options["create_users"],
+                rejects=rejects,
+            )
+            if path == "-":
+                importer.run(READERS[import_format](sys.stdin))
+            else:
+                f = stack.enter_context(open(path, newline=""))
+                importer.run(READERS[import_format](f))
+
+        if rejects is None:
+            for rejected in importer.rejected_sample:
+                self.stderr.write("line %(line)s rejected: %(reason)s" % rejected)
+        self.stdout.write(
+            "%s bookings imported and %s rows rejected in %.1fs, %.0f rows/s"
+            % (
+                importer.imported,
+                importer.rejected,
+                importer.elapsed,
+                importer.rows_per_second,
+            )
+        )
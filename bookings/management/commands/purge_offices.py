@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from bookings.models import Office
+from bookings.purge import purge_office
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete retired offices and their bookings in batches, printing the "
+        "rows deleted so far after each batch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None)
+
+    def handle(self, *args, **options):
+        offices = Office.objects.filter(retired_at__isnull=False).order_by("retired_at")
+        for office in offices:
+            deleted = purge_office(office, options["batch_size"], self.progress(office))
+            self.stdout.write(
+                "office %s purged, %s rows deleted" % (office.pk, deleted)
+            )
+
+    def progress(self, office):
+        def progress(model, deleted):
+            self.stdout.write(
+                "office %s: %s %s rows deleted"
+                % (office.pk, deleted, model._meta.model_name)
+            )
+
+        return progress
@@ -0,0 +1,53 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Value
+from django.db.models.functions import Coalesce
+
+from bookings.models import ArchivedBooking, Booking, OfficeOccupancy, SquadOccupancy
+
+
+def count_bookings(*fields, **expressions):
+    """Count live and archived bookings together, grouped by some columns."""
+    counts = Counter()
+    for model in (Booking, ArchivedBooking):
+        rows = (
+            model.objects.filter(date__isnull=False)
+            .order_by()
+            .values(*fields, **expressions)
+            .annotate(count=Count("uuid"))
+        )
+        for row in rows.iterator():
+            count = row.pop("count")
+            counts[tuple(row.items())] += count
+    return counts
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount the daily occupancy aggregates from the bookings and "
+        "archived bookings tables."
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            OfficeOccupancy.objects.all().delete()
+            OfficeOccupancy.objects.bulk_create(
+                (
+                    OfficeOccupancy(**dict(key), count=count)
+                    for key, count in count_bookings("office_id", "date").items()
+                ),
+                batch_size=1000,
+            )
+            SquadOccupancy.objects.all().delete()
+            SquadOccupancy.objects.bulk_create(
+                (
+                    SquadOccupancy(**dict(key), count=count)
+                    for key, count in count_bookings(
+                        "office_id", "date", squad=Coalesce("user__squad", Value(""))
+                    ).items()
+                ),
+                batch_size=1000,
+            )
+        self.stdout.write("%s office days counted" % OfficeOccupancy.objects.count())
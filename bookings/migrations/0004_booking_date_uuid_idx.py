@@ -0,0 +1,17 @@
+# Generated by Django 3.2.16 on 2026-10-18 12:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0003_rename_booked_booking'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['date', 'uuid'], name='booking_date_uuid_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 3.2.16 on 2026-10-18 12:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def count_bookings(apps, schema_editor):
+    Booking = apps.get_model('bookings', 'Booking')
+    OfficeOccupancy = apps.get_model('bookings', 'OfficeOccupancy')
+    occupancy = (
+        Booking.objects.filter(date__isnull=False)
+        .values('office_id', 'date')
+        .annotate(count=models.Count('uuid'))
+        .order_by()
+    )
+    OfficeOccupancy.objects.bulk_create(
+        (OfficeOccupancy(**row) for row in occupancy.iterator()), batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0004_booking_date_uuid_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='office',
+            name='capacity',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='OfficeOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('office', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='bookings.office')),
+            ],
+            options={
+                'unique_together': {('office', 'date')},
+            },
+        ),
+        migrations.RunPython(count_bookings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 3.2.16 on 2026-10-18 12:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models.functions import Coalesce
+
+
+def count_bookings(apps, schema_editor):
+    Booking = apps.get_model('bookings', 'Booking')
+    SquadOccupancy = apps.get_model('bookings', 'SquadOccupancy')
+    occupancy = (
+        Booking.objects.filter(date__isnull=False)
+        .values('office_id', 'date', squad=Coalesce('user__squad', models.Value('')))
+        .annotate(count=models.Count('uuid'))
+        .order_by()
+    )
+    SquadOccupancy.objects.bulk_create(
+        (SquadOccupancy(**row) for row in occupancy.iterator()), batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0005_office_capacity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SquadOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('squad', models.CharField(blank=True, max_length=128)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('office', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='squad_occupancy', to='bookings.office')),
+            ],
+            options={
+                'unique_together': {('office', 'date', 'squad')},
+            },
+        ),
+        migrations.RunPython(count_bookings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.16 on 2026-10-18 12:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0006_squad_occupancy'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['office', 'date', 'uuid'], name='booking_office_date_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.2.16 on 2026-10-18 13:05
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('bookings', '0007_booking_office_date_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringBooking',
+            fields=[
+                ('uuid', models.UUIDField(primary_key=True, serialize=False)),
+                ('weekdays', models.PositiveSmallIntegerField()),
+                ('interval', models.PositiveSmallIntegerField(default=1)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('office', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_booking', to='bookings.office')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_booking', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recurringbooking',
+            index=models.Index(fields=['user', 'start_date'], name='recurring_user_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recurringbooking',
+            index=models.Index(fields=['office', 'start_date'], name='recurring_office_start_idx'),
+        ),
+    ]
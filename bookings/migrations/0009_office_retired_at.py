@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-18 13:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0008_recurring_booking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='office',
+            name='retired_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
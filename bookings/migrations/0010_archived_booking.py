@@ -0,0 +1,33 @@
+# Generated by Django 3.2.16 on 2026-10-18 13:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('bookings', '0009_office_retired_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBooking',
+            fields=[
+                ('uuid', models.UUIDField(primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('office', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_booking', to='bookings.office')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_booking', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedbooking',
+            index=models.Index(fields=['date', 'uuid'], name='archived_date_uuid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedbooking',
+            index=models.Index(fields=['office', 'date', 'uuid'], name='archived_office_date_idx'),
+        ),
+    ]
@@ -5,6 +5,10 @@ from django.db import models
 class Office(models.Model):
     uuid = models.UUIDField(primary_key=True)
     name = models.CharField(max_length=128)
+    # desks that can be booked per day, unlimited when null
+    capacity = models.PositiveIntegerField(null=True, blank=True)
+    # set when the office is deleted, until its rows are purged
+    retired_at = models.DateTimeField(null=True, blank=True)
 
 
 class Booking(models.Model):
@@ -19,3 +23,97 @@ class Booking(models.Model):
 
     class Meta:
         unique_together = ("user", "date")
+        indexes = [
+            models.Index(fields=["date", "uuid"], name="booking_date_uuid_idx"),
+            # who is in an office on some days, in connection order
+            models.Index(
+                fields=["office", "date", "uuid"], name="booking_office_date_idx"
+            ),
+        ]
+
+
+class ArchivedBooking(models.Model):
+    """A past booking moved out of ``Booking`` by ``archive_bookings``.
+
+    Keeping history out of the bookings table keeps its indexes and
+    uniqueness checks about the days people actually book.
+    """
+
+    uuid = models.UUIDField(primary_key=True)
+    office = models.ForeignKey(
+        "bookings.office", on_delete=models.CASCADE, related_name="archived_booking"
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="archived_booking",
+    )
+    date = models.DateField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["date", "uuid"], name="archived_date_uuid_idx"),
+            models.Index(
+                fields=["office", "date", "uuid"], name="archived_office_date_idx"
+            ),
+        ]
+
+
+class OfficeOccupancy(models.Model):
+    office = models.ForeignKey(
+        "bookings.office", on_delete=models.CASCADE, related_name="occupancy"
+    )
+    date = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("office", "date")
+
+
+class SquadOccupancy(models.Model):
+    office = models.ForeignKey(
+        "bookings.office", on_delete=models.CASCADE, related_name="squad_occupancy"
+    )
+    date = models.DateField()
+    # blank for users without a squad, so that the unique constraint holds
+    squad = models.CharField(max_length=128, blank=True)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("office", "date", "squad")
+
+
+class RecurringBooking(models.Model):
+    """A booking repeated on some weekdays every ``interval`` weeks.
+
+    Its occurrences are never stored, they are expanded when read, see
+    ``bookings.recurrence``. Weeks are counted from the one ``start_date``
+    falls in, and series without an ``end_date`` go on forever. Not being
+    stored, occurrences aren't admitted against the office's capacity nor
+    counted in its occupancy.
+    """
+
+    uuid = models.UUIDField(primary_key=True)
+    office = models.ForeignKey(
+        "bookings.office", on_delete=models.CASCADE, related_name="recurring_booking"
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="recurring_booking",
+    )
+    # bit n is set when the booking repeats on date.weekday() == n
+    weekdays = models.PositiveSmallIntegerField()
+    interval = models.PositiveSmallIntegerField(default=1)
+    start_date = models.DateField()
+    end_date = models.DateField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "start_date"], name="recurring_user_start_idx"
+            ),
+            models.Index(
+                fields=["office", "start_date"], name="recurring_office_start_idx"
+            ),
+        ]
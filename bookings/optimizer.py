@@ -0,0 +1,68 @@
+from django.core.exceptions import FieldDoesNotExist
+from graphene.utils.str_converters import to_snake_case
+from graphql.language import ast
+
+
+def get_selected_fields(info):
+    """Return the fields requested below the current one as a nested dict.
+
+    Aliases are collapsed onto the field they point at and fragments are
+    inlined, so ``{a: date ...F}`` reads the same as ``{date ...}``.
+    """
+    fields = {}
+    for field_ast in info.field_asts:
+        if field_ast.selection_set:
+            _collect_fields(field_ast.selection_set, info.fragments, fields)
+    return fields
+
+
+def _collect_fields(selection_set, fragments, fields):
+    for selection in selection_set.selections:
+        if isinstance(selection, ast.Field):
+            sub_fields = fields.setdefault(to_snake_case(selection.name.value), {})
+            if selection.selection_set:
+                _collect_fields(selection.selection_set, fragments, sub_fields)
+        elif isinstance(selection, ast.FragmentSpread):
+            fragment = fragments[selection.name.value]
+            _collect_fields(fragment.selection_set, fragments, fields)
+        elif isinstance(selection, ast.InlineFragment):
+            _collect_fields(selection.selection_set, fragments, fields)
+
+
+def _plan(model, fields, prefix=""):
+    only = {prefix + model._meta.pk.name}
+    related = set()
+    for name, sub_fields in fields.items():
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        if not field.concrete or field.many_to_many:
+            continue
+        path = prefix + field.name
+        only.add(path)
+        if field.is_relation:
+            related.add(path)
+            related_only, related_related = _plan(
+                field.related_model, sub_fields, path + "__"
+            )
+            only |= related_only
+            related |= related_related
+    return only, related
+
+
+def optimize_queryset(queryset, info, connection=False, fields=()):
+    """Narrow ``queryset`` to the columns and joins the client selected.
+
+    Forward relations that are selected are joined with ``select_related``
+    and every model involved is restricted with ``only`` to the selected
+    columns, so a query for ``{ uuid date }`` never touches related tables.
+    ``fields`` are always loaded, e.g. the columns a cursor is built from.
+    """
+    selected = get_selected_fields(info)
+    if connection:
+        selected = selected.get("edges", {}).get("node", {})
+    only, related = _plan(queryset.model, selected)
+    if related:
+        queryset = queryset.select_related(*sorted(related))
+    return queryset.only(*sorted(only | set(fields)))
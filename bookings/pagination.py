@@ -0,0 +1,167 @@
+import base64
+import datetime
+from itertools import islice
+from uuid import UUID
+
+from django.conf import settings
+from django.db.models import F, Q
+from graphene.relay import PageInfo
+from graphene_django.filter import DjangoFilterConnectionField
+from graphene_django.utils import maybe_queryset
+from graphql import GraphQLError
+
+from bookings import archive, recurrence
+
+CURSOR_PREFIX = "booking:"
+
+
+def get_max_page_size():
+    return settings.BOOKINGS_MAX_PAGE_SIZE
+
+
+def check_page_size(first, info):
+    max_page_size = get_max_page_size()
+    if first is None:
+        return max_page_size
+    if first < 0:
+        raise GraphQLError("`first` on `%s` can't be negative" % info.field_name)
+    if first > max_page_size:
+        raise GraphQLError(
+            "Requesting %s records on `%s` exceeds the limit of %s records"
+            % (first, info.field_name, max_page_size)
+        )
+    return first
+
+
+def booking_to_cursor(booking):
+    date = booking.date.isoformat() if booking.date else ""
+    value = "%s%s:%s" % (CURSOR_PREFIX, date, booking.uuid.hex)
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def cursor_to_key(cursor):
+    try:
+        value = base64.urlsafe_b64decode(cursor.encode()).decode()
+        if not value.startswith(CURSOR_PREFIX):
+            raise ValueError(value)
+        date, uuid = value[len(CURSOR_PREFIX) :].split(":")
+        date = datetime.date.fromisoformat(date) if date else None
+        return date, UUID(uuid)
+    except (ValueError, UnicodeDecodeError):
+        raise GraphQLError("invalid cursor")
+
+
+def after_key(date, uuid):
+    # null dates sort first, see BookingConnectionField.ordering
+    if date is None:
+        return Q(date__isnull=True, uuid__gt=uuid) | Q(date__isnull=False)
+    return Q(date__gt=date) | Q(date=date, uuid__gt=uuid)
+
+
+def before_key(date, uuid):
+    if date is None:
+        return Q(date__isnull=True, uuid__lt=uuid)
+    return Q(date__isnull=True) | Q(date__lt=date) | Q(date=date, uuid__lt=uuid)
+
+
+def order_by_key(queryset):
+    return queryset.order_by(F("date").asc(nulls_first=True), "uuid")
+
+
+class BookingConnectionField(DjangoFilterConnectionField):
+    """Relay connection over bookings paginated by ``(date, uuid)`` keys.
+
+    Cursors encode the key of the edge rather than its offset, so fetching
+    the next page is an index range scan however deep into the table it is.
+    Occurrences of recurring bookings matching the filters are merged in,
+    and so are archived bookings when the dates asked for reach the archive.
+    """
+
+    ordering = ("date", "uuid")
+
+    @classmethod
+    def connection_resolver(
+        cls,
+        resolver,
+        connection,
+        default_manager,
+        queryset_resolver,
+        max_limit,
+        *args,
+        **kwargs
+    ):
+        # the limit bound when the schema was built is replaced by the
+        # current one
+        return super().connection_resolver(
+            resolver,
+            connection,
+            default_manager,
+            queryset_resolver,
+            get_max_page_size(),
+            *args,
+            **kwargs,
+        )
+
+    @classmethod
+    def resolve_connection(cls, connection, args, iterable, max_limit=None):
+        queryset = order_by_key(maybe_queryset(iterable))
+        after = before = None
+        if args.get("after"):
+            after = cursor_to_key(args["after"])
+            queryset = queryset.filter(after_key(*after))
+        if args.get("before"):
+            before = cursor_to_key(args["before"])
+            queryset = queryset.filter(before_key(*before))
+        archived = archive.filter_archive(args, after)
+        if archived is not None:
+            archived = order_by_key(archived)
+            if after is not None:
+                archived = archived.filter(after_key(*after))
+            if before is not None:
+                archived = archived.filter(before_key(*before))
+        offset = args.get("offset") or 0
+        first, last = args.get("first"), args.get("last")
+
+        def fetch(count, reverse=False):
+            def head(queryset):
+                return (queryset.reverse() if reverse else queryset)[: offset + count]
+
+            sources = [list(head(queryset))]
+            if archived is not None:
+                sources.append(list(archive.as_bookings(head(archived))))
+            # occurrences of recurring bookings are expanded in between rows
+            bound = recurrence.page_bound(sources, offset + count, reverse)
+            occurrences = recurrence.filter_occurrences(
+                args, after, before, reverse, bound
+            )
+            rows = recurrence.merge(*sources, occurrences, reverse=reverse)
+            return list(islice(rows, offset, offset + count))
+
+        if last is not None and first is None:
+            rows = fetch(last + 1, reverse=True)
+            has_previous_page = len(rows) > last
+            has_next_page = bool(args.get("before"))
+            rows = rows[:last][::-1]
+        else:
+            limit = first if first is not None else max_limit
+            rows = fetch(limit + 1)
+            has_next_page = len(rows) > limit
+            has_previous_page = bool(args.get("after") or offset)
+            rows = rows[:limit]
+            if last is not None:
+                rows = rows[-last:] if last else []
+
+        edges = [
+            connection.Edge(node=row, cursor=booking_to_cursor(row)) for row in rows
+        ]
+        page = connection(
+            edges=edges,
+            page_info=PageInfo(
+                start_cursor=edges[0].cursor if edges else None,
+                end_cursor=edges[-1].cursor if edges else None,
+                has_previous_page=has_previous_page,
+                has_next_page=has_next_page,
+            ),
+        )
+        page.iterable = queryset
+        return page
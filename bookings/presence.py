@@ -0,0 +1,229 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from bookings import events, recurrence
+from bookings.models import ArchivedBooking, Booking, RecurringBooking
+from config.db import read_from_primary
+
+
+def iter_bits(bits):
+    """The positions of the set bits of ``bits``, lowest first."""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+class PresenceIndex:
+    """The days each user booked, as the bits of an int, grouped by squad.
+
+    Bit n of a user's int is set when they booked ``origin`` plus n days.
+    It is built from the database on first use and every
+    ``BOOKINGS_PRESENCE_REBUILD_INTERVAL`` seconds after, and kept up to
+    date in between by the booking events. Days before ``origin`` are
+    read from the database. Recurring bookings are kept as they are and
+    expanded over the days asked for.
+
+    Rebuilds read from the primary without holding ``lock``, so events are
+    never held up by them. Changes arriving meanwhile are queued and
+    replayed onto the new index, which applying them twice leaves as is.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.build_lock = threading.Lock()
+        self.built = None
+        self.origin = None
+        self.days = {}
+        self.squads = {}
+        self.user_squads = {}
+        self.series = {}
+        self.pending = None
+        self.unsubscribe = None
+
+    def clear(self):
+        with self.lock:
+            self.built = None
+
+    def ensure_built(self):
+        interval = settings.BOOKINGS_PRESENCE_REBUILD_INTERVAL
+        if self.built is not None and time.monotonic() - self.built <= interval:
+            return
+        # readers keep using the current index while another thread rebuilds it
+        if not self.build_lock.acquire(blocking=self.built is None):
+            return
+        try:
+            if self.built is None or time.monotonic() - self.built > interval:
+                self.rebuild()
+        finally:
+            self.build_lock.release()
+
+    def rebuild(self):
+        with self.lock:
+            if self.unsubscribe is None:
+                self.unsubscribe = events.get_backend().subscribe(
+                    events.ALL_CHANNEL, self.apply
+                )
+            self.pending = []
+        try:
+            index = PresenceIndex()
+            index.origin = timezone.localdate() - timedelta(
+                days=settings.BOOKINGS_PRESENCE_HISTORY
+            )
+            # a lagging replica would miss changes whose events already came
+            with read_from_primary():
+                index.load()
+        except BaseException:
+            with self.lock:
+                self.pending = None
+            raise
+        with self.lock:
+            self.origin, self.days = index.origin, index.days
+            self.squads, self.user_squads = index.squads, index.user_squads
+            self.series = index.series
+            pending, self.pending = self.pending, None
+            for change, args in pending:
+                change(*args)
+            self.built = time.monotonic()
+
+    def load(self):
+        users = get_user_model().objects.exclude(squad__isnull=True)
+        for user_id, squad in users.values_list("id", "squad").iterator():
+            self.assign_squad(user_id, squad)
+        for model in (Booking, ArchivedBooking):
+            rows = model.objects.filter(date__gte=self.origin)
+            for user_id, day in rows.values_list("user_id", "date").iterator():
+                self.add(user_id, day)
+        for recurring in RecurringBooking.objects.iterator():
+            self.series.setdefault(recurring.user_id, []).append(recurring)
+
+    def change(self, change, *args):
+        """Run ``change`` on the index, or after the rebuild under way."""
+        with self.lock:
+            if self.pending is not None:
+                self.pending.append((change, args))
+            else:
+                change(*args)
+
+    def set_squad(self, user_id, squad):
+        self.change(self.assign_squad, user_id, squad)
+
+    def assign_squad(self, user_id, squad):
+        previous = self.user_squads.pop(user_id, None)
+        if previous is not None:
+            self.squads[previous].discard(user_id)
+        if squad:
+            self.user_squads[user_id] = squad
+            self.squads.setdefault(squad, set()).add(user_id)
+
+    def forget(self, user_id):
+        self.change(self.drop_user, user_id)
+
+    def drop_user(self, user_id):
+        self.assign_squad(user_id, None)
+        self.days.pop(user_id, None)
+        self.series.pop(user_id, None)
+
+    def add(self, user_id, day):
+        if day is not None and day >= self.origin:
+            bit = 1 << (day - self.origin).days
+            self.days[user_id] = self.days.get(user_id, 0) | bit
+
+    def remove(self, user_id, day):
+        if day is not None and day >= self.origin and user_id in self.days:
+            self.days[user_id] &= ~(1 << (day - self.origin).days)
+
+    def discard(self, days):
+        """Remove ``(user_id, date)`` pairs of bookings deleted without events."""
+        self.change(self.remove_days, days)
+
+    def remove_days(self, days):
+        for user_id, day in days:
+            self.remove(user_id, day)
+
+    def apply(self, message):
+        """Apply a booking event, as published by ``bookings.events``."""
+        self.change(self.apply_event, events.from_message(message))
+
+    def apply_event(self, event):
+        if event["kind"] == events.DELETED:
+            self.remove(event["user_id"], event["date"])
+        else:
+            self.remove(event["user_id"], event["previous_date"])
+            self.add(event["user_id"], event["date"])
+
+    def reload_series(self, user_id):
+        series = list(
+            RecurringBooking.objects.using(DEFAULT_DB_ALIAS).filter(user_id=user_id)
+        )
+        self.change(self.store_series, user_id, series)
+
+    def store_series(self, user_id, series):
+        self.series[user_id] = series
+
+    def get_presence(self, squad, date_from, date_to):
+        """Map each day from ``date_from`` to ``date_to`` to the ids of the
+        members of ``squad`` booked on it."""
+        self.ensure_built()
+        presence = {
+            date_from + timedelta(days=day): set()
+            for day in range((date_to - date_from).days + 1)
+        }
+        with self.lock:
+            members = list(self.squads.get(squad, ()))
+            start = max(date_from, self.origin)
+            shift = (start - self.origin).days
+            mask = (1 << max((date_to - start).days + 1, 0)) - 1
+            for user_id in members:
+                for day in iter_bits(self.days.get(user_id, 0) >> shift & mask):
+                    presence[start + timedelta(days=day)].add(user_id)
+                for recurring in self.series.get(user_id, ()):
+                    for day in recurrence.get_dates(recurring, date_from, date_to):
+                        presence[day].add(user_id)
+            origin = self.origin
+        if date_from < origin:
+            history = (date_from, min(date_to, origin - timedelta(days=1)))
+            for model in (Booking, ArchivedBooking):
+                rows = model.objects.filter(user__squad=squad, date__range=history)
+                for user_id, day in rows.values_list("user_id", "date"):
+                    presence[day].add(user_id)
+        return presence
+
+
+index = PresenceIndex()
+
+
+def get_best_days(presence, first):
+    """The days most of the squad is in, earliest first among equals."""
+    days = sorted(presence.items(), key=lambda item: (-len(item[1]), item[0]))
+    return [(day, users) for day, users in days[:first] if users]
+
+
+@receiver(post_save, sender=get_user_model())
+def user_saved(sender, instance, **kwargs):
+    if index.built is not None:
+        user_id, squad = instance.pk, instance.squad
+        transaction.on_commit(lambda: index.set_squad(user_id, squad))
+
+
+@receiver(post_delete, sender=get_user_model())
+def user_deleted(sender, instance, **kwargs):
+    if index.built is not None:
+        user_id = instance.pk
+        transaction.on_commit(lambda: index.forget(user_id))
+
+
+@receiver(post_save, sender=RecurringBooking)
+@receiver(post_delete, sender=RecurringBooking)
+def recurring_booking_changed(sender, instance, **kwargs):
+    if index.built is not None:
+        user_id = instance.user_id
+        transaction.on_commit(lambda: index.reload_series(user_id))
@@ -0,0 +1,114 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from bookings import events, presence
+from bookings.models import (
+    ArchivedBooking,
+    Booking,
+    Office,
+    OfficeOccupancy,
+    RecurringBooking,
+    SquadOccupancy,
+)
+
+logger = logging.getLogger(__name__)
+
+# the rows of an office, deleted in this order before the office itself
+OFFICE_ROWS = [
+    RecurringBooking,
+    Booking,
+    ArchivedBooking,
+    OfficeOccupancy,
+    SquadOccupancy,
+]
+
+# what the events of deleted bookings are made of
+EVENT_FIELDS = ["uuid", "office_id", "user_id", "date"]
+
+executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="office-purge")
+
+
+def retire_office(uuid):
+    """Hide an office and stop taking bookings in it, leaving its rows to
+    ``purge_office``. Returns the office, or ``None`` if there is none."""
+    office = Office.objects.filter(uuid=uuid).first()
+    if office is not None and office.retired_at is None:
+        office.retired_at = timezone.now()
+        office.save(update_fields=["retired_at"])
+    return office
+
+
+def purge_office(office, batch_size=None, progress=None):
+    """Delete a retired office and its rows, ``batch_size`` rows at a time.
+
+    Each batch is its own transaction, so other writers wait for one batch
+    at most rather than for the whole history of the office. ``progress``
+    is called with the model and rows of it deleted so far after each
+    batch. Returns the number of rows deleted, the office's included.
+    Deleted bookings are published as such a batch at a time, archived ones
+    are dropped from the presence index.
+    """
+    batch_size = batch_size or settings.OFFICE_PURGE_BATCH_SIZE
+    total = 0
+    for model in OFFICE_ROWS:
+        rows = model.objects.filter(office_id=office.pk)
+        deleted = 0
+        while True:
+            with transaction.atomic():
+                if model is Booking:
+                    batch = list(rows.only(*EVENT_FIELDS)[:batch_size])
+                    pks = [booking.pk for booking in batch]
+                elif model is ArchivedBooking:
+                    batch = list(rows.values_list("pk", "user_id", "date")[:batch_size])
+                    pks = [pk for pk, _, _ in batch]
+                else:
+                    pks = list(rows.values_list("pk", flat=True)[:batch_size])
+                if not pks:
+                    break
+                # nothing refers to these rows, so this is a single DELETE
+                count, _ = model.objects.filter(pk__in=pks).delete()
+                if model is Booking:
+                    events.publish(events.DELETED, batch)
+                elif model is ArchivedBooking and presence.index.built is not None:
+                    # archived bookings have no events to update the index
+                    days = [(user_id, day) for _, user_id, day in batch]
+                    transaction.on_commit(partial(presence.index.discard, days))
+            deleted += count
+            if progress is not None:
+                progress(model, deleted)
+        total += deleted
+    count, _ = Office.objects.filter(pk=office.pk).delete()
+    return total + count
+
+
+def log_progress(office):
+    def progress(model, deleted):
+        logger.info(
+            "office %s: %s %s rows deleted", office.pk, deleted, model._meta.model_name
+        )
+
+    return progress
+
+
+def purge_in_background(office):
+    """Purge ``office`` on a background thread once the transaction commits.
+
+    Offices left retired, e.g. by a restart, are purged by the
+    ``purge_offices`` command.
+    """
+
+    def run():
+        close_old_connections()
+        try:
+            purge_office(office, progress=log_progress(office))
+        except Exception:
+            logger.exception("purging office %s failed", office.pk)
+        finally:
+            close_old_connections()
+
+    transaction.on_commit(lambda: executor.submit(run))
@@ -0,0 +1,222 @@
+import heapq
+from collections import defaultdict
+from datetime import date, timedelta
+from math import lcm
+from uuid import uuid5
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from bookings.models import Booking, RecurringBooking
+
+ONE_DAY = timedelta(days=1)
+
+
+def get_horizon():
+    """The last day occurrences are expanded to."""
+    return timezone.localdate() + timedelta(days=settings.BOOKINGS_RECURRENCE_HORIZON)
+
+
+def to_weekdays(mask):
+    return [weekday for weekday in range(7) if mask & 1 << weekday]
+
+
+def to_mask(weekdays):
+    return sum(1 << weekday for weekday in set(weekdays))
+
+
+def occurs_on(recurring, day):
+    if day < recurring.start_date:
+        return False
+    if recurring.end_date is not None and day > recurring.end_date:
+        return False
+    if not recurring.weekdays & 1 << day.weekday():
+        return False
+    first_monday = recurring.start_date - timedelta(days=recurring.start_date.weekday())
+    return (day - first_monday).days // 7 % recurring.interval == 0
+
+
+def get_dates(recurring, date_from=None, date_to=None, reverse=False):
+    """Dates of the occurrences between two dates, up to the horizon."""
+    first = max(recurring.start_date, date_from or recurring.start_date)
+    last = min(d for d in (recurring.end_date, date_to, get_horizon()) if d)
+    day, step = (last, -ONE_DAY) if reverse else (first, ONE_DAY)
+    while first <= day <= last:
+        if occurs_on(recurring, day):
+            yield day
+        day += step
+
+
+def make_occurrence(recurring, day):
+    """An unsaved booking standing for the occurrence of ``recurring`` on a day.
+
+    Its uuid is derived from the series and the day, so it is the same
+    every time the occurrence is expanded.
+    """
+    booking = Booking(
+        uuid=uuid5(recurring.uuid, day.isoformat()),
+        office_id=recurring.office_id,
+        user_id=recurring.user_id,
+        date=day,
+    )
+    if RecurringBooking.office.is_cached(recurring):
+        booking.office = recurring.office
+    if RecurringBooking.user.is_cached(recurring):
+        booking.user = recurring.user
+    booking.recurring_booking = recurring
+    return booking
+
+
+def booking_key(booking):
+    # null dates sort first, see BookingConnectionField.ordering
+    return booking.date is not None, booking.date or date.min, booking.uuid
+
+
+def expand(recurring, date_from=None, date_to=None, reverse=False):
+    for day in get_dates(recurring, date_from, date_to, reverse):
+        yield make_occurrence(recurring, day)
+
+
+def merge(*iterables, reverse=False):
+    """Merge bookings and occurrences, each already ordered by date and uuid."""
+    return heapq.merge(*iterables, key=booking_key, reverse=reverse)
+
+
+def overlapping(recurrings, date_from=None, date_to=None):
+    """Narrow ``recurrings`` to those that may occur between two dates."""
+    if date_to is not None:
+        recurrings = recurrings.filter(start_date__lte=date_to)
+    if date_from is not None:
+        recurrings = recurrings.filter(
+            Q(end_date__isnull=True) | Q(end_date__gte=date_from)
+        )
+    return recurrings
+
+
+def page_bound(sources, count, reverse=False):
+    """The key of the last row a page of ``count`` rows can end on.
+
+    ``sources`` are the rows fetched for the page from bookings and the
+    archive, in page order. Any of them filling the page ends it at its
+    last row at the latest, occurrences past it can't make it in.
+    """
+    keys = [booking_key(rows[count - 1]) for rows in sources if len(rows) >= count > 0]
+    if not keys:
+        return None
+    return max(keys) if reverse else min(keys)
+
+
+def filter_occurrences(filters, after=None, before=None, reverse=False, bound=None):
+    """Occurrences matching the ``BookingFilter`` lookups in ``filters``.
+
+    ``after`` and ``before`` are the ``(date, uuid)`` keys of cursors the
+    occurrences must come after or before. ``bound`` is the sort key of
+    ``page_bound`` they stop at, so that a page only reads the series in
+    its dates. They are expanded lazily, in the order of the keys, and
+    only fetched once iterated.
+    """
+    dates_from = [filters.get("date"), filters.get("date__gte"), after and after[0]]
+    dates_to = [filters.get("date"), filters.get("date__lte"), before and before[0]]
+    if bound is not None:
+        if not bound[0]:
+            # the page ends on rows without a date, which occurrences follow
+            if not reverse:
+                return
+        elif reverse:
+            dates_from.append(bound[1])
+        else:
+            dates_to.append(bound[1])
+    date_from = max(filter(None, dates_from), default=None)
+    date_to = min(filter(None, dates_to), default=None)
+    # offices and users are left to the loaders, as for bookings
+    recurrings = RecurringBooking.objects.all()
+    for name in ("office_id", "user__squad"):
+        if filters.get(name) is not None:
+            recurrings = recurrings.filter(**{name: filters[name]})
+    recurrings = overlapping(recurrings, date_from, date_to).order_by("uuid")
+    after_key = after and (after[0] is not None, after[0] or date.min, after[1])
+    before_key = before and (before[0] is not None, before[0] or date.min, before[1])
+    for occurrence in merge(
+        *[expand(r, date_from, date_to, reverse) for r in recurrings],
+        reverse=reverse,
+    ):
+        key = booking_key(occurrence)
+        if (after_key is None or key > after_key) and (
+            before_key is None or key < before_key
+        ):
+            yield occurrence
+
+
+def get_booked_dates(user, dates):
+    """The ``dates`` on which recurring bookings of ``user`` occur."""
+    return {day for _, day in get_booked_days((user.pk, day) for day in dates)}
+
+
+def get_booked_days(days):
+    """The ``(user_id, date)`` pairs of ``days`` on which a recurring booking
+    of that user occurs."""
+    days = {(user_id, day) for user_id, day in days if day is not None}
+    if not days:
+        return set()
+    dates = [day for _, day in days]
+    recurrings = defaultdict(list)
+    for recurring in overlapping(
+        RecurringBooking.objects.filter(user_id__in={user_id for user_id, _ in days}),
+        min(dates),
+        max(dates),
+    ):
+        recurrings[recurring.user_id].append(recurring)
+    return {
+        (user_id, day)
+        for user_id, day in days
+        if any(occurs_on(recurring, day) for recurring in recurrings[user_id])
+    }
+
+
+def first_common_date(recurring, other):
+    start = max(recurring.start_date, other.start_date)
+    # together the two repeat every lcm(interval) weeks
+    end = start + timedelta(weeks=lcm(recurring.interval, other.interval)) - ONE_DAY
+    for end_date in (recurring.end_date, other.end_date):
+        if end_date is not None:
+            end = min(end, end_date)
+    day = start
+    while day <= end:
+        if occurs_on(recurring, day) and occurs_on(other, day):
+            return day
+        day += ONE_DAY
+    return None
+
+
+def find_conflicts(recurring):
+    """Dates on which ``recurring`` clashes with other bookings of its user.
+
+    One-off bookings are found with a single range query on the user's
+    dates, other series by comparing the patterns, reporting the first
+    clash with each.
+    """
+    bookings = Booking.objects.filter(
+        user_id=recurring.user_id,
+        date__gte=recurring.start_date,
+        date__iso_week_day__in=[day + 1 for day in to_weekdays(recurring.weekdays)],
+    )
+    if recurring.end_date is not None:
+        bookings = bookings.filter(date__lte=recurring.end_date)
+    conflicts = {
+        day
+        for day in bookings.values_list("date", flat=True)
+        if occurs_on(recurring, day)
+    }
+    others = overlapping(
+        RecurringBooking.objects.filter(user_id=recurring.user_id).exclude(
+            uuid=recurring.uuid
+        ),
+        recurring.start_date,
+        recurring.end_date,
+    )
+    for other in others:
+        day = first_common_date(recurring, other)
+        if day is not None:
+            conflicts.add(day)
+    return sorted(conflicts)
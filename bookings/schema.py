@@ -1,14 +1,44 @@
+from datetime import timedelta
+from itertools import islice
 from uuid import uuid4
 
 import graphene
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import IntegrityError
+from django.db.models import Q
 from graphene import Node
 from graphene_django import DjangoObjectType
-from graphene_django.filter import DjangoFilterConnectionField
 from graphql import GraphQLError
 
-from bookings.models import Office, Booking
+from bookings import archive, events, presence, purge, recurrence, services
+from bookings.cache import get_offices
+from bookings.filters import BookingFilter
+from bookings.loaders import get_loaders
+from bookings.models import (
+    Booking,
+    Office,
+    OfficeOccupancy,
+    RecurringBooking,
+    SquadOccupancy,
+)
+from bookings.optimizer import optimize_queryset
+from bookings.pagination import (
+    BookingConnectionField,
+    after_key,
+    booking_to_cursor,
+    check_page_size,
+    cursor_to_key,
+    order_by_key,
+)
+
+
+DOUBLE_BOOKING_ERROR = "you can't book onto more than 1 office a day"
+MISSING_BOOKING_ERROR = "this booking does not exist"
+MISSING_RECURRING_BOOKING_ERROR = "this recurring booking does not exist"
+MISSING_OFFICE_ERROR = "This office does not exist"
+OFFICE_FULL_ERROR = "this office is fully booked on that date"
+OFFICE_FULL_DAYS_ERROR = "this office is fully booked on %s"
 
 
 def is_user_authenticated(info):
@@ -20,7 +50,7 @@ def is_user_authenticated(info):
 class OfficeType(DjangoObjectType):
     class Meta:
         model = Office
-        fields = ("uuid", "name")
+        fields = ("uuid", "name", "capacity", "retired_at")
 
 
 class UserType(DjangoObjectType):
@@ -34,28 +64,303 @@ class BookingType(DjangoObjectType):
         model = Booking
         interfaces = (Node,)
         fields = ("uuid", "office", "user", "date")
-        filter_fields = ["user__squad", "date", "office_id"]
+        filterset_class = BookingFilter
+
+    # the series of occurrences of recurring bookings, null for others
+    recurring_booking = graphene.Field(lambda: RecurringBookingType)
+    # pass the cursor of the last booking of a page to allBookings as
+    # `after` to fetch the next one
+    cursor = graphene.String()
+
+    def resolve_cursor(self, info):
+        return booking_to_cursor(self)
+
+    def resolve_office(self, info):
+        if Booking.office.is_cached(self):
+            return self.office
+        return get_loaders(info).office.load(self.office_id)
+
+    def resolve_user(self, info):
+        if Booking.user.is_cached(self):
+            return self.user
+        return get_loaders(info).user.load(self.user_id)
+
+
+class Weekday(graphene.Enum):
+    MONDAY = 0
+    TUESDAY = 1
+    WEDNESDAY = 2
+    THURSDAY = 3
+    FRIDAY = 4
+    SATURDAY = 5
+    SUNDAY = 6
+
+
+class RecurringBookingType(DjangoObjectType):
+    class Meta:
+        model = RecurringBooking
+        fields = (
+            "uuid",
+            "office",
+            "user",
+            "weekdays",
+            "interval",
+            "start_date",
+            "end_date",
+        )
+
+    weekdays = graphene.List(graphene.NonNull(Weekday))
+
+    def resolve_weekdays(self, info):
+        return recurrence.to_weekdays(self.weekdays)
+
+
+class SquadCountType(graphene.ObjectType):
+    squad = graphene.String()
+    count = graphene.Int()
+
+
+class OccupancyDayType(graphene.ObjectType):
+    date = graphene.Date()
+    count = graphene.Int()
+    capacity = graphene.Int()
+    squads = graphene.List(SquadCountType)
+
+
+class SquadPresenceDayType(graphene.ObjectType):
+    date = graphene.Date()
+    count = graphene.Int()
+    users = graphene.List(UserType)
+
+    def resolve_users(self, info):
+        return get_loaders(info).user.load_many(self.user_ids)
+
+
+def to_presence_days(days):
+    presence_days = []
+    for date, user_ids in days:
+        presence_day = SquadPresenceDayType(date=date, count=len(user_ids))
+        presence_day.user_ids = sorted(user_ids)
+        presence_days.append(presence_day)
+    return presence_days
+
+
+def get_squad_presence(info, squad, date_from, date_to):
+    is_user_authenticated(info)
+    if date_to < date_from:
+        raise GraphQLError("`to` can't be before `from`")
+    check_page_size((date_to - date_from).days + 1, info)
+    return presence.index.get_presence(squad, date_from, date_to)
 
 
 class BookingQuery(graphene.ObjectType):
-    all_bookings = graphene.List(BookingType)
-    all_offices = graphene.List(OfficeType)
-    filter_bookings = DjangoFilterConnectionField(BookingType)
+    all_bookings = graphene.List(
+        BookingType, first=graphene.Int(), after=graphene.String()
+    )
+    # offices after the one with the uuid `after`, to fetch the next page
+    all_offices = graphene.List(OfficeType, first=graphene.Int(), after=graphene.UUID())
+    # series after the one with the uuid `after`, to fetch the next page
+    recurring_bookings = graphene.List(
+        RecurringBookingType, first=graphene.Int(), after=graphene.UUID()
+    )
+    filter_bookings = BookingConnectionField(BookingType)
+    office_occupancy = graphene.List(
+        OccupancyDayType,
+        office_id=graphene.UUID(required=True),
+        date_from=graphene.Date(name="from", required=True),
+        date_to=graphene.Date(name="to", required=True),
+    )
+    squad_presence = graphene.List(
+        SquadPresenceDayType,
+        squad=graphene.String(required=True),
+        date_from=graphene.Date(name="from", required=True),
+        date_to=graphene.Date(name="to", required=True),
+    )
+    # the days most of a squad is in, to recommend when to come in
+    best_days = graphene.List(
+        SquadPresenceDayType,
+        squad=graphene.String(required=True),
+        date_from=graphene.Date(name="from", required=True),
+        date_to=graphene.Date(name="to", required=True),
+        first=graphene.Int(default_value=3),
+    )
 
     @staticmethod
-    def resolve_all_bookings(root, info):
+    def resolve_all_bookings(root, info, first=None, after=None):
         is_user_authenticated(info)
-        return Booking.objects.all()
+        first = check_page_size(first, info)
+        bookings = optimize_queryset(
+            order_by_key(Booking.objects.all()),
+            info,
+            fields=BookingConnectionField.ordering,
+        )
+        after = cursor_to_key(after) if after else None
+        archived = archive.filter_archive({}, after)
+        if after is not None:
+            bookings = bookings.filter(after_key(*after))
+            if archived is not None:
+                archived = archived.filter(after_key(*after))
+        sources = [list(bookings[:first])]
+        if archived is not None:
+            sources.append(list(archive.as_bookings(order_by_key(archived)[:first])))
+        bound = recurrence.page_bound(sources, first)
+        occurrences = recurrence.filter_occurrences({}, after, bound=bound)
+        return list(islice(recurrence.merge(*sources, occurrences), first))
 
     @staticmethod
-    def resolve_all_offices(root, info):
+    def resolve_all_offices(root, info, first=None, after=None):
         is_user_authenticated(info)
-        return Office.objects.all()
+        first = check_page_size(first, info)
+        offices = get_offices()
+        if after is not None:
+            uuids = [office.uuid for office in offices]
+            if after not in uuids:
+                raise GraphQLError(MISSING_OFFICE_ERROR)
+            offices = offices[uuids.index(after) + 1 :]
+        return offices[:first]
+
+    @staticmethod
+    def resolve_recurring_bookings(root, info, first=None, after=None):
+        is_user_authenticated(info)
+        first = check_page_size(first, info)
+        recurrings = info.context.user.recurring_booking.order_by("start_date", "uuid")
+        if after is not None:
+            start_date = (
+                recurrings.filter(uuid=after)
+                .values_list("start_date", flat=True)
+                .first()
+            )
+            if start_date is None:
+                raise GraphQLError(MISSING_RECURRING_BOOKING_ERROR)
+            recurrings = recurrings.filter(
+                Q(start_date__gt=start_date) | Q(start_date=start_date, uuid__gt=after)
+            )
+        return recurrings[:first]
 
     @staticmethod
     def resolve_filter_bookings(root, info, *args, **kwargs):
         is_user_authenticated(info)
-        return Booking.objects.all()
+        return optimize_queryset(
+            Booking.objects.all(),
+            info,
+            connection=True,
+            fields=BookingConnectionField.ordering,
+        )
+
+    @staticmethod
+    def resolve_office_occupancy(root, info, office_id, date_from, date_to):
+        is_user_authenticated(info)
+        if date_to < date_from:
+            raise GraphQLError("`to` can't be before `from`")
+        check_page_size((date_to - date_from).days + 1, info)
+        try:
+            office = Office.objects.only("capacity").get(
+                uuid=office_id, retired_at__isnull=True
+            )
+        except Office.DoesNotExist:
+            raise GraphQLError(MISSING_OFFICE_ERROR)
+
+        days = {}
+        for day in range((date_to - date_from).days + 1):
+            date = date_from + timedelta(days=day)
+            days[date] = OccupancyDayType(
+                date=date, count=0, capacity=office.capacity, squads=[]
+            )
+        dates = {"office_id": office_id, "date__range": (date_from, date_to)}
+        for date, count in OfficeOccupancy.objects.filter(**dates).values_list(
+            "date", "count"
+        ):
+            days[date].count = count
+        squads = SquadOccupancy.objects.filter(count__gt=0, **dates).order_by("squad")
+        for date, squad, count in squads.values_list("date", "squad", "count"):
+            days[date].squads.append(SquadCountType(squad=squad or None, count=count))
+        return list(days.values())
+
+    @staticmethod
+    def resolve_squad_presence(root, info, squad, date_from, date_to):
+        days = get_squad_presence(info, squad, date_from, date_to)
+        return to_presence_days(days.items())
+
+    @staticmethod
+    def resolve_best_days(root, info, squad, date_from, date_to, first=3):
+        first = check_page_size(first, info)
+        days = get_squad_presence(info, squad, date_from, date_to)
+        return to_presence_days(presence.get_best_days(days, first))
+
+
+class BookingEventKind(graphene.Enum):
+    CREATED = events.CREATED
+    UPDATED = events.UPDATED
+    DELETED = events.DELETED
+
+
+class BookingEventType(graphene.ObjectType):
+    kind = graphene.Field(BookingEventKind)
+    booking = graphene.Field(BookingType)
+    previous_office_id = graphene.UUID()
+    previous_date = graphene.Date()
+
+
+class BookingSubscription(graphene.ObjectType):
+    booking_events = graphene.Field(
+        BookingEventType,
+        office_id=graphene.UUID(required=True),
+        date_from=graphene.Date(name="from", required=True),
+        date_to=graphene.Date(name="to", required=True),
+    )
+
+    @staticmethod
+    def resolve_booking_events(root, info, office_id, date_from, date_to):
+        """Bookings created, updated or deleted in an office between two dates.
+
+        Bookings moved out of the office or dates are reported as updated.
+        """
+        is_user_authenticated(info)
+        if date_to < date_from:
+            raise GraphQLError("`to` can't be before `from`")
+
+        def concerns(event):
+            return any(
+                office == office_id and day is not None and date_from <= day <= date_to
+                for office, day in [
+                    (event["office_id"], event["date"]),
+                    (event["previous_office_id"], event["previous_date"]),
+                ]
+            )
+
+        def to_type(event):
+            # every event loads its office and user afresh
+            info.context.loaders = None
+            booking = Booking(
+                uuid=event["uuid"],
+                office_id=event["office_id"],
+                user_id=event["user_id"],
+                date=event["date"],
+            )
+            return BookingEventType(
+                kind=event["kind"],
+                booking=booking,
+                previous_office_id=event["previous_office_id"],
+                previous_date=event["previous_date"],
+            )
+
+        schedule = getattr(info.context, "schedule", None)
+        return events.observe(office_id, schedule).filter(concerns).map(to_type)
+
+
+def office_full_error(office_id):
+    # retired offices refuse bookings as if they were full
+    if Office.objects.filter(uuid=office_id, retired_at__isnull=False).exists():
+        return GraphQLError(MISSING_OFFICE_ERROR)
+    return GraphQLError(OFFICE_FULL_ERROR)
+
+
+def is_booked_elsewhere(user, date):
+    """Whether ``user`` has a recurring or archived booking on ``date``."""
+    return bool(
+        recurrence.get_booked_dates(user, [date])
+        or archive.get_archived_dates(user, [date])
+    )
 
 
 class BookingCreateMutation(graphene.Mutation):
@@ -68,15 +373,17 @@ class BookingCreateMutation(graphene.Mutation):
     @classmethod
     def mutate(cls, root, info, office_id, date):
         is_user_authenticated(info)
+        booking = Booking(
+            uuid=uuid4(), office_id=office_id, user=info.context.user, date=date
+        )
+        if is_booked_elsewhere(info.context.user, date):
+            raise GraphQLError(DOUBLE_BOOKING_ERROR)
         try:
-            booking = Booking.objects.create(
-                uuid=str(uuid4()),
-                office_id=office_id,
-                user=info.context.user,
-                date=date,
-            )
+            services.create_booking(booking)
         except IntegrityError:
-            raise GraphQLError("you can't book onto more than 1 office a day")
+            raise GraphQLError(DOUBLE_BOOKING_ERROR)
+        except services.OfficeFullError:
+            raise office_full_error(booking.office_id)
         return BookingCreateMutation(booking=booking)
 
 
@@ -92,30 +399,36 @@ class BookingUpdateMutation(graphene.Mutation):
     def mutate(cls, root, info, uuid, office_id=None, date=None):
         is_user_authenticated(info)
         try:
-            booking = Booking.objects.get(uuid=uuid, user=info.context.user)
+            booking = info.context.user.booking.get(uuid=uuid)
         except Booking.DoesNotExist:
-            raise GraphQLError("this booking does not exist")
+            raise GraphQLError(MISSING_BOOKING_ERROR)
+        previous_key = services.booking_key(booking)
+        if office_id:
+            booking.office_id = office_id
+        if date:
+            booking.date = date
+        if is_booked_elsewhere(info.context.user, booking.date):
+            raise GraphQLError(DOUBLE_BOOKING_ERROR)
         try:
-            if office_id:
-                booking.office_id = office_id
-            if date:
-                booking.date = date
-            booking.save()
+            services.update_booking(booking, previous_key)
         except IntegrityError:
-            raise GraphQLError("you can't book onto more than 1 office a day")
+            raise GraphQLError(DOUBLE_BOOKING_ERROR)
+        except services.OfficeFullError:
+            raise office_full_error(booking.office_id)
         return BookingCreateMutation(booking=booking)
 
 
 class OfficeCreateMutation(graphene.Mutation):
     class Arguments:
         name = graphene.String(required=True)
+        capacity = graphene.Int(required=False)
 
     office = graphene.Field(OfficeType)
 
     @classmethod
-    def mutate(cls, root, info, name):
+    def mutate(cls, root, info, name, capacity=None):
         is_user_authenticated(info)
-        office = Office.objects.create(uuid=uuid4(), name=name)
+        office = Office.objects.create(uuid=uuid4(), name=name, capacity=capacity)
         return OfficeCreateMutation(office=office)
 
 
@@ -123,22 +436,31 @@ class OfficeUpdateMutation(graphene.Mutation):
     class Arguments:
         uuid = graphene.UUID(required=True)
         name = graphene.String(required=True)
+        capacity = graphene.Int(required=False)
 
     office = graphene.Field(OfficeType)
 
     @classmethod
-    def mutate(cls, root, info, uuid, name):
+    def mutate(cls, root, info, uuid, name, capacity=None):
         is_user_authenticated(info)
         try:
-            office = Office.objects.get(uuid=uuid)
+            office = Office.objects.get(uuid=uuid, retired_at__isnull=True)
         except Office.DoesNotExist:
-            raise GraphQLError("This office does not exist")
+            raise GraphQLError(MISSING_OFFICE_ERROR)
         office.name = name
+        if capacity is not None:
+            office.capacity = capacity
         office.save()
         return OfficeUpdateMutation(office=office)
 
 
 class OfficeDeleteMutation(graphene.Mutation):
+    """Retire an office at once and purge its bookings in the background.
+
+    The office is hidden and takes no more bookings straight away, its rows
+    are deleted in batches of ``OFFICE_PURGE_BATCH_SIZE`` after.
+    """
+
     class Arguments:
         uuid = graphene.UUID(required=True)
 
@@ -147,8 +469,12 @@ class OfficeDeleteMutation(graphene.Mutation):
     @classmethod
     def mutate(cls, root, info, uuid):
         is_user_authenticated(info)
-        # TODO: check what to respond here
-        return Office.objects.filter(uuid=uuid).delete()
+        office = purge.retire_office(uuid)
+        if office is None:
+            raise GraphQLError(MISSING_OFFICE_ERROR)
+        if settings.OFFICE_PURGE_IN_BACKGROUND:
+            purge.purge_in_background(office)
+        return OfficeDeleteMutation(office=office)
 
 
 class BookingDeleteMutation(graphene.Mutation):
@@ -160,8 +486,310 @@ class BookingDeleteMutation(graphene.Mutation):
     @classmethod
     def mutate(cls, root, info, uuid):
         is_user_authenticated(info)
-        # TODO: check what to respond here
-        return Booking.objects.filter(uuid=uuid, user=info.context.user).delete()
+        try:
+            booking = info.context.user.booking.get(uuid=uuid)
+        except Booking.DoesNotExist:
+            return BookingDeleteMutation(booking=None)
+        services.delete_booking(booking)
+        return BookingDeleteMutation(booking=booking)
+
+
+class BookingInput(graphene.InputObjectType):
+    office_id = graphene.UUID(required=True)
+    date = graphene.Date(required=True)
+
+
+class BookingUpdateInput(graphene.InputObjectType):
+    uuid = graphene.UUID(required=True)
+    office_id = graphene.UUID(required=False)
+    date = graphene.Date(required=False)
+
+
+class BookingResult(graphene.ObjectType):
+    uuid = graphene.UUID()
+    booking = graphene.Field(BookingType)
+    error = graphene.String()
+
+
+def check_bulk_size(items):
+    if len(items) > settings.BOOKINGS_MAX_BULK_SIZE:
+        raise GraphQLError(
+            "you can't change more than %s bookings at once"
+            % settings.BOOKINGS_MAX_BULK_SIZE
+        )
+
+
+def pending_results(results):
+    return [result for result in results if not result.error]
+
+
+def reject(result, error):
+    result.error = error
+    result.booking = None
+
+
+def find_missing_offices(results):
+    pending = pending_results(results)
+    offices = set(
+        Office.objects.filter(
+            uuid__in={result.booking.office_id for result in pending},
+            retired_at__isnull=True,
+        ).values_list("uuid", flat=True)
+    )
+    for result in pending:
+        if result.booking.office_id not in offices:
+            reject(result, MISSING_OFFICE_ERROR)
+
+
+def find_double_bookings(user, results, current_dates=None):
+    """Reject every pending booking on a date the user has already booked.
+
+    One query finds clashes with the stored bookings that stay where they
+    are, another with recurring bookings and one with the archive when the
+    dates reach back into it, then the batch is checked against itself.
+    Bookings keeping the date in ``current_dates`` they have now claim it
+    first, so it's the bookings moved onto it that clash whatever the order
+    of the batch.
+    """
+    pending = pending_results(results)
+    dates = {result.booking.date for result in pending}
+    booked = set(
+        Booking.objects.filter(user=user, date__in=dates)
+        .exclude(uuid__in=[result.booking.uuid for result in pending])
+        .values_list("date", flat=True)
+    )
+    booked |= recurrence.get_booked_dates(user, dates)
+    booked |= archive.get_archived_dates(user, dates)
+    current_dates = current_dates or {}
+    pending.sort(
+        key=lambda result: current_dates.get(result.uuid) != result.booking.date
+    )
+    for result in pending:
+        if result.booking.date in booked:
+            reject(result, DOUBLE_BOOKING_ERROR)
+        else:
+            booked.add(result.booking.date)
+
+
+def save_bookings(results, save):
+    pending = pending_results(results)
+    try:
+        refused = save([result.booking for result in pending])
+    except IntegrityError:
+        for result in pending:
+            reject(result, DOUBLE_BOOKING_ERROR)
+        return
+    refused = {booking.uuid for booking in refused}
+    for result in pending:
+        if result.booking.uuid in refused:
+            reject(result, OFFICE_FULL_ERROR)
+
+
+class BookingsCreateMutation(graphene.Mutation):
+    class Arguments:
+        bookings = graphene.List(graphene.NonNull(BookingInput), required=True)
+
+    results = graphene.List(BookingResult)
+
+    @classmethod
+    def mutate(cls, root, info, bookings):
+        is_user_authenticated(info)
+        check_bulk_size(bookings)
+        user = info.context.user
+        results = []
+        for item in bookings:
+            booking = Booking(
+                uuid=uuid4(), office_id=item.office_id, user=user, date=item.date
+            )
+            results.append(BookingResult(uuid=booking.uuid, booking=booking))
+        find_missing_offices(results)
+        find_double_bookings(user, results)
+        save_bookings(results, services.create_bookings)
+        return BookingsCreateMutation(results=results)
+
+
+class BookingsUpdateMutation(graphene.Mutation):
+    class Arguments:
+        bookings = graphene.List(graphene.NonNull(BookingUpdateInput), required=True)
+
+    results = graphene.List(BookingResult)
+
+    @classmethod
+    def mutate(cls, root, info, bookings):
+        is_user_authenticated(info)
+        check_bulk_size(bookings)
+        user = info.context.user
+        stored = user.booking.in_bulk([item.uuid for item in bookings])
+        previous_keys = {
+            booking.uuid: services.booking_key(booking) for booking in stored.values()
+        }
+        results = []
+        for item in bookings:
+            booking = stored.pop(item.uuid, None)
+            if booking is None:
+                results.append(
+                    BookingResult(uuid=item.uuid, error=MISSING_BOOKING_ERROR)
+                )
+                continue
+            if item.office_id:
+                booking.office_id = item.office_id
+            if item.date:
+                booking.date = item.date
+            results.append(BookingResult(uuid=booking.uuid, booking=booking))
+        find_missing_offices(results)
+        find_double_bookings(
+            user, results, {uuid: date for uuid, (_, date) in previous_keys.items()}
+        )
+        save_bookings(
+            results,
+            lambda bookings: services.update_bookings(bookings, previous_keys),
+        )
+        return BookingsUpdateMutation(results=results)
+
+
+class BookingsDeleteMutation(graphene.Mutation):
+    class Arguments:
+        uuids = graphene.List(graphene.NonNull(graphene.UUID), required=True)
+
+    results = graphene.List(BookingResult)
+
+    @classmethod
+    def mutate(cls, root, info, uuids):
+        is_user_authenticated(info)
+        check_bulk_size(uuids)
+        bookings = list(
+            info.context.user.booking.filter(uuid__in=uuids).only(
+                "uuid", "office_id", "user_id", "date"
+            )
+        )
+        # bookings moved or deleted since they were read are missing too
+        deleted = {booking.uuid for booking in services.delete_bookings(bookings)}
+        results = []
+        for uuid in uuids:
+            if uuid in deleted:
+                deleted.remove(uuid)
+                results.append(BookingResult(uuid=uuid))
+            else:
+                results.append(BookingResult(uuid=uuid, error=MISSING_BOOKING_ERROR))
+        return BookingsDeleteMutation(results=results)
+
+
+def check_recurrence(weekdays, interval, start_date, end_date):
+    if not weekdays:
+        raise GraphQLError("a recurring booking needs at least one weekday")
+    if interval < 1:
+        raise GraphQLError("`interval` must be at least 1")
+    if end_date is not None and end_date < start_date:
+        raise GraphQLError("`endDate` can't be before `startDate`")
+
+
+def save_recurring_booking(recurring):
+    if not Office.objects.filter(
+        uuid=recurring.office_id, retired_at__isnull=True
+    ).exists():
+        raise GraphQLError(MISSING_OFFICE_ERROR)
+    try:
+        services.save_recurring_booking(recurring)
+    except services.ConflictError as e:
+        raise GraphQLError(
+            "%s, already booked on %s"
+            % (DOUBLE_BOOKING_ERROR, ", ".join(day.isoformat() for day in e.args[0]))
+        )
+    except services.OfficeFullError as e:
+        raise GraphQLError(
+            OFFICE_FULL_DAYS_ERROR % ", ".join(day.isoformat() for day in e.args[0])
+        )
+
+
+class RecurringBookingCreateMutation(graphene.Mutation):
+    class Arguments:
+        office_id = graphene.UUID(required=True)
+        weekdays = graphene.List(graphene.NonNull(Weekday), required=True)
+        interval = graphene.Int(default_value=1)
+        start_date = graphene.Date(required=True)
+        end_date = graphene.Date()
+
+    recurring_booking = graphene.Field(RecurringBookingType)
+
+    @classmethod
+    def mutate(
+        cls, root, info, office_id, weekdays, start_date, interval=1, end_date=None
+    ):
+        is_user_authenticated(info)
+        check_recurrence(weekdays, interval, start_date, end_date)
+        recurring = RecurringBooking(
+            uuid=uuid4(),
+            office_id=office_id,
+            user=info.context.user,
+            weekdays=recurrence.to_mask(weekdays),
+            interval=interval,
+            start_date=start_date,
+            end_date=end_date,
+        )
+        save_recurring_booking(recurring)
+        return RecurringBookingCreateMutation(recurring_booking=recurring)
+
+
+class RecurringBookingUpdateMutation(graphene.Mutation):
+    """Replace the pattern of a recurring booking, past occurrences included.
+
+    As with ``createRecurringBooking``, without an ``endDate`` the booking
+    goes on forever.
+    """
+
+    class Arguments:
+        uuid = graphene.UUID(required=True)
+        office_id = graphene.UUID(required=True)
+        weekdays = graphene.List(graphene.NonNull(Weekday), required=True)
+        interval = graphene.Int(default_value=1)
+        start_date = graphene.Date(required=True)
+        end_date = graphene.Date()
+
+    recurring_booking = graphene.Field(RecurringBookingType)
+
+    @classmethod
+    def mutate(
+        cls,
+        root,
+        info,
+        uuid,
+        office_id,
+        weekdays,
+        start_date,
+        interval=1,
+        end_date=None,
+    ):
+        is_user_authenticated(info)
+        try:
+            recurring = info.context.user.recurring_booking.get(uuid=uuid)
+        except RecurringBooking.DoesNotExist:
+            raise GraphQLError(MISSING_RECURRING_BOOKING_ERROR)
+        check_recurrence(weekdays, interval, start_date, end_date)
+        recurring.office_id = office_id
+        recurring.weekdays = recurrence.to_mask(weekdays)
+        recurring.interval = interval
+        recurring.start_date = start_date
+        recurring.end_date = end_date
+        save_recurring_booking(recurring)
+        return RecurringBookingUpdateMutation(recurring_booking=recurring)
+
+
+class RecurringBookingDeleteMutation(graphene.Mutation):
+    class Arguments:
+        uuid = graphene.UUID(required=True)
+
+    recurring_booking = graphene.Field(RecurringBookingType)
+
+    @classmethod
+    def mutate(cls, root, info, uuid):
+        is_user_authenticated(info)
+        try:
+            recurring = info.context.user.recurring_booking.get(uuid=uuid)
+        except RecurringBooking.DoesNotExist:
+            return RecurringBookingDeleteMutation(recurring_booking=None)
+        recurring.delete()
+        recurring.uuid = uuid
+        return RecurringBookingDeleteMutation(recurring_booking=recurring)
 
 
 class BookingMutation(graphene.ObjectType):
@@ -172,3 +800,9 @@ class BookingMutation(graphene.ObjectType):
     update_office = OfficeUpdateMutation.Field()
     delete_office = OfficeDeleteMutation.Field()
     delete_booking = BookingDeleteMutation.Field()
+    create_bookings = BookingsCreateMutation.Field()
+    update_bookings = BookingsUpdateMutation.Field()
+    delete_bookings = BookingsDeleteMutation.Field()
+    create_recurring_booking = RecurringBookingCreateMutation.Field()
+    update_recurring_booking = RecurringBookingUpdateMutation.Field()
+    delete_recurring_booking = RecurringBookingDeleteMutation.Field()
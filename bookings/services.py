@@ -0,0 +1,418 @@
+from collections import Counter
+from functools import reduce
+from operator import or_
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import (
+    Case,
+    Count,
+    F,
+    IntegerField,
+    OuterRef,
+    PositiveIntegerField,
+    Q,
+    Subquery,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from bookings import events, recurrence
+from bookings.models import (
+    ArchivedBooking,
+    Booking,
+    Office,
+    OfficeOccupancy,
+    RecurringBooking,
+    SquadOccupancy,
+)
+
+# stands in for the capacity of offices without one
+UNLIMITED = 2**31 - 1
+
+# retired offices have no desks left while they are purged
+CAPACITY = Case(
+    When(retired_at__isnull=False, then=Value(0)),
+    default=F("capacity"),
+    output_field=PositiveIntegerField(),
+)
+
+
+class OfficeFullError(Exception):
+    pass
+
+
+class ConflictError(Exception):
+    pass
+
+
+def booking_key(booking):
+    return booking.office_id, booking.date
+
+
+def admit(office_id, date, count=1):
+    """Take ``count`` desks in an office on a date if they are free.
+
+    The check and the increment are a single conditional ``UPDATE``, so
+    concurrent requests can't overbook even though nothing is locked up
+    front. Being the first statement of a transaction it also takes the
+    SQLite write lock straight away rather than upgrading a read lock.
+    """
+    capacity = Coalesce(
+        Subquery(Office.objects.filter(uuid=office_id).values(desks=CAPACITY)),
+        Value(UNLIMITED),
+    )
+    occupancy = OfficeOccupancy.objects.filter(
+        office_id=office_id, date=date, count__lte=capacity - count
+    )
+    if occupancy.update(count=F("count") + count):
+        return True
+    # the first booking of the day creates the counter row
+    OfficeOccupancy.objects.bulk_create(
+        [OfficeOccupancy(office_id=office_id, date=date)], ignore_conflicts=True
+    )
+    return bool(occupancy.update(count=F("count") + count))
+
+
+def release(office_id, date, count=1):
+    OfficeOccupancy.objects.filter(
+        office_id=office_id, date=date, count__gte=count
+    ).update(count=F("count") - count)
+
+
+class Refused(Exception):
+    pass
+
+
+def admit_all(keys):
+    """Admit ``(office_id, date) -> count`` groups, returning those refused.
+
+    All groups are first tried in one conditional ``UPDATE``. Only when some
+    office day is full is that rolled back and each group admitted on its own
+    to find out which.
+    """
+    if len(keys) < 2:
+        return {key for key, count in keys.items() if not admit(*key, count=count)}
+    OfficeOccupancy.objects.bulk_create(
+        [OfficeOccupancy(office_id=office_id, date=date) for office_id, date in keys],
+        ignore_conflicts=True,
+    )
+    delta = Case(
+        *[
+            When(office_id=office_id, date=date, then=Value(count))
+            for (office_id, date), count in keys.items()
+        ],
+        output_field=PositiveIntegerField(),
+    )
+    capacity = Coalesce(
+        Subquery(
+            Office.objects.filter(uuid=OuterRef("office_id")).values(desks=CAPACITY)
+        ),
+        Value(UNLIMITED),
+    )
+    occupancy = OfficeOccupancy.objects.filter(
+        reduce(or_, (Q(office_id=office_id, date=date) for office_id, date in keys)),
+        count__lte=capacity - delta,
+    )
+    try:
+        with transaction.atomic():
+            if occupancy.update(count=F("count") + delta) != len(keys):
+                raise Refused()
+        return set()
+    except Refused:
+        return {key for key, count in keys.items() if not admit(*key, count=count)}
+
+
+def release_all(keys):
+    """Give back ``(office_id, date) -> count`` desks in one ``UPDATE``."""
+    if not keys:
+        return
+    delta = Case(
+        *[
+            When(office_id=office_id, date=date, then=Value(count))
+            for (office_id, date), count in keys.items()
+        ],
+        output_field=IntegerField(),
+    )
+    OfficeOccupancy.objects.filter(
+        reduce(or_, (Q(office_id=office_id, date=date) for office_id, date in keys))
+    ).update(count=Greatest(F("count") - delta, Value(0)))
+
+
+def get_squads(bookings):
+    """Map the user of each booking to their squad, blank for none."""
+    squads = {
+        booking.user_id: booking.user.squad
+        for booking in bookings
+        if Booking.user.is_cached(booking)
+    }
+    missing = {booking.user_id for booking in bookings} - squads.keys()
+    if missing:
+        squads.update(
+            get_user_model().objects.filter(id__in=missing).values_list("id", "squad")
+        )
+    return {user_id: squad or "" for user_id, squad in squads.items()}
+
+
+def count_squads(bookings, squads, keys=None):
+    """Count bookings per office, date and squad.
+
+    ``keys`` maps a booking's uuid to the office and date to count it under
+    when that isn't where the booking is now, e.g. before it was moved.
+    """
+    keys = keys or {}
+    return Counter(
+        keys.get(booking.uuid, booking_key(booking)) + (squads[booking.user_id],)
+        for booking in bookings
+    )
+
+
+def add_squad_counts(added, removed=None):
+    """Apply ``added`` minus ``removed`` to the squad occupancy aggregates."""
+    deltas = Counter(added)
+    deltas.subtract(removed or {})
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    SquadOccupancy.objects.bulk_create(
+        [
+            SquadOccupancy(office_id=office_id, date=date, squad=squad)
+            for office_id, date, squad in deltas
+        ],
+        ignore_conflicts=True,
+    )
+    keys = [
+        Q(office_id=office_id, date=date, squad=squad)
+        for office_id, date, squad in deltas
+    ]
+    delta = Case(
+        *[When(key, then=Value(count)) for key, count in zip(keys, deltas.values())],
+        output_field=IntegerField(),
+    )
+    SquadOccupancy.objects.filter(reduce(or_, keys)).update(
+        count=Greatest(F("count") + delta, Value(0))
+    )
+
+
+def recount_days(office_ids, date_from, date_to):
+    """Rebuild the aggregates of some offices over a range of days.
+
+    Archived bookings keep their desks, so they are counted with the others.
+    """
+    days = {"office_id__in": office_ids, "date__range": (date_from, date_to)}
+    office_counts = Counter()
+    squad_counts = Counter()
+    for model in (Booking, ArchivedBooking):
+        bookings = model.objects.filter(**days).order_by()
+        for row in bookings.values("office_id", "date").annotate(count=Count("uuid")):
+            office_counts[row["office_id"], row["date"]] += row["count"]
+        for row in bookings.values(
+            "office_id", "date", squad=Coalesce("user__squad", Value(""))
+        ).annotate(count=Count("uuid")):
+            squad_counts[row["office_id"], row["date"], row["squad"]] += row["count"]
+    OfficeOccupancy.objects.filter(**days).delete()
+    OfficeOccupancy.objects.bulk_create(
+        OfficeOccupancy(office_id=office_id, date=date, count=count)
+        for (office_id, date), count in office_counts.items()
+    )
+    SquadOccupancy.objects.filter(**days).delete()
+    SquadOccupancy.objects.bulk_create(
+        SquadOccupancy(office_id=office_id, date=date, squad=squad, count=count)
+        for (office_id, date, squad), count in squad_counts.items()
+    )
+
+
+def create_booking(booking):
+    squads = get_squads([booking])
+    with transaction.atomic():
+        if not admit(*booking_key(booking)):
+            raise OfficeFullError(booking_key(booking))
+        booking.save(force_insert=True)
+        add_squad_counts(count_squads([booking], squads))
+        events.publish(events.CREATED, [booking])
+    return booking
+
+
+def update_booking(booking, previous_key):
+    squads = get_squads([booking])
+    with transaction.atomic():
+        if booking_key(booking) != previous_key:
+            if not admit(*booking_key(booking)):
+                raise OfficeFullError(booking_key(booking))
+            release(*previous_key)
+            add_squad_counts(
+                count_squads([booking], squads),
+                count_squads([booking], squads, {booking.uuid: previous_key}),
+            )
+        booking.save()
+        events.publish(events.UPDATED, [booking], {booking.uuid: previous_key})
+    return booking
+
+
+def delete_booking(booking):
+    return bool(delete_bookings([booking]))
+
+
+def create_bookings(bookings):
+    """Insert ``bookings`` in one transaction, skipping full office days.
+
+    Returns the bookings that were refused because their office was full.
+    """
+    squads = get_squads(bookings)
+    with transaction.atomic():
+        full = admit_all(Counter(map(booking_key, bookings)))
+        refused = [booking for booking in bookings if booking_key(booking) in full]
+        admitted = [b for b in bookings if booking_key(b) not in full]
+        Booking.objects.bulk_create(admitted)
+        add_squad_counts(count_squads(admitted, squads))
+        events.publish(events.CREATED, admitted)
+    return refused
+
+
+def update_bookings(bookings, previous_keys):
+    """Save moved ``bookings`` in one transaction, skipping full office days.
+
+    ``previous_keys`` maps each booking's uuid to its office and date before
+    it was changed. Returns the bookings refused because of a full office.
+    Bookings may swap dates: those changing date are first cleared of it, as
+    the uniqueness of a user's dates is checked row by row.
+    """
+    moved = [
+        booking
+        for booking in bookings
+        if booking_key(booking) != previous_keys[booking.uuid]
+    ]
+    squads = get_squads(moved)
+    with transaction.atomic():
+        full = admit_all(Counter(map(booking_key, moved)))
+        refused = [booking for booking in moved if booking_key(booking) in full]
+        refused_uuids = {booking.uuid for booking in refused}
+        moved = [booking for booking in moved if booking.uuid not in refused_uuids]
+        release_all(Counter(previous_keys[booking.uuid] for booking in moved))
+        add_squad_counts(
+            count_squads(moved, squads), count_squads(moved, squads, previous_keys)
+        )
+        saved = [booking for booking in bookings if booking.uuid not in refused_uuids]
+        redated = [b.uuid for b in saved if b.date != previous_keys[b.uuid][1]]
+        if len(redated) > 1:
+            Booking.objects.filter(uuid__in=redated).update(date=None)
+        Booking.objects.bulk_update(saved, ["office", "date"])
+        events.publish(events.UPDATED, saved, previous_keys)
+    return refused
+
+
+def matching(bookings):
+    """The rows of ``bookings`` still at the office and date they were read
+    with, so that bookings moved since are left alone."""
+    return Booking.objects.filter(
+        reduce(
+            or_,
+            (
+                Q(
+                    uuid__in=[booking.uuid for booking in group],
+                    office_id=office_id,
+                    date=date,
+                )
+                for (office_id, date), group in group_by_key(bookings).items()
+            ),
+        )
+    )
+
+
+def delete_bookings(bookings):
+    """Delete ``bookings`` in one transaction, returning those that went.
+
+    All rows are first deleted in one statement. Only when some of them
+    moved or went already is that rolled back, and the rows still where
+    they were read are locked and deleted, so that exactly those are
+    released and reported.
+    """
+    squads = get_squads(bookings)
+    with transaction.atomic():
+        if len(bookings) < 2:
+            # a single row is deleted or not, there is nothing to roll back
+            count = matching(bookings).delete()[0] if bookings else 0
+            deleted = bookings if count else []
+        else:
+            try:
+                with transaction.atomic():
+                    count, _ = matching(bookings).delete()
+                    if count != len(bookings):
+                        raise Refused()
+                deleted = bookings
+            except Refused:
+                present = set(
+                    matching(bookings)
+                    .select_for_update()
+                    .values_list("uuid", flat=True)
+                )
+                deleted = [booking for booking in bookings if booking.uuid in present]
+                if deleted:
+                    matching(deleted).delete()
+        release_all(Counter(map(booking_key, deleted)))
+        add_squad_counts({}, count_squads(deleted, squads))
+        events.publish(events.DELETED, deleted)
+    return deleted
+
+
+def group_by_key(bookings):
+    groups = {}
+    for booking in bookings:
+        groups.setdefault(booking_key(booking), []).append(booking)
+    return groups
+
+
+def find_full_days(recurring):
+    """Days to come, up to the horizon, on which ``recurring`` would find its
+    office full.
+
+    Occurrences take no desks, so the one-off bookings counted in the
+    office's occupancy are added up with the occurrences of its other
+    series on those days.
+    """
+    capacity = (
+        Office.objects.filter(uuid=recurring.office_id)
+        .values_list("capacity", flat=True)
+        .first()
+    )
+    if capacity is None:
+        return []
+    dates = list(recurrence.get_dates(recurring, timezone.localdate()))
+    if not dates:
+        return []
+    counts = Counter(
+        dict(
+            OfficeOccupancy.objects.filter(
+                office_id=recurring.office_id, date__range=(dates[0], dates[-1])
+            ).values_list("date", "count")
+        )
+    )
+    others = recurrence.overlapping(
+        RecurringBooking.objects.filter(office_id=recurring.office_id).exclude(
+            uuid=recurring.uuid
+        ),
+        dates[0],
+        dates[-1],
+    )
+    for other in others:
+        counts.update(recurrence.get_dates(other, dates[0], dates[-1]))
+    return [day for day in dates if counts[day] >= capacity]
+
+
+def save_recurring_booking(recurring):
+    """Save ``recurring`` unless it clashes with other bookings of its user.
+
+    Raises ``ConflictError`` with the dates of the clashes otherwise, and
+    ``OfficeFullError`` with the days its office is full on.
+    """
+    with transaction.atomic():
+        conflicts = recurrence.find_conflicts(recurring)
+        if conflicts:
+            raise ConflictError(conflicts)
+        full_days = find_full_days(recurring)
+        if full_days:
+            raise OfficeFullError(full_days)
+        recurring.save()
+    return recurring
@@ -1,3 +1,33 @@
-from django.shortcuts import render
+from django.contrib.auth import authenticate
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
 
-# Create your views here.
+from bookings.export import FORMATS, filter_bookings, iter_rows
+
+
+@require_GET
+def export_bookings(request):
+    """Stream bookings as CSV or NDJSON, filtered by office and date range.
+
+    Rows are written as they are read from the database, so the first bytes
+    go out straight away and memory use doesn't grow with the export.
+    """
+    if authenticate(request=request) is None:
+        return HttpResponse("not logged in", status=401)
+    export_format = request.GET.get("format", "csv")
+    if export_format not in FORMATS:
+        return HttpResponse("unknown format %r" % export_format, status=400)
+    filterset = filter_bookings(
+        request.GET.get("office"), request.GET.get("from"), request.GET.get("to")
+    )
+    if not filterset.is_valid():
+        return JsonResponse({"errors": filterset.errors}, status=400)
+
+    content_type, write = FORMATS[export_format]
+    response = StreamingHttpResponse(
+        write(iter_rows(filterset)), content_type=content_type
+    )
+    response["Content-Disposition"] = 'attachment; filename="bookings.%s"' % (
+        export_format
+    )
+    return response
@@ -2,6 +2,8 @@
 ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+WebSockets to ``/graphql`` serve GraphQL subscriptions, everything else is
+handled by Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
@@ -13,4 +15,18 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# needs the apps loaded by get_asgi_application()
+from config.websocket import graphql_websocket  # noqa: E402
+
+websocket_application = graphql_websocket()
+
+
+async def application(scope, receive, send):
+    if scope['type'] != 'websocket':
+        return await django_application(scope, receive, send)
+    if scope['path'] == '/graphql':
+        return await websocket_application(scope, receive, send)
+    await receive()
+    await send({'type': 'websocket.close'})
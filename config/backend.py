@@ -0,0 +1,114 @@
+from collections import OrderedDict
+from functools import partial
+from threading import Lock
+
+from django.conf import settings
+from graphql import GraphQLCoreBackend
+from graphql.backend.base import GraphQLDocument
+from graphql.execution import ExecutionResult, execute
+from graphql.language.base import parse
+from graphql.validation import validate
+
+from config.complexity import check_complexity
+from config.tracing import phase
+
+
+def invalid_document(errors, *args, **kwargs):
+    return ExecutionResult(errors=errors, invalid=True)
+
+
+class CachedDocumentBackend(GraphQLCoreBackend):
+    """Backend keeping an LRU cache of parsed and validated documents.
+
+    Documents are keyed by their query text and validated once when they are
+    cached, so repeated queries skip straight to execution. The cache is
+    dropped whenever a different schema is passed in. Operations over the
+    depth, alias or cost limits are rejected before they are executed.
+    """
+
+    def __init__(self, max_size=None, executor=None):
+        super().__init__(executor=executor)
+        if max_size is None:
+            max_size = settings.GRAPHQL_DOCUMENT_CACHE_SIZE
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._schema = None
+        self._documents = OrderedDict()
+        self._lock = Lock()
+
+    def document_from_string(self, schema, document_string):
+        if not isinstance(document_string, str):
+            return super().document_from_string(schema, document_string)
+
+        with self._lock:
+            if schema is not self._schema:
+                self._documents.clear()
+                self._schema = schema
+            document = self._documents.get(document_string)
+            if document is not None:
+                self._documents.move_to_end(document_string)
+                self.hits += 1
+                return document
+            self.misses += 1
+
+        document = self.build_document(schema, document_string)
+
+        with self._lock:
+            if schema is self._schema:
+                self._documents[document_string] = document
+                while len(self._documents) > self.max_size:
+                    self._documents.popitem(last=False)
+        return document
+
+    def build_document(self, schema, document_string):
+        with phase("parsing"):
+            document_ast = parse(document_string)
+        with phase("validation"):
+            errors = validate(schema, document_ast)
+        if errors:
+            execute_document = partial(invalid_document, errors)
+        else:
+            execute_document = partial(self.execute_document, schema, document_ast)
+        return GraphQLDocument(
+            schema=schema,
+            document_string=document_string,
+            document_ast=document_ast,
+            execute=execute_document,
+        )
+
+    def execute_document(
+        self, schema, document_ast, root_value=None, context_value=None, **kwargs
+    ):
+        with phase("validation"):
+            errors = check_complexity(
+                schema,
+                document_ast,
+                kwargs.get("operation_name"),
+                kwargs.get("variable_values"),
+            )
+        if errors:
+            return ExecutionResult(errors=errors, invalid=True)
+        with phase("execution"):
+            return execute(
+                schema,
+                document_ast,
+                root_value,
+                context_value,
+                **self.execute_params,
+                **kwargs,
+            )
+
+    def cache_info(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._documents),
+            "max_size": self.max_size,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+            self.hits = 0
+            self.misses = 0
@@ -0,0 +1,153 @@
+from django.conf import settings
+from graphql import GraphQLError
+from graphql.execution.values import get_argument_values, get_variable_values
+from graphql.language import ast
+from graphql.type import GraphQLList, GraphQLNonNull, get_named_type
+from graphql.type.definition import GraphQLEnumType, GraphQLScalarType
+from graphql.utils.get_operation_ast import get_operation_ast
+
+INTROSPECTION_FIELDS = {"__schema", "__type"}
+
+
+class QueryTooComplexError(GraphQLError):
+    def __init__(self, message, code, **extensions):
+        super().__init__(message, extensions={"code": code, **extensions})
+
+
+class CostAnalysis:
+    """Walk an operation to total its depth, aliases and estimated cost.
+
+    Every field costs ``GRAPHQL_FIELD_COSTS["Type.field"]``, by default 1
+    for objects and 0 for scalars. The cost of what a list selects is
+    multiplied by its ``first``/``last`` argument, by its entry in
+    ``GRAPHQL_LIST_SIZES`` or else by the maximum page size.
+    """
+
+    def __init__(self, schema, document_ast, variables):
+        self.schema = schema
+        self.variables = variables
+        self.fragments = {
+            definition.name.value: definition
+            for definition in document_ast.definitions
+            if isinstance(definition, ast.FragmentDefinition)
+        }
+        self.depth = 0
+        self.aliases = 0
+
+    def operation_cost(self, operation):
+        root_type = {
+            "query": self.schema.get_query_type,
+            "mutation": self.schema.get_mutation_type,
+            "subscription": self.schema.get_subscription_type,
+        }[operation.operation]()
+        return self.selection_set_cost(root_type, operation.selection_set, 1)
+
+    def selection_set_cost(self, parent_type, selection_set, depth):
+        cost = 0
+        for selection in selection_set.selections:
+            if isinstance(selection, ast.Field):
+                cost += self.field_cost(parent_type, selection, depth)
+                continue
+            if isinstance(selection, ast.FragmentSpread):
+                selection = self.fragments[selection.name.value]
+            type_condition = selection.type_condition
+            fragment_type = (
+                self.schema.get_type(type_condition.name.value)
+                if type_condition
+                else parent_type
+            )
+            cost += self.selection_set_cost(
+                fragment_type, selection.selection_set, depth
+            )
+        return cost
+
+    def field_cost(self, parent_type, field, depth):
+        name = field.name.value
+        if name in INTROSPECTION_FIELDS or name == "__typename":
+            return 0
+        self.depth = max(self.depth, depth)
+        if field.alias:
+            self.aliases += 1
+        definition = parent_type.fields[name]
+        field_type = get_named_type(definition.type)
+        key = "%s.%s" % (parent_type.name, name)
+        cost = settings.GRAPHQL_FIELD_COSTS.get(
+            key,
+            0 if isinstance(field_type, (GraphQLScalarType, GraphQLEnumType)) else 1,
+        )
+        if field.selection_set is None:
+            return cost
+        size = self.list_size(parent_type, key, definition, field)
+        return cost + size * self.selection_set_cost(
+            field_type, field.selection_set, depth + 1
+        )
+
+    def list_size(self, parent_type, key, definition, field):
+        arguments = get_argument_values(
+            definition.args, field.arguments, self.variables
+        )
+        for argument in ("first", "last"):
+            if arguments.get(argument) is not None:
+                return max(arguments[argument], 0)
+        field_type = definition.type
+        if isinstance(field_type, GraphQLNonNull):
+            field_type = field_type.of_type
+        paginated = "first" in definition.args or "last" in definition.args
+        # the connection field was already multiplied by the page size
+        if parent_type.name.endswith("Connection") or not (
+            paginated or isinstance(field_type, GraphQLList)
+        ):
+            return 1
+        return settings.GRAPHQL_LIST_SIZES.get(key, settings.BOOKINGS_MAX_PAGE_SIZE)
+
+
+def check_complexity(schema, document_ast, operation_name=None, variables=None):
+    """Return a ``QueryTooComplexError`` for each limit the operation exceeds.
+
+    Documents the executor would reject anyway, such as ones with an unknown
+    operation or invalid variables, are left to it to report.
+    """
+    operation = get_operation_ast(document_ast, operation_name)
+    if operation is None:
+        return []
+    try:
+        variables = get_variable_values(
+            schema, operation.variable_definitions or [], variables or {}
+        )
+    except GraphQLError:
+        return []
+    analysis = CostAnalysis(schema, document_ast, variables)
+    cost = analysis.operation_cost(operation)
+
+    errors = []
+    if analysis.depth > settings.GRAPHQL_MAX_DEPTH:
+        errors.append(
+            QueryTooComplexError(
+                "Query depth of %s exceeds the limit of %s"
+                % (analysis.depth, settings.GRAPHQL_MAX_DEPTH),
+                "MAX_DEPTH_EXCEEDED",
+                depth=analysis.depth,
+                maxDepth=settings.GRAPHQL_MAX_DEPTH,
+            )
+        )
+    if analysis.aliases > settings.GRAPHQL_MAX_ALIASES:
+        errors.append(
+            QueryTooComplexError(
+                "Query uses %s aliases, exceeding the limit of %s"
+                % (analysis.aliases, settings.GRAPHQL_MAX_ALIASES),
+                "MAX_ALIASES_EXCEEDED",
+                aliases=analysis.aliases,
+                maxAliases=settings.GRAPHQL_MAX_ALIASES,
+            )
+        )
+    if cost > settings.GRAPHQL_MAX_COST:
+        errors.append(
+            QueryTooComplexError(
+                "Query cost of %s exceeds the limit of %s"
+                % (cost, settings.GRAPHQL_MAX_COST),
+                "MAX_COST_EXCEEDED",
+                cost=cost,
+                maxCost=settings.GRAPHQL_MAX_COST,
+            )
+        )
+    return errors
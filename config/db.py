@@ -0,0 +1,98 @@
+import contextvars
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db import close_old_connections as close_expired_connections
+from django.dispatch import receiver
+
+PIN_COOKIE = "db_primary"
+
+
+class Routing:
+    """Where the reads of one request go.
+
+    Reads go to ``replica`` until the request is pinned to the primary,
+    after which they see everything the request and its writes changed.
+    """
+
+    def __init__(self, pinned=False):
+        self.replica = random.choice(settings.DATABASE_REPLICAS or [DEFAULT_DB_ALIAS])
+        self.pinned = pinned
+        self.wrote = False
+
+
+routing = contextvars.ContextVar("routing", default=None)
+
+
+@contextmanager
+def read_from_replicas(pinned=False):
+    """Send the reads made within to a replica, unless pinned to the primary.
+
+    Anything outside, such as management commands, the admin and
+    subscriptions, reads from the primary.
+    """
+    token = routing.set(Routing(pinned))
+    try:
+        yield routing.get()
+    finally:
+        routing.reset(token)
+
+
+@contextmanager
+def read_from_primary():
+    """Send the reads made within to the primary, for those filling a cache."""
+    with read_from_replicas(pinned=True):
+        yield
+
+
+def pin_to_primary():
+    """Read from the primary for the rest of the request, as before a write."""
+    state = routing.get()
+    if state is not None:
+        state.pinned = state.wrote = True
+
+
+class ReplicaRouter:
+    """Write to the primary, the ``default`` database, and read from the
+    ``DATABASE_REPLICAS`` within ``read_from_replicas``."""
+
+    def db_for_read(self, model, **hints):
+        state = routing.get()
+        if state is None or state.pinned:
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        return True
+
+
+@receiver(request_started)
+def close_unusable_connections(**kwargs):
+    """Close persistent connections that stopped working, for databases with
+    ``CONN_HEALTH_CHECKS`` on.
+
+    Django only checks connections once an error occurred on them, so the
+    first query of a request after the database restarted would fail.
+    """
+    for connection in connections.all():
+        if (
+            connection.connection is not None
+            and connection.settings_dict.get("CONN_HEALTH_CHECKS")
+            and not connection.in_atomic_block
+            and not connection.is_usable()
+        ):
+            connection.close()
+
+
+def close_old_connections():
+    """``django.db.close_old_connections`` with the health checks, for the
+    threads serving requests outside of the request signals."""
+    close_expired_connections()
+    close_unusable_connections()
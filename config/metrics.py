@@ -0,0 +1,154 @@
+from bisect import bisect_left
+from threading import Lock
+
+from django.http import HttpResponse
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Histogram:
+    """Prometheus histogram kept in process memory.
+
+    Each process exports its own series, so scrape every worker or run a
+    single one behind the metrics endpoint.
+    """
+
+    def __init__(self, name, documentation, labelnames, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}
+        self._lock = Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0, 0]
+            counts = series[0]
+            index = bisect_left(self.buckets, value)
+            if index < len(counts):
+                counts[index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        lines = [
+            "# HELP %s %s" % (self.name, self.documentation),
+            "# TYPE %s histogram" % self.name,
+        ]
+        with self._lock:
+            series = sorted(
+                (key, [list(counts), total, count])
+                for key, (counts, total, count) in self._series.items()
+            )
+        for key, (counts, total, count) in series:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(
+                    "%s_bucket%s %s"
+                    % (self.name, format_labels(labels + [("le", bound)]), cumulative)
+                )
+            lines.append(
+                "%s_bucket%s %s"
+                % (self.name, format_labels(labels + [("le", "+Inf")]), count)
+            )
+            lines.append("%s_sum%s %r" % (self.name, format_labels(labels), total))
+            lines.append("%s_count%s %s" % (self.name, format_labels(labels), count))
+        return "\n".join(lines)
+
+
+class Gauge:
+    """Prometheus gauge without labels kept in process memory."""
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def clear(self):
+        self.value = 0
+
+    def render(self):
+        return "\n".join(
+            [
+                "# HELP %s %s" % (self.name, self.documentation),
+                "# TYPE %s gauge" % self.name,
+                "%s %r" % (self.name, self.value),
+            ]
+        )
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{%s}" % ",".join(
+        '%s="%s"' % (name, escape_label(value)) for name, value in labels
+    )
+
+
+def escape_label(value):
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+request_duration = Histogram(
+    "graphql_request_duration_seconds",
+    "Time spent serving GraphQL requests.",
+    ("operation",),
+)
+phase_duration = Histogram(
+    "graphql_phase_duration_seconds",
+    "Time spent in each phase of GraphQL requests.",
+    ("operation", "phase"),
+)
+resolver_duration = Histogram(
+    "graphql_resolver_duration_seconds",
+    "Time spent in the resolvers of each field per GraphQL request.",
+    ("operation", "field"),
+)
+db_queries = Histogram(
+    "graphql_db_queries",
+    "SQL queries run per GraphQL request.",
+    ("operation",),
+    COUNT_BUCKETS,
+)
+db_duration = Histogram(
+    "graphql_db_duration_seconds",
+    "Time spent running SQL queries per GraphQL request.",
+    ("operation",),
+)
+
+password_hashing_queue_depth = Gauge(
+    "password_hashing_queue_depth",
+    "Password hashes running on or waiting for a worker process.",
+)
+
+METRICS = [
+    request_duration,
+    phase_duration,
+    resolver_duration,
+    db_queries,
+    db_duration,
+    password_hashing_queue_depth,
+]
+
+
+def render():
+    return "\n".join(metric.render() for metric in METRICS) + "\n"
+
+
+def metrics_view(request):
+    return HttpResponse(render(), content_type="text/plain; version=0.0.4")
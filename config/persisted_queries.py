@@ -0,0 +1,51 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+
+CACHE_KEY_PREFIX = "persisted-query:"
+
+
+def hash_query(query):
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+class PersistedQueryRegistry:
+    """Maps the SHA-256 hash of a query document to the document itself.
+
+    Queries shipped with clients are loaded from
+    ``GRAPHQL_PERSISTED_QUERIES_PATH``, a JSON list of query strings. When
+    ``GRAPHQL_PERSISTED_QUERIES_AUTO_REGISTER`` is on, signed in clients
+    may also register a query by sending it once alongside its hash; those
+    are kept in the cache for ``GRAPHQL_PERSISTED_QUERIES_TIMEOUT`` seconds
+    so every worker can resolve them. Queries longer than
+    ``GRAPHQL_PERSISTED_QUERIES_MAX_LENGTH`` are run but never registered.
+    """
+
+    def __init__(self, path=None):
+        self.queries = {}
+        path = path or settings.GRAPHQL_PERSISTED_QUERIES_PATH
+        if path:
+            with open(path) as queries:
+                for query in json.load(queries):
+                    self.queries[hash_query(query)] = query
+
+    def resolve(self, sha256_hash):
+        query = self.queries.get(sha256_hash)
+        if query is None:
+            query = cache.get(CACHE_KEY_PREFIX + sha256_hash)
+        return query
+
+    def register(self, sha256_hash, query):
+        if sha256_hash != hash_query(query):
+            raise ValueError("provided sha256Hash does not match query")
+        if (
+            sha256_hash not in self.queries
+            and len(query) <= settings.GRAPHQL_PERSISTED_QUERIES_MAX_LENGTH
+        ):
+            cache.set(
+                CACHE_KEY_PREFIX + sha256_hash,
+                query,
+                settings.GRAPHQL_PERSISTED_QUERIES_TIMEOUT,
+            )
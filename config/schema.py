@@ -1,6 +1,6 @@
 import graphene
 
-from bookings.schema import BookingQuery, BookingMutation
+from bookings.schema import BookingQuery, BookingMutation, BookingSubscription
 from users.schema import AuthQuery, AuthMutation
 
 
@@ -12,4 +12,8 @@ class Mutation(BookingMutation, AuthMutation):
     pass
 
 
-schema = graphene.Schema(query=Query, mutation=Mutation)
+class Subscription(BookingSubscription):
+    pass
+
+
+schema = graphene.Schema(query=Query, mutation=Mutation, subscription=Subscription)
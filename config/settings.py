@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 from environs import Env
@@ -52,6 +53,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "config.tracing.TracingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -62,7 +64,7 @@ MIDDLEWARE = [
 ]
 
 AUTHENTICATION_BACKENDS = [
-    "graphql_jwt.backends.JSONWebTokenBackend",
+    "users.backends.CachedJSONWebTokenBackend",
     "django.contrib.auth.backends.ModelBackend",
 ]
 
@@ -96,9 +98,54 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # seconds a writer waits for the database lock before giving up
+        "OPTIONS": {"timeout": env.int("DJANGO_DB_TIMEOUT", 20)},
+        # a file rather than memory so that threads share the test database
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
+        # seconds connections are kept open between requests, 0 closes them
+        # after each request and None never does
+        "CONN_MAX_AGE": env.int("DJANGO_DB_CONN_MAX_AGE", 0, allow_none=True),
+        # check that kept connections still work before each request
+        "CONN_HEALTH_CHECKS": env.bool("DJANGO_DB_CONN_HEALTH_CHECKS", False),
     }
 }
 
+# GraphQL queries read from one of these databases, which share the settings
+# of the default one but for their name, such as the path of a SQLite file
+DATABASE_REPLICAS = []
+
+for index, name in enumerate(env.list("DJANGO_DB_REPLICAS", [])):
+    alias = "replica_%s" % index
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "NAME": name,
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["config.db.ReplicaRouter"]
+
+# seconds clients read from the primary after a mutation, to see their writes
+# while replicas catch up
+DATABASE_REPLICATION_LAG = env.int("DJANGO_DB_REPLICATION_LAG", 5)
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": env.str(
+            "DJANGO_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": env.str("DJANGO_CACHE_LOCATION", ""),
+    }
+}
+
+OFFICE_CACHE_ALIAS = env.str("OFFICE_CACHE_ALIAS", "default")
+
+OFFICE_CACHE_TIMEOUT = env.int("OFFICE_CACHE_TIMEOUT", 60 * 60)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -118,6 +165,23 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# the first hasher makes the same hashes as Django's default on a pool of
+# worker processes, so it must replace PBKDF2PasswordHasher rather than
+# join it
+PASSWORD_HASHERS = [
+    "users.hashers.PooledPBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+]
+
+# processes hashing passwords, 0 hashes them in the request thread
+PASSWORD_HASHING_WORKERS = env.int("PASSWORD_HASHING_WORKERS", os.cpu_count() or 1)
+
+# hashes waiting for a worker, beyond which register and tokenAuth fail
+# straight away and other callers hash in their own thread
+PASSWORD_HASHING_QUEUE_SIZE = env.int("PASSWORD_HASHING_QUEUE_SIZE", 32)
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.1/topics/i18n/
@@ -141,11 +205,113 @@ STATIC_URL = "static/"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+BOOKINGS_MAX_PAGE_SIZE = env.int("BOOKINGS_MAX_PAGE_SIZE", 100)
+
+BOOKINGS_MAX_BULK_SIZE = env.int("BOOKINGS_MAX_BULK_SIZE", 100)
+
+# rows deleted per transaction when purging deleted offices, which happens on
+# a background thread unless left to the purge_offices command
+OFFICE_PURGE_BATCH_SIZE = env.int("OFFICE_PURGE_BATCH_SIZE", 1000)
+
+OFFICE_PURGE_IN_BACKGROUND = env.bool("OFFICE_PURGE_IN_BACKGROUND", True)
+
+# days ahead recurring bookings are expanded to when listing bookings
+BOOKINGS_RECURRENCE_HORIZON = env.int("BOOKINGS_RECURRENCE_HORIZON", 365)
+
+# seconds each process may take to see bookings newly moved to the archive,
+# when the cache isn't shared between processes
+BOOKINGS_ARCHIVE_CACHE_TIMEOUT = env.int("BOOKINGS_ARCHIVE_CACHE_TIMEOUT", 60)
+
+# days back the squad presence index covers, earlier days are read from the
+# database, and seconds between rebuilds of the index from the database
+BOOKINGS_PRESENCE_HISTORY = env.int("BOOKINGS_PRESENCE_HISTORY", 90)
+
+BOOKINGS_PRESENCE_REBUILD_INTERVAL = env.int(
+    "BOOKINGS_PRESENCE_REBUILD_INTERVAL", 60 * 60
+)
+
+# rows fetched from the database at a time while exporting bookings
+BOOKINGS_EXPORT_CHUNK_SIZE = env.int("BOOKINGS_EXPORT_CHUNK_SIZE", 2000)
+
+# pub/sub carrying booking changes to subscriptions, by default within the
+# process only
+BOOKINGS_EVENTS_BACKEND = env.str(
+    "BOOKINGS_EVENTS_BACKEND", "bookings.events.InProcessBackend"
+)
+
 GRAPHENE = {
     "SCHEMA": "config.schema.schema",
+    # the last middleware is the outermost one
     "MIDDLEWARE": [
-        "graphql_jwt.middleware.JSONWebTokenMiddleware",
+        "config.tracing.ResolverTracingMiddleware",
+        "config.tracing.TracedJSONWebTokenMiddleware",
     ],
+    "RELAY_CONNECTION_MAX_LIMIT": BOOKINGS_MAX_PAGE_SIZE,
+}
+
+# threads executing queries served by the async endpoint under ASGI
+GRAPHQL_ASYNC_WORKERS = env.int("GRAPHQL_ASYNC_WORKERS", 32)
+
+# seconds between keep-alive messages on GraphQL WebSocket connections
+GRAPHQL_WS_KEEPALIVE = env.int("GRAPHQL_WS_KEEPALIVE", 20)
+
+# time phases, resolvers and SQL of requests and export them on /metrics
+GRAPHQL_TRACING = env.bool("GRAPHQL_TRACING", False)
+
+# add the trace of each request to its result in the Apollo tracing format
+GRAPHQL_TRACING_EXTENSIONS = env.bool("GRAPHQL_TRACING_EXTENSIONS", False)
+
+# operations a request may send at once as a JSON array
+GRAPHQL_MAX_BATCH_SIZE = env.int("GRAPHQL_MAX_BATCH_SIZE", 10)
+
+GRAPHQL_DOCUMENT_CACHE_SIZE = env.int("GRAPHQL_DOCUMENT_CACHE_SIZE", 256)
+
+# operations over any of these limits are rejected before they are executed
+GRAPHQL_MAX_DEPTH = env.int("GRAPHQL_MAX_DEPTH", 10)
+
+GRAPHQL_MAX_ALIASES = env.int("GRAPHQL_MAX_ALIASES", 15)
+
+GRAPHQL_MAX_COST = env.int("GRAPHQL_MAX_COST", 5000)
+
+# cost of each "Type.field", by default 1 for objects and 0 for scalars
+GRAPHQL_FIELD_COSTS = {
+    "Query.allBookings": 2,
+    "Query.filterBookings": 3,
+    "Query.officeOccupancy": 2,
+    "Query.users": 3,
+    "Mutation.tokenAuth": 10,
+    "Mutation.register": 10,
+}
+
+# assumed size of lists without a first or last argument, by default the
+# maximum page size
+GRAPHQL_LIST_SIZES = {
+    "OccupancyDayType.squads": 10,
+    "SquadPresenceDayType.users": 20,
+    "BookingsCreateMutation.results": BOOKINGS_MAX_BULK_SIZE,
+    "BookingsUpdateMutation.results": BOOKINGS_MAX_BULK_SIZE,
+    "BookingsDeleteMutation.results": BOOKINGS_MAX_BULK_SIZE,
+}
+
+GRAPHQL_PERSISTED_QUERIES_PATH = env.str("GRAPHQL_PERSISTED_QUERIES_PATH", None)
+
+GRAPHQL_PERSISTED_QUERIES_AUTO_REGISTER = env.bool(
+    "GRAPHQL_PERSISTED_QUERIES_AUTO_REGISTER", True
+)
+
+# seconds queries registered by clients are kept, and the longest query
+# they may register
+GRAPHQL_PERSISTED_QUERIES_TIMEOUT = env.int(
+    "GRAPHQL_PERSISTED_QUERIES_TIMEOUT", 24 * 60 * 60
+)
+
+GRAPHQL_PERSISTED_QUERIES_MAX_LENGTH = env.int(
+    "GRAPHQL_PERSISTED_QUERIES_MAX_LENGTH", 10000
+)
+
+# seconds clients may cache GET queries selecting only these root fields
+GRAPHQL_CACHE_CONTROL = {
+    "allOffices": env.int("OFFICE_CACHE_MAX_AGE", 60),
 }
 
 
@@ -159,6 +325,12 @@ GRAPHQL_JWT = {
     "JWT_LONG_RUNNING_REFRESH_TOKEN": True,
 }
 
+# verified tokens and their user are kept in memory for up to this many
+# seconds, 0 verifies every request
+JWT_CACHE_TIMEOUT = env.int("JWT_CACHE_TIMEOUT", 60)
+
+JWT_CACHE_MAX_SIZE = env.int("JWT_CACHE_MAX_SIZE", 10000)
+
 AUTH_USER_MODEL = "users.ExtendedUser"
 
 GRAPHQL_AUTH = {"REGISTER_MUTATION_FIELDS": ["username", "email", "club", "squad"]}
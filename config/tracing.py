@@ -0,0 +1,250 @@
+import asyncio
+import contextvars
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils import timezone
+from graphql_jwt.middleware import JSONWebTokenMiddleware
+from promise import Promise
+
+from config import metrics
+
+_current_trace = contextvars.ContextVar("graphql_trace", default=None)
+
+
+def get_trace():
+    return _current_trace.get()
+
+
+class Trace:
+    """Timings of one request: its phases, resolvers and SQL queries.
+
+    Offsets and durations are in seconds from the start of the request.
+    """
+
+    def __init__(self):
+        self.start_time = timezone.now()
+        self.start = time.perf_counter()
+        self.duration = None
+        self.operation_name = None
+        self.phases = {}
+        self.resolvers = []
+        self.queries = 0
+        self.query_duration = 0
+        self.resolver = None
+
+    def offset(self):
+        return time.perf_counter() - self.start
+
+    def add_phase(self, name, start_offset, duration):
+        if name in self.phases:
+            start_offset, total = self.phases[name]
+            duration += total
+        self.phases[name] = (start_offset, duration)
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.queries += 1
+            self.query_duration += duration
+            if self.resolver is not None:
+                self.resolver["sqlQueries"] += 1
+                self.resolver["sqlDuration"] += duration
+
+    @contextmanager
+    def recording_queries(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self.record_query))
+            yield
+
+    def finish(self):
+        self.duration = self.offset()
+
+    def as_apollo_tracing(self):
+        """The trace in the Apollo tracing format, durations in nanoseconds."""
+
+        def span(name):
+            start_offset, duration = self.phases.get(name, (0, 0))
+            return {
+                "startOffset": nanoseconds(start_offset),
+                "duration": nanoseconds(duration),
+            }
+
+        return {
+            "version": 1,
+            "startTime": self.start_time.isoformat(),
+            "endTime": timezone.now().isoformat(),
+            "duration": nanoseconds(self.offset()),
+            "parsing": span("parsing"),
+            "validation": span("validation"),
+            "authentication": span("authentication"),
+            "execution": {
+                "resolvers": [
+                    {
+                        **resolver,
+                        "startOffset": nanoseconds(resolver["startOffset"]),
+                        "duration": nanoseconds(resolver["duration"]),
+                        "sqlDuration": nanoseconds(resolver["sqlDuration"]),
+                    }
+                    for resolver in self.resolvers
+                ]
+            },
+            "sql": {
+                "queries": self.queries,
+                "duration": nanoseconds(self.query_duration),
+            },
+        }
+
+    def observe(self):
+        operation = self.operation_name
+        metrics.request_duration.observe(self.duration, operation=operation)
+        for phase, (_, duration) in self.phases.items():
+            metrics.phase_duration.observe(duration, operation=operation, phase=phase)
+        fields = defaultdict(float)
+        for resolver in self.resolvers:
+            fields[
+                "%s.%s" % (resolver["parentType"], resolver["fieldName"])
+            ] += resolver["duration"]
+        for field, duration in fields.items():
+            metrics.resolver_duration.observe(
+                duration, operation=operation, field=field
+            )
+        metrics.db_queries.observe(self.queries, operation=operation)
+        metrics.db_duration.observe(self.query_duration, operation=operation)
+
+
+def nanoseconds(seconds):
+    return int(seconds * 1e9)
+
+
+@contextmanager
+def phase(name):
+    """Add the time spent in the block to phase ``name`` of the current trace."""
+    trace = get_trace()
+    if trace is None:
+        yield
+        return
+    start_offset = trace.offset()
+    try:
+        yield
+    finally:
+        trace.add_phase(name, start_offset, trace.offset() - start_offset)
+
+
+class TracingMiddleware:
+    """Django middleware tracing each request and exporting it as metrics.
+
+    Only requests that executed a GraphQL operation are observed. Under
+    ASGI it runs on the event loop, so that async views aren't moved onto
+    the single thread sync middleware shares.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # as MiddlewareMixin does, so that Django awaits __call__
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if not settings.GRAPHQL_TRACING:
+            return self.get_response(request)
+        trace = Trace()
+        token = _current_trace.set(trace)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_trace.reset(token)
+            trace.finish()
+        if trace.operation_name is not None:
+            trace.observe()
+        return response
+
+    async def __acall__(self, request):
+        if not settings.GRAPHQL_TRACING:
+            return await self.get_response(request)
+        trace = Trace()
+        token = _current_trace.set(trace)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_trace.reset(token)
+            trace.finish()
+        if trace.operation_name is not None:
+            trace.observe()
+        return response
+
+
+class ResolverTracingMiddleware:
+    """Graphene middleware timing resolvers and the SQL they run."""
+
+    def resolve(self, next, root, info, **kwargs):
+        trace = get_trace()
+        if trace is None:
+            return next(root, info, **kwargs)
+        resolver = {
+            "path": info.path,
+            "parentType": str(info.parent_type),
+            "fieldName": info.field_name,
+            "returnType": str(info.return_type),
+            "startOffset": trace.offset(),
+            "duration": 0,
+            "sqlQueries": 0,
+            "sqlDuration": 0,
+        }
+        trace.resolvers.append(resolver)
+
+        def finish(value=None):
+            resolver["duration"] = trace.offset() - resolver["startOffset"]
+            return value
+
+        def fail(error):
+            finish()
+            raise error
+
+        trace.resolver = resolver
+        try:
+            result = next(root, info, **kwargs)
+            # run lazy querysets now so that their SQL counts against the field
+            if (
+                isinstance(result, Promise)
+                and result.is_fulfilled
+                and isinstance(result.value, QuerySet)
+            ):
+                len(result.value)
+        finally:
+            trace.resolver = None
+        if isinstance(result, Promise) and result.is_pending:
+            return result.then(finish, fail)
+        finish()
+        return result
+
+
+class TracedJSONWebTokenMiddleware(JSONWebTokenMiddleware):
+    """``JSONWebTokenMiddleware`` adding its time to the authentication phase."""
+
+    def resolve(self, next, root, info, **kwargs):
+        trace = get_trace()
+        if trace is None:
+            return super().resolve(next, root, info, **kwargs)
+        start_offset = trace.offset()
+
+        def traced_next(*args, **kwargs):
+            trace.add_phase(
+                "authentication", start_offset, trace.offset() - start_offset
+            )
+            return next(*args, **kwargs)
+
+        return super().resolve(traced_next, root, info, **kwargs)
@@ -15,9 +15,24 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path
-from graphene_django.views import GraphQLView
+
+from bookings.views import export_bookings
+from config.backend import CachedDocumentBackend
+from config.metrics import metrics_view
+from config.persisted_queries import PersistedQueryRegistry
+from config.views import GraphQLView, run_in_thread_pool
+
+graphql_view = GraphQLView.as_view(
+    graphiql=True,
+    backend=CachedDocumentBackend(),
+    registry=PersistedQueryRegistry(),
+)
 
 urlpatterns = [
     path("admin/", admin.site.urls),
-    path("graphql", GraphQLView.as_view(graphiql=True)),
+    path("graphql", graphql_view),
+    # for ASGI servers, does not tie up a worker while the query runs
+    path("graphql/async", run_in_thread_pool(graphql_view)),
+    path("bookings/export", export_bookings),
+    path("metrics", metrics_view),
 ]
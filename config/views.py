@@ -0,0 +1,284 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.http.response import HttpResponseBadRequest
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import quote_etag
+from graphene_django.views import GraphQLView as BaseGraphQLView
+from graphene_django.views import HttpError
+from graphql.language import ast
+from graphql.utils.get_operation_ast import get_operation_ast
+from graphql_jwt.exceptions import JSONWebTokenError
+from graphql_jwt.utils import get_credentials
+
+from config.db import (
+    PIN_COOKIE,
+    close_old_connections,
+    pin_to_primary,
+    read_from_replicas,
+)
+from config.tracing import get_trace, phase
+from users.backends import get_user_by_token
+
+
+class GraphQLView(BaseGraphQLView):
+    """GraphQL endpoint resolving persisted queries from ``registry``.
+
+    Clients may send ``extensions.persistedQuery.sha256Hash`` instead of the
+    query text, following the Apollo automatic persisted queries protocol.
+    GET queries selecting only fields listed in ``GRAPHQL_CACHE_CONTROL``
+    are answered with an ETag and ``Cache-Control`` header. Requests are
+    traced when ``GRAPHQL_TRACING`` is on, and the trace is returned in the
+    ``extensions`` of the result with ``GRAPHQL_TRACING_EXTENSIONS``.
+    Queries read from the ``DATABASE_REPLICAS`` until a mutation runs, and
+    clients that ran one read from the primary for a little while after.
+
+    A JSON array of up to ``GRAPHQL_MAX_BATCH_SIZE`` operations is executed
+    as a batch and answered with an array of results. The operations share
+    the request, so its user is authenticated once and its DataLoaders are
+    shared until a mutation runs.
+    """
+
+    registry = None
+
+    def __init__(self, registry=None, **kwargs):
+        super().__init__(**kwargs)
+        self.registry = self.registry or registry
+
+    def dispatch(self, request, *args, **kwargs):
+        with read_from_replicas(pinned=PIN_COOKIE in request.COOKIES) as routing:
+            trace = get_trace()
+            if trace is None:
+                response = super().dispatch(request, *args, **kwargs)
+            else:
+                with trace.recording_queries():
+                    response = super().dispatch(request, *args, **kwargs)
+        if routing.wrote and settings.DATABASE_REPLICAS:
+            # the client's next requests read its writes from the primary
+            response.set_cookie(
+                PIN_COOKIE,
+                "1",
+                max_age=settings.DATABASE_REPLICATION_LAG,
+                httponly=True,
+                samesite="Lax",
+            )
+        max_age = getattr(request, "graphql_max_age", None)
+        if max_age is None or response.status_code != 200:
+            return response
+        patch_cache_control(response, private=True, max_age=max_age)
+        patch_vary_headers(response, ["Authorization"])
+        etag = quote_etag(hashlib.md5(response.content).hexdigest())
+        response["ETag"] = etag
+        return get_conditional_response(request, etag=etag, response=response)
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        operation_type = self.get_operation_type(request, query, operation_name)
+        if operation_type == "mutation":
+            pin_to_primary()
+        result = super().execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+        if result and not result.errors and request.method == "GET":
+            request.graphql_max_age = self.get_max_age(request, query, operation_name)
+        if self.batch and operation_type in (None, "mutation"):
+            # later operations must not read what was loaded before the changes
+            request.loaders = None
+        trace = get_trace()
+        if trace is not None and query and not self.batch:
+            trace.operation_name = self.get_operation_name(
+                request, query, operation_name
+            )
+        return result
+
+    def get_operation_type(self, request, query, operation_name):
+        try:
+            document = self.get_backend(request).document_from_string(
+                self.schema, query
+            )
+        except Exception:
+            return None
+        return document.get_operation_type(operation_name)
+
+    def get_operation_name(self, request, query, operation_name):
+        try:
+            document = self.get_backend(request).document_from_string(
+                self.schema, query
+            )
+        except Exception:
+            return "invalid"
+        # clients may send any operationName, only label by the document's
+        operation = get_operation_ast(document.document_ast, operation_name)
+        if operation is None:
+            return "other"
+        if operation.name is None:
+            return "anonymous"
+        return operation.name.value
+
+    def json_encode(self, request, d, pretty=False):
+        trace = get_trace()
+        # the trace covers the whole batch rather than any one operation
+        if trace is not None and settings.GRAPHQL_TRACING_EXTENSIONS and not self.batch:
+            d = {**d, "extensions": {"tracing": trace.as_apollo_tracing()}}
+        with phase("serialization"):
+            return super().json_encode(request, d, pretty)
+
+    def parse_body(self, request):
+        if self.get_content_type(request) != "application/json":
+            return super().parse_body(request)
+        try:
+            data = json.loads(request.body.decode("utf-8"))
+        except UnicodeDecodeError as e:
+            raise HttpError(HttpResponseBadRequest(str(e)))
+        except ValueError:
+            raise HttpError(HttpResponseBadRequest("POST body sent invalid JSON."))
+        if isinstance(data, dict):
+            return data
+        if not isinstance(data, list) or not all(
+            isinstance(entry, dict) for entry in data
+        ):
+            raise HttpError(
+                HttpResponseBadRequest("The received data is not a valid JSON query.")
+            )
+        if not data:
+            raise HttpError(
+                HttpResponseBadRequest("Received an empty list in the batch request.")
+            )
+        if len(data) > settings.GRAPHQL_MAX_BATCH_SIZE:
+            raise HttpError(
+                HttpResponseBadRequest(
+                    "Batches can't have more than %s operations."
+                    % settings.GRAPHQL_MAX_BATCH_SIZE
+                )
+            )
+        # views are instantiated for each request
+        self.batch = True
+        trace = get_trace()
+        if trace is not None:
+            trace.operation_name = "batch"
+        return data
+
+    def get_response(self, request, data, show_graphiql=False):
+        if not self.batch:
+            return super().get_response(request, data, show_graphiql)
+        # one failed operation doesn't fail the others
+        try:
+            return super().get_response(request, data, show_graphiql)
+        except HttpError as e:
+            status_code = e.response.status_code
+            response = {
+                "errors": [self.format_error(e)],
+                "id": data.get("id"),
+                "status": status_code,
+            }
+            return self.json_encode(request, response), status_code
+
+    @classmethod
+    def can_display_graphiql(cls, request, data):
+        return not isinstance(data, list) and super().can_display_graphiql(
+            request, data
+        )
+
+    def get_max_age(self, request, query, operation_name):
+        """Return how long the result may be cached, or ``None`` if not."""
+        document = self.get_backend(request).document_from_string(self.schema, query)
+        operation = get_operation_ast(document.document_ast, operation_name)
+        if operation is None or operation.operation != "query":
+            return None
+        max_ages = []
+        for selection in operation.selection_set.selections:
+            if not isinstance(selection, ast.Field):
+                return None
+            if selection.name.value == "__typename":
+                continue
+            max_age = settings.GRAPHQL_CACHE_CONTROL.get(selection.name.value)
+            if max_age is None:
+                return None
+            max_ages.append(max_age)
+        return min(max_ages, default=None)
+
+    def get_graphql_params(self, request, data):
+        query, variables, operation_name, id = super().get_graphql_params(request, data)
+        sha256_hash = self.get_persisted_query_hash(request, data)
+        if sha256_hash is None or self.registry is None:
+            return query, variables, operation_name, id
+
+        if query:
+            if settings.GRAPHQL_PERSISTED_QUERIES_AUTO_REGISTER and self.is_signed_in(
+                request
+            ):
+                try:
+                    self.registry.register(sha256_hash, query)
+                except ValueError as e:
+                    raise HttpError(HttpResponseBadRequest(str(e)))
+            return query, variables, operation_name, id
+
+        query = self.registry.resolve(sha256_hash)
+        if query is None:
+            raise HttpError(HttpResponse(), "PersistedQueryNotFound")
+        return query, variables, operation_name, id
+
+    @staticmethod
+    def is_signed_in(request):
+        # anonymous clients may send any query, but not fill the cache with it
+        token = get_credentials(request)
+        if token is None:
+            return False
+        try:
+            return get_user_by_token(token, request) is not None
+        except JSONWebTokenError:
+            return False
+
+    @staticmethod
+    def get_persisted_query_hash(request, data):
+        extensions = request.GET.get("extensions") or data.get("extensions")
+        if not extensions:
+            return None
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+        persisted_query = extensions.get("persistedQuery") or {}
+        return persisted_query.get("sha256Hash")
+
+
+def run_in_thread_pool(view, max_workers=None):
+    """Serve the sync ``view`` from an async view backed by a bounded pool.
+
+    Under ASGI the event loop keeps accepting requests while at most
+    ``max_workers`` of them execute at once, each on a pool thread with
+    its own database connection. The rest wait in the pool's queue
+    without holding a thread or a connection.
+    """
+    executor = ThreadPoolExecutor(
+        max_workers=max_workers or settings.GRAPHQL_ASYNC_WORKERS,
+        thread_name_prefix="graphql",
+    )
+
+    def run(request, *args, **kwargs):
+        close_old_connections()
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            close_old_connections()
+
+    async def async_view(request, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            executor, partial(context.run, run, request, *args, **kwargs)
+        )
+
+    return async_view
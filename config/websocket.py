@@ -0,0 +1,246 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from graphql import GraphQLError
+from graphql.error import format_error
+from graphql.execution import ExecutionResult
+from graphql_jwt.exceptions import JSONWebTokenError
+from graphql_jwt.settings import jwt_settings
+from promise import Promise
+
+from config.backend import CachedDocumentBackend
+from config.db import close_old_connections
+from config.schema import schema
+from users.backends import get_user_by_token
+
+PROTOCOL = "graphql-ws"
+
+
+class Context:
+    """The ``info.context`` of operations received over a WebSocket."""
+
+    def __init__(self, user, schedule):
+        self.user = user
+        self.schedule = schedule
+        self.loaders = None
+
+
+def get_token(payload, headers):
+    """The JWT of a connection, from its init payload or its headers."""
+    payload = payload if isinstance(payload, dict) else {}
+    if payload.get("authToken"):
+        return payload["authToken"]
+    header = payload.get("Authorization") or payload.get("authorization")
+    if header is None:
+        header = headers.get(b"authorization", b"").decode("latin-1")
+    auth = header.split()
+    if (
+        len(auth) == 2
+        and auth[0].lower() == jwt_settings.JWT_AUTH_HEADER_PREFIX.lower()
+    ):
+        return auth[1]
+    return None
+
+
+def resolve(result):
+    """Wait for the fields that subscriptions leave as promises."""
+    if result.data is not None:
+        result.data = Promise.for_dict(result.data).get()
+    return result
+
+
+class Connection:
+    """A WebSocket speaking the ``graphql-ws`` protocol of Apollo's
+    subscriptions-transport-ws.
+
+    Operations and the events of subscriptions are executed on ``executor``
+    one at a time and in the order they came in. The event loop only moves
+    messages, through the ``jobs`` and ``outbox`` queues.
+    """
+
+    def __init__(self, executor, backend, scope, receive, send):
+        self.executor = executor
+        self.backend = backend
+        self.scope = scope
+        self.receive = receive
+        self.send = send
+        self.loop = asyncio.get_running_loop()
+        self.user = AnonymousUser()
+        self.subscriptions = {}
+        self.jobs = asyncio.Queue()
+        self.outbox = asyncio.Queue()
+        self.tasks = []
+
+    async def run(self):
+        if (await self.receive())["type"] != "websocket.connect":
+            return
+        if PROTOCOL not in self.scope.get("subprotocols", ()):
+            await self.send({"type": "websocket.close", "code": 1002})
+            return
+        await self.send({"type": "websocket.accept", "subprotocol": PROTOCOL})
+        self.start_task(self.send_messages())
+        self.start_task(self.run_jobs())
+        try:
+            while True:
+                message = await self.receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+                if not await self.handle(message.get("text")):
+                    await self.outbox.join()
+                    await self.send({"type": "websocket.close", "code": 1000})
+                    return
+        finally:
+            for task in self.tasks:
+                task.cancel()
+            for subscription in list(self.subscriptions.values()):
+                subscription.dispose()
+
+    def start_task(self, coroutine):
+        self.tasks.append(asyncio.ensure_future(coroutine))
+
+    async def handle(self, text):
+        try:
+            message = json.loads(text or "")
+            kind = message["type"]
+        except (KeyError, TypeError, ValueError):
+            self.post("error", payload={"message": "invalid message"})
+            return True
+        id = message.get("id")
+        if kind == "connection_init":
+            return await self.authenticate(message.get("payload"))
+        if kind == "connection_terminate":
+            return False
+        if kind == "start":
+            self.jobs.put_nowait((self.start, (id, message.get("payload") or {})))
+        elif kind == "stop":
+            self.jobs.put_nowait((self.stop, (id,)))
+        else:
+            self.post("error", id, {"message": "unknown message type %r" % kind})
+        return True
+
+    async def authenticate(self, payload):
+        token = get_token(payload, dict(self.scope.get("headers", ())))
+        if token is not None:
+            try:
+                user = await self.loop.run_in_executor(
+                    self.executor, self.run_job, get_user_by_token, token
+                )
+            except JSONWebTokenError as e:
+                self.post("connection_error", payload={"message": str(e)})
+                return False
+            self.user = user or AnonymousUser()
+        self.post("connection_ack")
+        if settings.GRAPHQL_WS_KEEPALIVE:
+            self.post("ka")
+            self.start_task(self.keep_alive())
+        return True
+
+    def post(self, kind, id=None, payload=None):
+        message = {"type": kind}
+        if id is not None:
+            message["id"] = id
+        if payload is not None:
+            message["payload"] = payload
+        self.outbox.put_nowait(message)
+
+    def post_threadsafe(self, *args):
+        self.loop.call_soon_threadsafe(self.post, *args)
+
+    def schedule(self, function, *args):
+        try:
+            self.loop.call_soon_threadsafe(self.jobs.put_nowait, (function, args))
+        except RuntimeError:
+            # the connection is gone along with its event loop
+            pass
+
+    async def send_messages(self):
+        while True:
+            message = await self.outbox.get()
+            try:
+                await self.send({"type": "websocket.send", "text": json.dumps(message)})
+            finally:
+                self.outbox.task_done()
+
+    async def run_jobs(self):
+        while True:
+            function, args = await self.jobs.get()
+            try:
+                await self.loop.run_in_executor(
+                    self.executor, self.run_job, function, *args
+                )
+            except Exception:
+                # one failed operation or event shouldn't end the connection
+                self.post("error", payload={"message": "internal error"})
+
+    @staticmethod
+    def run_job(function, *args):
+        close_old_connections()
+        try:
+            return function(*args)
+        finally:
+            close_old_connections()
+
+    async def keep_alive(self):
+        while True:
+            await asyncio.sleep(settings.GRAPHQL_WS_KEEPALIVE)
+            self.post("ka")
+
+    def start(self, id, payload):
+        if id is None or id in self.subscriptions:
+            self.post_threadsafe("error", id, {"message": "invalid operation id"})
+            return
+        query = payload.get("query")
+        if not isinstance(query, str):
+            self.post_threadsafe("error", id, {"message": "no query given"})
+            return
+        result = schema.execute(
+            query,
+            variable_values=payload.get("variables"),
+            operation_name=payload.get("operationName"),
+            context_value=Context(self.user, self.schedule),
+            allow_subscriptions=True,
+            backend=self.backend,
+        )
+        if not isinstance(result, ExecutionResult):
+            self.subscriptions[id] = result.subscribe(
+                on_next=lambda result: self.post_threadsafe(
+                    "data", id, resolve(result).to_dict()
+                ),
+                on_error=lambda error: self.post_threadsafe(
+                    "error", id, format_error(GraphQLError(str(error)))
+                ),
+                on_completed=lambda: self.post_threadsafe("complete", id),
+            )
+        elif result.invalid:
+            self.post_threadsafe("error", id, result.to_dict()["errors"])
+        else:
+            # queries and mutations are answered once
+            self.post_threadsafe("data", id, result.to_dict())
+            self.post_threadsafe("complete", id)
+
+    def stop(self, id):
+        subscription = self.subscriptions.pop(id, None)
+        if subscription is not None:
+            subscription.dispose()
+            self.post_threadsafe("complete", id)
+
+
+def graphql_websocket(max_workers=None):
+    """An ASGI app serving GraphQL subscriptions over WebSockets.
+
+    Like ``run_in_thread_pool``, at most ``max_workers`` operations and
+    events execute at once, on threads with their own database connection.
+    """
+    executor = ThreadPoolExecutor(
+        max_workers=max_workers or settings.GRAPHQL_ASYNC_WORKERS,
+        thread_name_prefix="graphql-ws",
+    )
+    backend = CachedDocumentBackend()
+
+    async def app(scope, receive, send):
+        await Connection(executor, backend, scope, receive, send).run()
+
+    return app
@@ -1,10 +1,60 @@
 from uuid import uuid4
 
 import arrow
+import asyncio
+import csv
 import datetime
+import graphene
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import StringIO
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import (
+    AsyncClient,
+    Client,
+    RequestFactory,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from graphql.utils.introspection_query import introspection_query
+from graphql_jwt.exceptions import JSONWebTokenError
+from graphql_jwt.refresh_token.shortcuts import create_refresh_token
+from graphql_jwt.settings import jwt_settings
+from graphql_jwt.shortcuts import get_token
+from promise import Promise
 
-from bookings.models import Office, Booking
+from bookings import archive, events, presence, purge, recurrence, services
+from bookings import schema as bookings_schema
+from bookings.loaders import Loaders
+from bookings.management.commands.explain_filters import is_full_scan
+from bookings.models import (
+    ArchivedBooking,
+    Booking,
+    Office,
+    OfficeOccupancy,
+    RecurringBooking,
+    SquadOccupancy,
+)
+from config import db, metrics
+from config.backend import CachedDocumentBackend
+from config.persisted_queries import hash_query
+from config.schema import Mutation, Query, schema
 from tests import helpers
+from users import hashers
+from users.backends import TokenCache, get_user_by_token, token_cache
 
 
 class TestOfficeEndPoints(helpers.AuthenticatedClientTestCase):
@@ -67,9 +117,114 @@ class TestOfficeEndPoints(helpers.AuthenticatedClientTestCase):
             'mutation deleteOffice { deleteOffice (uuid: "%s"){ office {uuid}}}'
             % office_uuid
         )
+        assert response.data["deleteOffice"]["office"] == {"uuid": office_uuid}
+        assert Office.objects.get(uuid=office_uuid).retired_at is not None
+        call_command("purge_offices", stdout=StringIO())
         assert not Office.objects.filter(uuid=office_uuid)
 
 
+class TestOfficeDeletion(helpers.AuthenticatedClientTestCase):
+    delete = 'mutation { deleteOffice(uuid: "%s") { office { name retiredAt } } }'
+
+    def setUp(self):
+        super().setUp()
+        self.office = helpers.create_office()
+        self.other_office = helpers.create_office("other office")
+
+    def test_deleted_offices_are_hidden_at_once(self):
+        self.client.execute("query { allOffices { name } }")
+        response = self.client.execute(self.delete % self.office.uuid)
+        office = response.data["deleteOffice"]["office"]
+        assert office["name"] == "office"
+        assert office["retiredAt"] is not None
+        response = self.client.execute("query { allOffices { name } }")
+        assert response.data["allOffices"] == [{"name": "other office"}]
+
+        today = datetime.date.today().isoformat()
+        response = self.client.execute(
+            'mutation { createBooking(officeId: "%s", date: "%s") { booking { uuid } } }'
+            % (self.office.uuid, today)
+        )
+        assert response.errors[0].message == "This office does not exist"
+        response = self.client.execute(
+            'mutation { createBookings(bookings: [{officeId: "%s", date: "%s"}]) { results { error } } }'
+            % (self.office.uuid, today)
+        )
+        assert response.data["createBookings"]["results"] == [
+            {"error": "This office does not exist"}
+        ]
+        response = self.client.execute(
+            'mutation { updateOffice(uuid: "%s", name: "new") { office { name } } }'
+            % self.office.uuid
+        )
+        assert response.errors[0].message == "This office does not exist"
+        assert self.client.execute(self.delete % uuid4()).errors
+
+    def test_offices_are_purged_in_batches(self):
+        start = datetime.date.today()
+        for i in range(5):
+            user = helpers.create_user(username="user%s" % i, email="%s@email.com" % i)
+            helpers.create_booking(user, self.office, start + datetime.timedelta(i))
+            helpers.create_booking(
+                user, self.other_office, start - datetime.timedelta(1)
+            )
+        RecurringBooking.objects.create(
+            uuid=uuid4(),
+            office=self.office,
+            user=self.user,
+            weekdays=1,
+            start_date=start,
+        )
+        call_command("rebuild_occupancy", stdout=StringIO())
+        self.client.execute(self.delete % self.office.uuid)
+
+        out = StringIO()
+        received = []
+        unsubscribe = events.get_backend().subscribe(
+            events.office_channel(self.office.uuid), received.append
+        )
+        self.addCleanup(unsubscribe)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("purge_offices", batch_size=2, stdout=out)
+        assert sorted(message["date"] for message in received) == [
+            (start + datetime.timedelta(i)).isoformat() for i in range(5)
+        ]
+        assert {message["kind"] for message in received} == {events.DELETED}
+        lines = out.getvalue().splitlines()
+        assert lines[1:4] == [
+            "office %s: %s booking rows deleted" % (self.office.uuid, count)
+            for count in (2, 4, 5)
+        ]
+        assert lines[-1] == "office %s purged, 17 rows deleted" % self.office.uuid
+        assert not Office.objects.filter(uuid=self.office.uuid).exists()
+        assert not RecurringBooking.objects.exists()
+        assert Booking.objects.filter(office=self.other_office).count() == 5
+        assert OfficeOccupancy.objects.get().office == self.other_office
+
+
+class TestOfficePurgeInBackground(TransactionTestCase):
+    def test_deleted_offices_are_purged_after_the_commit(self):
+        user, office = helpers.create_user(), helpers.create_office()
+        helpers.create_booking(user, office, datetime.date.today())
+        client = Client(
+            HTTP_AUTHORIZATION="%s %s"
+            % (jwt_settings.JWT_AUTH_HEADER_PREFIX, get_token(user))
+        )
+        response = client.post(
+            "/graphql",
+            {
+                "query": 'mutation { deleteOffice(uuid: "%s") { office { name } } }'
+                % office.uuid
+            },
+            content_type="application/json",
+        )
+        assert response.json()["data"]["deleteOffice"]["office"] == {"name": "office"}
+        # purges run one after the other
+        purge.executor.submit(lambda: None).result(timeout=5)
+        assert not Office.objects.exists()
+        assert not Booking.objects.exists()
+
+
 class TestBookingEndPoints(helpers.AuthenticatedClientTestCase):
     def test_query_all_bookings(self):
         office = helpers.create_office()
@@ -211,3 +366,2536 @@ class TestBookingEndPoints(helpers.AuthenticatedClientTestCase):
             % str(booking_uuid)
         )
         assert not Booking.objects.filter(uuid=booking_uuid)
+
+
+def booking_queries(context):
+    return [
+        query["sql"]
+        for query in context.captured_queries
+        if 'FROM "bookings_booking"' in query["sql"]
+    ]
+
+
+class TestBookingQueryCounts(helpers.AuthenticatedClientTestCase):
+    def test_all_bookings_resolves_office_and_user_in_one_query(self):
+        offices = [helpers.create_office(name="office %s" % i) for i in range(3)]
+        for i in range(10):
+            user = helpers.create_user(
+                username="user %s" % i, email="user%s@email.com" % i
+            )
+            helpers.create_booking(
+                user=user,
+                office=offices[i % 3],
+                booking_date=datetime.date.today(),
+            )
+        # authentication, bookings joined to their offices and users, and
+        # recurring bookings, once the extent of the archive is cached
+        archive.get_archived_until()
+        with self.assertNumQueries(3):
+            response = self.client.execute(
+                "query allBookings{ allBookings{ uuid office{ name} user{ username squad}}}"
+            )
+        data = response.data.get("allBookings")
+        assert len(data) == 10
+        assert {booking["office"]["name"] for booking in data} == {
+            office.name for office in offices
+        }
+
+    def test_loaders_batch_lookups_into_one_query_per_type(self):
+        offices = [helpers.create_office(name="office %s" % i) for i in range(3)]
+        loaders = Loaders()
+        with self.assertNumQueries(1):
+            # loads issued from inside a resolving promise are dispatched together
+            loaded = (
+                Promise.resolve([office.uuid for office in offices])
+                .then(loaders.office.load_many)
+                .get()
+            )
+        assert loaded == offices
+
+    def test_all_bookings_only_loads_selected_columns(self):
+        office = helpers.create_office()
+        helpers.create_booking(
+            user=self.user, office=office, booking_date=datetime.date.today()
+        )
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.execute(
+                "query allBookings{ allBookings{ uuid date}}"
+            )
+        assert len(response.data.get("allBookings")) == 1
+        sql = booking_queries(context)[-1]
+        assert "users_extendeduser" not in sql
+        assert "office_id" not in sql
+
+    def test_all_bookings_joins_related_fields_through_fragments(self):
+        office = helpers.create_office()
+        helpers.create_booking(
+            user=self.user, office=office, booking_date=datetime.date.today()
+        )
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.execute(
+                """
+                query allBookings {
+                    allBookings {
+                        day: date
+                        ...bookingUser
+                    }
+                }
+                fragment bookingUser on BookingType {
+                    user { username }
+                }
+                """
+            )
+        data = response.data.get("allBookings")
+        assert data[0].get("user").get("username") == self.user.username
+        assert data[0].get("day") == datetime.date.today().isoformat()
+        sql = booking_queries(context)[-1]
+        assert "users_extendeduser" in sql
+        assert "password" not in sql
+
+    def test_filter_bookings_only_loads_selected_columns(self):
+        office = helpers.create_office()
+        helpers.create_booking(
+            user=self.user, office=office, booking_date=datetime.date.today()
+        )
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.execute(
+                "query filterBookings{ filterBookings{ edges{ node{ uuid date}}}}"
+            )
+        assert len(response.data.get("filterBookings").get("edges")) == 1
+        sql = booking_queries(context)[-1]
+        assert "users_extendeduser" not in sql
+
+
+class TestBookingPagination(helpers.AuthenticatedClientTestCase):
+    query = """
+        query filterBookings($first: Int, $after: String) {
+            filterBookings(first: $first, after: $after) {
+                edges { cursor node { uuid date } }
+                pageInfo { hasNextPage endCursor }
+            }
+        }
+    """
+
+    def setUp(self):
+        super().setUp()
+        office = helpers.create_office()
+        today = arrow.utcnow()
+        self.bookings = []
+        for i in range(5):
+            user = helpers.create_user(
+                username="user %s" % i, email="user%s@email.com" % i
+            )
+            for days in range(2):
+                self.bookings.append(
+                    helpers.create_booking(
+                        user=user,
+                        office=office,
+                        booking_date=today.shift(days=days).date(),
+                    )
+                )
+        self.bookings.sort(key=lambda booking: (booking.date, booking.uuid))
+
+    def test_filter_bookings_pages_by_date_and_uuid(self):
+        seen = []
+        after = None
+        while True:
+            response = self.client.execute(
+                self.query, variables={"first": 3, "after": after}
+            )
+            page = response.data.get("filterBookings")
+            seen += [edge["node"]["uuid"] for edge in page["edges"]]
+            if not page["pageInfo"]["hasNextPage"]:
+                break
+            after = page["pageInfo"]["endCursor"]
+        assert seen == [str(booking.uuid) for booking in self.bookings]
+
+    def test_filter_bookings_cursor_is_stable_across_inserts(self):
+        response = self.client.execute(self.query, variables={"first": 4})
+        after = response.data.get("filterBookings")["pageInfo"]["endCursor"]
+        helpers.create_booking(
+            user=self.user,
+            office=helpers.create_office(name="office 2"),
+            booking_date=arrow.utcnow().shift(days=-1).date(),
+        )
+        response = self.client.execute(
+            self.query, variables={"first": 1, "after": after}
+        )
+        edges = response.data.get("filterBookings")["edges"]
+        assert edges[0]["node"]["uuid"] == str(self.bookings[4].uuid)
+
+    def test_filter_bookings_rejects_invalid_cursor(self):
+        response = self.client.execute(
+            self.query, variables={"first": 1, "after": "not a cursor"}
+        )
+        assert str(response.errors[0]) == "invalid cursor"
+
+    @override_settings(BOOKINGS_MAX_PAGE_SIZE=4)
+    def test_filter_bookings_reads_max_page_size_per_request(self):
+        response = self.client.execute(self.query)
+        page = response.data.get("filterBookings")
+        assert len(page["edges"]) == 4
+        assert page["pageInfo"]["hasNextPage"]
+
+        response = self.client.execute(self.query, variables={"first": 5})
+        assert "exceeds the `first` limit of 4 records" in str(response.errors[0])
+
+    def test_all_bookings_pages_by_cursor(self):
+        query = """
+            query allBookings($after: String) {
+                allBookings(first: 3, after: $after) { uuid cursor }
+            }
+        """
+        seen = []
+        after = None
+        while True:
+            page = self.client.execute(query, variables={"after": after}).data.get(
+                "allBookings"
+            )
+            seen += [booking["uuid"] for booking in page]
+            if len(page) < 3:
+                break
+            after = page[-1]["cursor"]
+        assert seen == [str(booking.uuid) for booking in self.bookings]
+
+    def test_all_offices_pages_after_an_office(self):
+        offices = sorted(
+            [helpers.create_office("office %s" % i) for i in range(3)],
+            key=lambda office: office.name,
+        )
+        query = """
+            query allOffices($after: UUID) {
+                allOffices(first: 2, after: $after) { uuid }
+            }
+        """
+        response = self.client.execute(query, variables={"after": str(offices[0].uuid)})
+        assert response.data.get("allOffices") == [
+            {"uuid": str(office.uuid)} for office in offices[1:]
+        ]
+        response = self.client.execute(query, variables={"after": str(uuid4())})
+        assert str(response.errors[0]) == "This office does not exist"
+
+    @override_settings(BOOKINGS_MAX_PAGE_SIZE=4)
+    def test_all_bookings_enforces_max_page_size(self):
+        response = self.client.execute("query allBookings{ allBookings{ uuid}}")
+        assert len(response.data.get("allBookings")) == 4
+
+        response = self.client.execute(
+            "query allBookings{ allBookings(first: 5){ uuid}}"
+        )
+        assert str(response.errors[0]) == (
+            "Requesting 5 records on `allBookings` exceeds the limit of 4 records"
+        )
+
+
+class TestRecurringBookings(helpers.AuthenticatedClientTestCase):
+    create = """
+        mutation create($officeId: UUID!, $weekdays: [Weekday!]!, $interval: Int,
+                        $startDate: Date!, $endDate: Date) {
+            createRecurringBooking(officeId: $officeId, weekdays: $weekdays,
+                                   interval: $interval, startDate: $startDate,
+                                   endDate: $endDate) {
+                recurringBooking { uuid weekdays interval startDate endDate }
+            }
+        }
+    """
+    filter_query = """
+        query filter($from: Date, $to: Date, $first: Int, $after: String,
+                     $last: Int, $before: String) {
+            filterBookings(date_Gte: $from, date_Lte: $to, first: $first,
+                           after: $after, last: $last, before: $before) {
+                edges { cursor node { uuid date user { username }
+                                      recurringBooking { uuid } } }
+                pageInfo { hasNextPage hasPreviousPage endCursor startCursor }
+            }
+        }
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.office = helpers.create_office()
+        today = datetime.date.today()
+        # a Monday
+        self.start = today + datetime.timedelta(days=7 - today.weekday())
+
+    def day(self, days):
+        return self.start + datetime.timedelta(days=days)
+
+    def create_recurring(self, weekdays, interval=1, start=0, end=None):
+        return self.client.execute(
+            self.create,
+            {
+                "officeId": str(self.office.uuid),
+                "weekdays": weekdays,
+                "interval": interval,
+                "startDate": self.day(start).isoformat(),
+                "endDate": end if end is None else self.day(end).isoformat(),
+            },
+        )
+
+    def filter(self, **variables):
+        response = self.client.execute(
+            self.filter_query,
+            {"from": self.day(0).isoformat(), "to": self.day(13).isoformat()}
+            | variables,
+        )
+        assert response.errors is None, response.errors
+        return response.data["filterBookings"]
+
+    def test_occurrences_are_merged_with_bookings(self):
+        response = self.create_recurring(["TUESDAY", "THURSDAY"])
+        recurring = response.data["createRecurringBooking"]["recurringBooking"]
+        assert recurring["weekdays"] == ["TUESDAY", "THURSDAY"]
+        assert recurring["endDate"] is None
+        other = helpers.create_user(username="other", email="other@email.com")
+        booking = helpers.create_booking(other, self.office, self.day(2))
+
+        edges = self.filter()["edges"]
+        assert [
+            (edge["node"]["date"], edge["node"]["user"]["username"]) for edge in edges
+        ] == [
+            (self.day(1).isoformat(), "user"),
+            (self.day(2).isoformat(), "other"),
+            (self.day(3).isoformat(), "user"),
+            (self.day(8).isoformat(), "user"),
+            (self.day(10).isoformat(), "user"),
+        ]
+        assert edges[1]["node"]["uuid"] == str(booking.uuid)
+        assert edges[1]["node"]["recurringBooking"] is None
+        assert edges[0]["node"]["recurringBooking"] == {"uuid": recurring["uuid"]}
+        # occurrences keep their uuid from one read to the next
+        assert self.filter()["edges"] == edges
+
+        response = self.client.execute("query { allBookings(first: 2) { date } }")
+        assert response.data["allBookings"] == [
+            {"date": self.day(1).isoformat()},
+            {"date": self.day(2).isoformat()},
+        ]
+
+    def test_connections_paginate_across_occurrences(self):
+        self.create_recurring(["MONDAY", "WEDNESDAY", "FRIDAY"])
+        helpers.create_booking(
+            helpers.create_user(username="other", email="other@email.com"),
+            self.office,
+            self.day(2),
+        )
+        everything = [edge["node"]["uuid"] for edge in self.filter()["edges"]]
+        assert len(everything) == 7
+
+        pages, after = [], None
+        while True:
+            page = self.filter(first=2, after=after)
+            pages += [edge["node"]["uuid"] for edge in page["edges"]]
+            if not page["pageInfo"]["hasNextPage"]:
+                break
+            after = page["pageInfo"]["endCursor"]
+        assert pages == everything
+
+        page = self.filter(last=3, before=self.filter(first=5)["pageInfo"]["endCursor"])
+        assert [edge["node"]["uuid"] for edge in page["edges"]] == everything[1:4]
+        assert page["pageInfo"]["hasPreviousPage"]
+
+    def test_intervals_skip_weeks(self):
+        self.create_recurring(["MONDAY"], interval=2, end=27)
+        dates = [
+            edge["node"]["date"]
+            for edge in self.filter(to=self.day(40).isoformat())["edges"]
+        ]
+        assert dates == [self.day(0).isoformat(), self.day(14).isoformat()]
+
+    def test_conflicts_are_refused(self):
+        helpers.create_booking(self.user, self.office, self.day(8))
+        response = self.create_recurring(["TUESDAY"])
+        assert response.errors[0].message == (
+            "you can't book onto more than 1 office a day, already booked on %s"
+            % self.day(8).isoformat()
+        )
+        assert self.create_recurring(["TUESDAY"], interval=2).errors is None
+        # every other week from the week after never meets the first series
+        assert self.create_recurring(["TUESDAY"], interval=2, start=21).errors is None
+        response = self.create_recurring(["TUESDAY"], interval=4, start=28)
+        assert response.errors[0].message.endswith(self.day(29).isoformat())
+
+        response = self.client.execute(
+            'mutation { createBooking(officeId: "%s", date: "%s") { booking { uuid } } }'
+            % (self.office.uuid, self.day(1).isoformat())
+        )
+        assert (
+            response.errors[0].message == "you can't book onto more than 1 office a day"
+        )
+        response = self.client.execute(
+            'mutation { createBookings(bookings: [{officeId: "%s", date: "%s"}, {officeId: "%s", date: "%s"}]) { results { error } } }'
+            % (
+                self.office.uuid,
+                self.day(8).isoformat(),
+                self.office.uuid,
+                self.day(2).isoformat(),
+            )
+        )
+        assert [
+            result["error"] for result in response.data["createBookings"]["results"]
+        ] == [
+            "you can't book onto more than 1 office a day",
+            None,
+        ]
+
+    def test_series_are_refused_on_full_days(self):
+        self.office.capacity = 1
+        self.office.save()
+        other = helpers.create_user(username="other", email="other@email.com")
+        services.create_booking(
+            Booking(uuid=uuid4(), office=self.office, user=other, date=self.day(8))
+        )
+        RecurringBooking.objects.create(
+            uuid=uuid4(),
+            office=self.office,
+            user=other,
+            weekdays=recurrence.to_mask([0]),
+            start_date=self.day(7),
+        )
+        response = self.create_recurring(["MONDAY", "TUESDAY"], end=13)
+        assert response.errors[0].message == (
+            "this office is fully booked on %s, %s"
+            % (self.day(7).isoformat(), self.day(8).isoformat())
+        )
+        assert self.create_recurring(["MONDAY"], end=6).errors is None
+
+    def test_recurring_bookings_are_updated_and_deleted(self):
+        response = self.create_recurring(["MONDAY"], end=20)
+        uuid = response.data["createRecurringBooking"]["recurringBooking"]["uuid"]
+        response = self.client.execute(
+            """
+            mutation update($uuid: UUID!, $officeId: UUID!, $startDate: Date!) {
+                updateRecurringBooking(uuid: $uuid, officeId: $officeId,
+                                       weekdays: [FRIDAY], startDate: $startDate) {
+                    recurringBooking { weekdays endDate }
+                }
+            }
+            """,
+            {
+                "uuid": uuid,
+                "officeId": str(self.office.uuid),
+                "startDate": self.day(0).isoformat(),
+            },
+        )
+        assert response.data["updateRecurringBooking"]["recurringBooking"] == {
+            "weekdays": ["FRIDAY"],
+            "endDate": None,
+        }
+        response = self.client.execute("query { recurringBookings { uuid } }")
+        assert response.data["recurringBookings"] == [{"uuid": uuid}]
+
+        response = self.client.execute(
+            'mutation { deleteRecurringBooking(uuid: "%s") { recurringBooking { uuid } } }'
+            % uuid
+        )
+        assert response.data["deleteRecurringBooking"]["recurringBooking"] == {
+            "uuid": uuid
+        }
+        assert not RecurringBooking.objects.exists()
+        assert self.filter()["edges"] == []
+
+    @override_settings(BOOKINGS_MAX_PAGE_SIZE=2)
+    def test_recurring_bookings_are_paged(self):
+        uuids = [
+            self.create_recurring([weekday], start=start).data[
+                "createRecurringBooking"
+            ]["recurringBooking"]["uuid"]
+            for weekday, start in [("MONDAY", 0), ("TUESDAY", 0), ("WEDNESDAY", 7)]
+        ]
+        query = """
+            query recurringBookings($first: Int, $after: UUID) {
+                recurringBookings(first: $first, after: $after) { uuid }
+            }
+        """
+        response = self.client.execute(query)
+        assert [row["uuid"] for row in response.data["recurringBookings"]] == sorted(
+            uuids[:2]
+        )
+        response = self.client.execute(query, {"after": sorted(uuids[:2])[-1]})
+        assert response.data["recurringBookings"] == [{"uuid": uuids[2]}]
+        response = self.client.execute(query, {"first": 3})
+        assert str(response.errors[0]) == (
+            "Requesting 3 records on `recurringBookings` exceeds the limit of 2 records"
+        )
+        response = self.client.execute(query, {"after": str(uuid4())})
+        assert str(response.errors[0]) == "this recurring booking does not exist"
+
+    def test_pages_full_of_bookings_only_read_series_in_their_dates(self):
+        self.create_recurring(["MONDAY"], start=7)
+        other = helpers.create_user(username="other", email="other@email.com")
+        for days in range(3):
+            helpers.create_booking(other, self.office, self.day(days))
+        with mock.patch.object(recurrence, "expand", wraps=recurrence.expand) as expand:
+            response = self.client.execute("query { allBookings(first: 2) { date } }")
+            assert len(response.data["allBookings"]) == 2
+            assert len(self.filter(first=2)["edges"]) == 2
+            expand.assert_not_called()
+            edges = self.filter(first=4)["edges"]
+        assert [edge["node"]["date"] for edge in edges] == [
+            self.day(days).isoformat() for days in (0, 1, 2, 7)
+        ]
+        assert expand.called
+
+    def test_occurrences_stop_at_the_horizon(self):
+        recurring = RecurringBooking(
+            uuid=uuid4(), weekdays=recurrence.to_mask(range(7)), start_date=self.start
+        )
+        with override_settings(BOOKINGS_RECURRENCE_HORIZON=0):
+            assert list(recurrence.get_dates(recurring)) == []
+        with override_settings(
+            BOOKINGS_RECURRENCE_HORIZON=self.day(2).toordinal()
+            - datetime.date.today().toordinal()
+        ):
+            assert list(recurrence.get_dates(recurring, reverse=True)) == [
+                self.day(2),
+                self.day(1),
+                self.day(0),
+            ]
+
+
+class TestBookingArchive(helpers.AuthenticatedClientTestCase):
+    query = """
+        query filter($from: Date, $first: Int, $after: String, $last: Int) {
+            filterBookings(date_Gte: $from, first: $first, after: $after,
+                           last: $last) {
+                edges { node { date office { name } user { username } } }
+                pageInfo { hasNextPage endCursor }
+            }
+        }
+    """
+
+    def setUp(self):
+        super().setUp()
+        office = helpers.create_office()
+        other = helpers.create_user(username="other", email="other@email.com")
+        self.today = datetime.date.today()
+        self.days = [self.day(days) for days in (-10, -5, 0, 3)]
+        for day, user in zip(self.days, [self.user, other, self.user, other]):
+            helpers.create_booking(user, office, day)
+        call_command("rebuild_occupancy", stdout=StringIO())
+        out = StringIO()
+        call_command(
+            "archive_bookings",
+            before=self.day(-1),
+            batch_size=1,
+            stdout=out,
+        )
+        assert out.getvalue().splitlines() == [
+            "1 bookings archived",
+            "2 bookings archived",
+            "2 bookings dated before %s archived" % self.day(-1).isoformat(),
+        ]
+
+    def day(self, days):
+        return self.today + datetime.timedelta(days=days)
+
+    def filter(self, **variables):
+        response = self.client.execute(self.query, variables)
+        assert response.errors is None, response.errors
+        return response.data["filterBookings"]
+
+    def dates(self, page):
+        return [datetime.date.fromisoformat(e["node"]["date"]) for e in page["edges"]]
+
+    def test_past_bookings_are_moved_to_the_archive(self):
+        assert list(Booking.objects.values_list("date", flat=True)) == self.days[2:]
+        assert sorted(ArchivedBooking.objects.values_list("date", flat=True)) == (
+            self.days[:2]
+        )
+        call_command("rebuild_occupancy", stdout=StringIO())
+        assert OfficeOccupancy.objects.count() == 4
+
+    def test_archive_is_read_when_dates_reach_it(self):
+        page = self.filter()
+        assert self.dates(page) == self.days
+        assert [e["node"]["user"]["username"] for e in page["edges"]] == [
+            "user",
+            "other",
+            "user",
+            "other",
+        ]
+        assert page["edges"][0]["node"]["office"] == {"name": "office"}
+        assert self.dates(self.filter(**{"from": self.day(-5).isoformat()})) == (
+            self.days[1:]
+        )
+        assert self.dates(self.filter(last=3)) == self.days[1:]
+
+        dates, after = [], None
+        while True:
+            page = self.filter(first=1, after=after)
+            dates += self.dates(page)
+            if not page["pageInfo"]["hasNextPage"]:
+                break
+            after = page["pageInfo"]["endCursor"]
+        assert dates == self.days
+
+        response = self.client.execute("query { allBookings { date } }")
+        assert [booking["date"] for booking in response.data["allBookings"]] == [
+            day.isoformat() for day in self.days
+        ]
+
+    def test_exports_include_the_archive(self):
+        out = StringIO()
+        call_command("export_bookings", "--format=ndjson", "--chunk-size=1", stdout=out)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert [row["date"] for row in rows] == [day.isoformat() for day in self.days]
+        assert rows[0]["username"] == "user"
+        out = StringIO()
+        call_command(
+            "export_bookings",
+            "--format=ndjson",
+            "--from=%s" % self.day(-5).isoformat(),
+            "--to=%s" % self.day(0).isoformat(),
+            stdout=out,
+        )
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert [row["date"] for row in rows] == [
+            day.isoformat() for day in self.days[1:3]
+        ]
+
+    def test_archived_dates_stay_booked(self):
+        office_id = str(Office.objects.get().uuid)
+        response = self.client.execute(
+            'mutation { createBooking(officeId: "%s", date: "%s") { booking { uuid } } }'
+            % (office_id, self.days[0].isoformat())
+        )
+        assert (
+            response.errors[0].message == "you can't book onto more than 1 office a day"
+        )
+        response = self.client.execute(
+            """
+            mutation createBookings($bookings: [BookingInput!]!) {
+                createBookings(bookings: $bookings) { results { error } }
+            }
+            """,
+            variables={
+                "bookings": [
+                    {"officeId": office_id, "date": day.isoformat()}
+                    for day in self.days[:2]
+                ]
+            },
+        )
+        assert response.data["createBookings"]["results"] == [
+            {"error": "you can't book onto more than 1 office a day"},
+            {"error": None},
+        ]
+
+    def test_archive_is_left_alone_for_later_dates(self):
+        self.filter()
+        with CaptureQueriesContext(connection) as context:
+            page = self.filter(**{"from": self.day(-4).isoformat()})
+        assert self.dates(page) == self.days[2:]
+        assert not [q for q in context.captured_queries if "archived" in q["sql"]]
+
+
+class TestSquadPresence(helpers.AuthenticatedClientTestCase):
+    query = """
+        query presence($squad: String!, $from: Date!, $to: Date!) {
+            squadPresence(squad: $squad, from: $from, to: $to) {
+                date count users { username }
+            }
+            bestDays(squad: $squad, from: $from, to: $to, first: 2) { date count }
+        }
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.office = helpers.create_office()
+        self.today = datetime.date.today()
+        self.members = [self.user] + [
+            helpers.create_user(username="member%s" % i, email="%s@email.com" % i)
+            for i in range(2)
+        ]
+        outsider = helpers.create_user(username="outsider", email="out@email.com")
+        get_user_model().objects.filter(
+            pk__in=[user.pk for user in self.members]
+        ).update(squad="lunar")
+        get_user_model().objects.filter(pk=outsider.pk).update(squad="orion")
+        for user, days in zip(self.members + [outsider], [(0, 1), (1, 2), (1,), (0,)]):
+            for days in days:
+                helpers.create_booking(user, self.office, self.day(days))
+
+    def day(self, days):
+        return self.today + datetime.timedelta(days=days)
+
+    def presence(self, date_from=0, date_to=3):
+        response = self.client.execute(
+            self.query,
+            {
+                "squad": "lunar",
+                "from": self.day(date_from).isoformat(),
+                "to": self.day(date_to).isoformat(),
+            },
+        )
+        assert response.errors is None, response.errors
+        return response.data
+
+    def test_presence_of_a_squad(self):
+        data = self.presence()
+        assert [(day["count"], day["users"]) for day in data["squadPresence"]] == [
+            (1, [{"username": "user"}]),
+            (
+                3,
+                [
+                    {"username": "user"},
+                    {"username": "member0"},
+                    {"username": "member1"},
+                ],
+            ),
+            (1, [{"username": "member0"}]),
+            (0, []),
+        ]
+        assert data["bestDays"] == [
+            {"date": self.day(1).isoformat(), "count": 3},
+            {"date": self.day(0).isoformat(), "count": 1},
+        ]
+
+    def test_index_answers_without_reading_bookings(self):
+        self.presence()
+        with CaptureQueriesContext(connection) as context:
+            self.client.execute(
+                'query { squadPresence(squad: "lunar", from: "%s", to: "%s") { count } }'
+                % (self.day(0).isoformat(), self.day(30).isoformat())
+            )
+        assert not [q for q in context.captured_queries if "booking" in q["sql"]]
+
+    def test_index_follows_changes(self):
+        self.presence()
+        member = self.members[2]
+        with self.captureOnCommitCallbacks(execute=True):
+            services.create_booking(
+                Booking(uuid=uuid4(), office=self.office, user=member, date=self.day(3))
+            )
+            services.delete_bookings(list(Booking.objects.filter(user=self.members[1])))
+            RecurringBooking.objects.create(
+                uuid=uuid4(),
+                office=self.office,
+                user=self.user,
+                weekdays=recurrence.to_mask([self.day(2).weekday()]),
+                start_date=self.day(2),
+            )
+        counts = [day["count"] for day in self.presence()["squadPresence"]]
+        assert counts == [1, 2, 1, 1]
+        # members moving to another squad leave it with their bookings
+        with self.captureOnCommitCallbacks(execute=True):
+            member.squad = "orion"
+            member.save()
+        counts = [day["count"] for day in self.presence()["squadPresence"]]
+        assert counts == [1, 1, 1, 0]
+
+    def test_purged_offices_leave_the_index(self):
+        self.presence()
+        archive.archive_bookings(self.day(2))
+        with self.captureOnCommitCallbacks(execute=True):
+            purge.purge_office(purge.retire_office(self.office.uuid))
+        counts = [day["count"] for day in self.presence()["squadPresence"]]
+        assert counts == [0, 0, 0, 0]
+
+    def test_changes_during_a_rebuild_are_replayed(self):
+        booking = Booking(
+            uuid=uuid4(), office=self.office, user=self.members[2], date=self.day(3)
+        )
+        message = events.to_message(events.CREATED, booking)
+        load = presence.PresenceIndex.load
+
+        def load_then_book(index):
+            load(index)
+            # events don't wait for the rebuild to finish
+            thread = threading.Thread(target=presence.index.apply, args=(message,))
+            thread.start()
+            thread.join(timeout=5)
+            assert not thread.is_alive()
+
+        with mock.patch.object(presence.PresenceIndex, "load", load_then_book):
+            data = self.presence()
+        assert [day["count"] for day in data["squadPresence"]] == [1, 3, 1, 1]
+
+    def test_days_before_the_index_are_read_from_the_database(self):
+        helpers.create_booking(self.members[1], self.office, self.day(-3))
+        with override_settings(BOOKINGS_PRESENCE_HISTORY=0):
+            data = self.presence(-3, 1)
+        assert [day["count"] for day in data["squadPresence"]] == [1, 0, 0, 1, 3]
+        response = self.client.execute(
+            'query { squadPresence(squad: "lunar", from: "%s", to: "%s") { count } }'
+            % (self.day(1).isoformat(), self.day(0).isoformat())
+        )
+        assert response.errors[0].message == "`to` can't be before `from`"
+
+
+class TestBookingFilters(helpers.AuthenticatedClientTestCase):
+    query = """
+        query filterBookings($office: UUID, $from: Date, $to: Date) {
+          filterBookings(officeId: $office, date_Gte: $from, date_Lte: $to) {
+            edges { node { date office { uuid } } }
+          }
+        }
+    """
+
+    def test_filter_bookings_by_office_and_date_range(self):
+        office, other_office = helpers.create_office(), helpers.create_office()
+        today = arrow.utcnow()
+        for days in range(10):
+            helpers.create_booking(self.user, office, today.shift(days=days).date())
+        user = helpers.create_user(username="other", email="other@email.com")
+        helpers.create_booking(user, other_office, today.shift(days=2).date())
+
+        response = self.client.execute(
+            self.query,
+            variables={
+                "office": str(office.uuid),
+                "from": today.shift(days=2).date().isoformat(),
+                "to": today.shift(days=4).date().isoformat(),
+            },
+        )
+        assert response.errors is None
+        edges = response.data["filterBookings"]["edges"]
+        assert [edge["node"]["date"] for edge in edges] == [
+            today.shift(days=days).date().isoformat() for days in range(2, 5)
+        ]
+        assert {edge["node"]["office"]["uuid"] for edge in edges} == {str(office.uuid)}
+
+    def test_every_filter_combination_uses_an_index(self):
+        out = StringIO()
+        call_command("explain_filters", "--fail-on-scan", stdout=out)
+        output = out.getvalue()
+        assert "FULL SCAN" not in output
+        plan = output.split("officeId + dateRange: indexed\n")[1].split("\n")[0]
+        assert "booking_office_date_idx" in plan
+
+    def test_full_index_scans_are_flagged(self):
+        assert is_full_scan("2 0 0 SCAN bookings_booking")
+        assert is_full_scan("2 0 0 SCAN TABLE bookings_booking")
+        assert is_full_scan(
+            "2 0 0 SCAN bookings_booking USING INDEX booking_office_date_idx"
+        )
+        assert is_full_scan("5 0 0 SCAN users_extendeduser USING COVERING INDEX u")
+        assert is_full_scan("Seq Scan on bookings_booking  (cost=0.00..1.00)")
+        assert not is_full_scan(
+            "5 0 0 SEARCH bookings_booking USING INDEX booking_office_date_idx "
+            "(office_id=?)"
+        )
+        assert not is_full_scan(
+            "5 0 0 SCAN bookings_booking USING INDEX booking_date_uuid_idx"
+        )
+
+
+class TestBookingExport(helpers.AuthenticatedHTTPClientTestCase):
+    def setUp(self):
+        super().setUp()
+        self.office = helpers.create_office()
+        self.other_office = helpers.create_office(name="other")
+        self.today = arrow.utcnow()
+        for days in range(5):
+            helpers.create_booking(
+                self.user, self.office, self.today.shift(days=days).date()
+            )
+        user = helpers.create_user(username="other", email="other@email.com")
+        helpers.create_booking(user, self.other_office, self.today.date())
+
+    def date(self, days):
+        return self.today.shift(days=days).date().isoformat()
+
+    def test_export_csv_streams_filtered_bookings(self):
+        response = self.http_client.get(
+            "/bookings/export",
+            {"office": str(self.office.uuid), "from": self.date(1), "to": self.date(3)},
+        )
+        assert response.status_code == 200
+        assert response.streaming
+        assert response["Content-Type"] == "text/csv"
+        rows = list(csv.DictReader(StringIO(b"".join(response).decode())))
+        assert [row["date"] for row in rows] == [
+            self.date(1),
+            self.date(2),
+            self.date(3),
+        ]
+        assert rows[0]["office_name"] == "office"
+        assert rows[0]["username"] == "user"
+
+    def test_export_ndjson(self):
+        response = self.http_client.get("/bookings/export", {"format": "ndjson"})
+        rows = [json.loads(line) for line in b"".join(response).decode().splitlines()]
+        assert len(rows) == 6
+        assert rows[0]["date"] == self.date(0)
+        assert {row["office_name"] for row in rows} == {"office", "other"}
+
+    def test_export_rejects_invalid_filters(self):
+        response = self.http_client.get("/bookings/export", {"from": "yesterday"})
+        assert response.status_code == 400
+        assert "date__gte" in response.json()["errors"]
+
+    def test_export_requires_authentication(self):
+        response = Client().get("/bookings/export")
+        assert response.status_code == 401
+
+    def test_export_bookings_command(self):
+        out = StringIO()
+        call_command(
+            "export_bookings",
+            "--format=ndjson",
+            "--office=%s" % self.other_office.uuid,
+            "--chunk-size=2",
+            stdout=out,
+        )
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert [row["office_id"] for row in rows] == [str(self.other_office.uuid)]
+
+
+class TestBookingImport(helpers.AuthenticatedClientTestCase):
+    def import_bookings(self, path, *args):
+        out, err = StringIO(), StringIO()
+        call_command("import_bookings", path, *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def write(self, name, content):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    def setUp(self):
+        super().setUp()
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.tmpdir = tmpdir.name
+
+    def test_exported_bookings_import_back(self):
+        office = helpers.create_office()
+        today = arrow.utcnow()
+        for days in range(5):
+            helpers.create_booking(self.user, office, today.shift(days=days).date())
+        path = os.path.join(self.tmpdir, "bookings.csv")
+        call_command("export_bookings", "--output=%s" % path)
+        exported = set(Booking.objects.values_list("uuid", "office_id", "date"))
+        Booking.objects.all().delete()
+
+        out, err = self.import_bookings(path, "--batch-size=2")
+        assert out.startswith("5 bookings imported and 0 rows rejected")
+        assert set(Booking.objects.values_list("uuid", "office_id", "date")) == (
+            exported
+        )
+        assert OfficeOccupancy.objects.get(office=office, date=today.date()).count == 1
+
+    def test_rows_breaking_rules_are_rejected(self):
+        office = helpers.create_office()
+        today = arrow.utcnow().date()
+        helpers.create_booking(self.user, office, today)
+        rows = [
+            {"date": today.isoformat(), "office_id": str(office.uuid)},
+            {"date": "2030-01-01", "office_name": "office"},
+            {"date": "2030-01-01", "office_name": "office"},
+            {"date": "2030-01-02", "office_name": "nowhere"},
+            {"date": "2030-01-03", "office_name": "office", "username": "nobody"},
+            {"date": "someday", "office_name": "office"},
+        ]
+        path = self.write(
+            "bookings.ndjson",
+            "".join(json.dumps({"username": "user", **row}) + "\n" for row in rows),
+        )
+        rejects = os.path.join(self.tmpdir, "rejects.ndjson")
+        out, _ = self.import_bookings(path, "--batch-size=4", "--rejects=%s" % rejects)
+        assert out.startswith("1 bookings imported and 5 rows rejected")
+        with open(rejects) as f:
+            reasons = [(row["line"], row["reason"]) for row in map(json.loads, f)]
+        assert sorted(reasons) == [
+            (1, "user already booked that day"),
+            (3, "user already booked that day"),
+            (4, "unknown office"),
+            (5, "unknown user"),
+            (6, "invalid row"),
+        ]
+        assert Booking.objects.filter(date=datetime.date(2030, 1, 1)).count() == 1
+
+    def test_malformed_lines_are_rejected_with_their_line_number(self):
+        office = helpers.create_office()
+        row = {"username": "user", "office_id": str(office.uuid)}
+        lines = [
+            json.dumps({**row, "date": "2030-01-01"}),
+            "",
+            "{not json",
+            json.dumps([row]),
+            json.dumps({**row, "date": "2030-01-02"}),
+        ]
+        path = self.write("bookings.ndjson", "\n".join(lines) + "\n")
+        out, err = self.import_bookings(path, "--batch-size=2")
+        assert out.startswith("2 bookings imported and 2 rows rejected")
+        assert err.splitlines() == [
+            "line 3 rejected: invalid row",
+            "line 4 rejected: invalid row",
+        ]
+
+    def test_csv_rows_are_reported_by_line(self):
+        office = helpers.create_office()
+        path = self.write(
+            "bookings.csv",
+            "date,office_id,username\n"
+            "2030-01-01,%s,user\n"
+            "2030-01-01,%s,user\n" % (office.uuid, office.uuid),
+        )
+        _, err = self.import_bookings(path)
+        assert err == "line 3 rejected: user already booked that day\n"
+
+    def test_missing_offices_and_users_are_created(self):
+        office_id = uuid4()
+        path = self.write(
+            "bookings.csv",
+            "date,office_id,office_name,username,squad\n"
+            "2030-01-01,%s,new office,newcomer,lunar\n"
+            "2030-01-02,,new office,newcomer,lunar\n" % office_id,
+        )
+        out, _ = self.import_bookings(path, "--create-offices", "--create-users")
+        assert out.startswith("2 bookings imported and 0 rows rejected")
+        user = get_user_model().objects.get(username="newcomer")
+        assert user.squad == "lunar"
+        assert not user.has_usable_password()
+        assert set(user.booking.values_list("office_id", flat=True)) == {office_id}
+        assert (
+            SquadOccupancy.objects.get(
+                office_id=office_id, date=datetime.date(2030, 1, 2)
+            ).squad
+            == "lunar"
+        )
+
+    def test_rows_on_recurring_bookings_are_rejected(self):
+        office = helpers.create_office()
+        RecurringBooking.objects.create(
+            uuid=uuid4(),
+            office=office,
+            user=self.user,
+            weekdays=recurrence.to_mask([0]),
+            start_date=datetime.date(2030, 1, 1),
+        )
+        path = self.write(
+            "bookings.csv",
+            "date,office_id,username\n"
+            "2030-01-07,%s,user\n"
+            "2030-01-08,%s,user\n" % (office.uuid, office.uuid),
+        )
+        _, err = self.import_bookings(path)
+        assert err == "line 2 rejected: user already booked that day\n"
+        assert list(Booking.objects.values_list("date", flat=True)) == [
+            datetime.date(2030, 1, 8)
+        ]
+
+    def test_created_offices_are_listed_at_once(self):
+        self.client.execute("query { allOffices { name } }")
+        path = self.write(
+            "bookings.csv", "date,office_name,username\n2030-01-01,new office,user\n"
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.import_bookings(path, "--create-offices")
+        response = self.client.execute("query { allOffices { name } }")
+        assert response.data["allOffices"] == [{"name": "new office"}]
+
+    def test_rows_of_retired_offices_are_rejected(self):
+        office = helpers.create_office()
+        purge.retire_office(office.uuid)
+        path = self.write(
+            "bookings.csv",
+            "date,office_id,office_name,username\n"
+            "2030-01-01,%s,,user\n"
+            "2030-01-02,,office,user\n" % office.uuid,
+        )
+        _, err = self.import_bookings(path, "--create-offices")
+        assert err == "line 2 rejected: unknown office\n"
+        assert not Booking.objects.filter(office=office).exists()
+
+    def test_archived_bookings_are_recounted_with_imported_ones(self):
+        office = helpers.create_office()
+        yesterday = arrow.utcnow().shift(days=-1).date()
+        other = helpers.create_user("other", "other@email.com")
+        helpers.create_booking(other, office, yesterday)
+        archive.archive_bookings(arrow.utcnow().date())
+        path = self.write(
+            "bookings.csv",
+            "date,office_id,username\n%s,%s,user\n" % (yesterday, office.uuid),
+        )
+        out, _ = self.import_bookings(path)
+        assert out.startswith("1 bookings imported and 0 rows rejected")
+        assert OfficeOccupancy.objects.get(office=office, date=yesterday).count == 2
+
+    def test_rows_clashing_with_archived_bookings_are_rejected(self):
+        office = helpers.create_office()
+        helpers.create_user("other", "other@email.com")
+        yesterday = arrow.utcnow().shift(days=-1).date()
+        booking = helpers.create_booking(self.user, office, yesterday)
+        archive.archive_bookings(arrow.utcnow().date())
+        path = self.write(
+            "bookings.csv",
+            "uuid,date,office_id,username\n"
+            "%s,%s,%s,other\n"
+            ",%s,%s,user\n"
+            % (booking.uuid, yesterday, office.uuid, yesterday, office.uuid),
+        )
+        _, err = self.import_bookings(path)
+        assert err.splitlines() == [
+            "line 2 rejected: booking already exists",
+            "line 3 rejected: user already booked that day",
+        ]
+        assert not Booking.objects.exists()
+
+
+class TestGraphQLView(helpers.AuthenticatedHTTPClientTestCase):
+    query = "query allOffices{allOffices{uuid name}}"
+
+    def post(self, data):
+        return self.post_graphql(data).json()
+
+    def test_persisted_query_is_resolved_from_its_hash(self):
+        office = helpers.create_office()
+        extensions = {
+            "persistedQuery": {"version": 1, "sha256Hash": hash_query(self.query)}
+        }
+        response = self.post({"extensions": extensions})
+        assert response["errors"][0]["message"] == "PersistedQueryNotFound"
+
+        response = self.post({"query": self.query, "extensions": extensions})
+        assert response["data"]["allOffices"][0]["uuid"] == str(office.uuid)
+
+        response = self.post({"extensions": extensions})
+        assert response["data"]["allOffices"][0]["uuid"] == str(office.uuid)
+
+    def test_anonymous_clients_cannot_register_persisted_queries(self):
+        extensions = {
+            "persistedQuery": {"version": 1, "sha256Hash": hash_query(self.query)}
+        }
+        response = Client().post(
+            "/graphql",
+            json.dumps({"query": self.query, "extensions": extensions}),
+            content_type="application/json",
+        )
+        # the query itself still runs
+        assert response.json()["errors"][0]["message"] == "not logged in"
+        response = self.post({"extensions": extensions})
+        assert response["errors"][0]["message"] == "PersistedQueryNotFound"
+
+    @override_settings(GRAPHQL_PERSISTED_QUERIES_MAX_LENGTH=10)
+    def test_long_queries_are_not_registered(self):
+        extensions = {
+            "persistedQuery": {"version": 1, "sha256Hash": hash_query(self.query)}
+        }
+        response = self.post({"query": self.query, "extensions": extensions})
+        assert "errors" not in response
+        response = self.post({"extensions": extensions})
+        assert response["errors"][0]["message"] == "PersistedQueryNotFound"
+
+    def test_persisted_query_with_mismatched_hash_is_rejected(self):
+        extensions = {"persistedQuery": {"version": 1, "sha256Hash": "0" * 64}}
+        response = self.post({"query": self.query, "extensions": extensions})
+        assert response["errors"][0]["message"] == (
+            "provided sha256Hash does not match query"
+        )
+
+    def test_document_cache_reuses_validated_documents(self):
+        backend = CachedDocumentBackend(max_size=1)
+        document = backend.document_from_string(schema, self.query)
+        assert backend.document_from_string(schema, self.query) is document
+        assert backend.cache_info()["hits"] == 1
+
+        backend.document_from_string(schema, "query me{me{username}}")
+        assert backend.document_from_string(schema, self.query) is not document
+        assert backend.cache_info() == {
+            "hits": 1,
+            "misses": 3,
+            "size": 1,
+            "max_size": 1,
+        }
+
+    def test_document_cache_is_dropped_when_the_schema_changes(self):
+        backend = CachedDocumentBackend()
+        document = backend.document_from_string(schema, self.query)
+        other_schema = graphene.Schema(query=Query, mutation=Mutation)
+        assert backend.document_from_string(other_schema, self.query) is not document
+        assert backend.cache_info()["size"] == 1
+
+    def test_document_cache_backend_executes_schema_queries(self):
+        office = helpers.create_office()
+        request = RequestFactory().post("/graphql")
+        request.user = self.user
+        result = schema.execute(
+            self.query, context_value=request, backend=CachedDocumentBackend()
+        )
+        assert result.errors is None
+        assert result.data["allOffices"][0]["uuid"] == str(office.uuid)
+
+    def test_document_cache_keeps_validation_errors(self):
+        backend = CachedDocumentBackend()
+        document = backend.document_from_string(schema, "query{allOffices{nope}}")
+        result = document.execute()
+        assert result.invalid
+        assert "nope" in str(result.errors[0])
+
+
+class TestBatchedRequests(helpers.AuthenticatedHTTPClientTestCase):
+    query = "query allOffices{allOffices{uuid name}}"
+
+    def test_operations_are_answered_in_order(self):
+        office = helpers.create_office()
+        response = self.post_graphql(
+            [
+                {"id": "offices", "query": self.query},
+                {"id": "me", "query": "query { me { username } }"},
+            ]
+        )
+        assert response.status_code == 200
+        assert response.json() == [
+            {
+                "data": {"allOffices": [{"uuid": str(office.uuid), "name": "office"}]},
+                "id": "offices",
+                "status": 200,
+            },
+            {"data": {"me": {"username": "user"}}, "id": "me", "status": 200},
+        ]
+
+    def test_users_are_authenticated_once_per_batch(self):
+        helpers.create_office()
+        self.post_graphql({"query": self.query})
+        token_cache.clear()
+        with self.assertNumQueries(1):
+            response = self.post_graphql([{"query": self.query}] * 3)
+        assert [result["status"] for result in response.json()] == [200] * 3
+
+    def test_operations_see_the_mutations_before_them(self):
+        response = self.post_graphql(
+            [
+                {"query": 'mutation { createOffice(name: "new") { office { uuid } } }'},
+                {"query": self.query},
+            ]
+        ).json()
+        assert response[1]["data"]["allOffices"] == [
+            response[0]["data"]["createOffice"]["office"] | {"name": "new"}
+        ]
+
+    def test_failed_operations_dont_fail_the_others(self):
+        response = self.post_graphql([{"query": self.query}, {"variables": {}}])
+        assert response.status_code == 400
+        results = response.json()
+        assert results[0]["data"] == {"allOffices": []}
+        assert results[1]["status"] == 400
+        assert results[1]["errors"][0]["message"] == "Must provide query string."
+
+    @override_settings(GRAPHQL_MAX_BATCH_SIZE=2)
+    def test_batches_are_limited_in_size(self):
+        response = self.post_graphql([{"query": self.query}] * 3)
+        assert response.status_code == 400
+        assert response.json()["errors"][0]["message"] == (
+            "Batches can't have more than 2 operations."
+        )
+        assert self.post_graphql([]).status_code == 400
+
+
+class TestQueryComplexity(helpers.AuthenticatedHTTPClientTestCase):
+    bookings_query = """
+        query bookings($first: Int) {
+          filterBookings(first: $first) {
+            edges { node { uuid office { name } user { username } } }
+          }
+        }
+    """
+
+    def post(self, data):
+        response = self.post_graphql(data)
+        return response.status_code, response.json()
+
+    def test_many_aliased_connections_are_rejected_before_execution(self):
+        query = "query{%s}" % " ".join(
+            "b%s: filterBookings(first: 100) { edges { node { uuid } } }" % i
+            for i in range(30)
+        )
+        with CaptureQueriesContext(connection) as queries:
+            status, response = self.post({"query": query})
+        assert status == 400
+        assert "data" not in response
+        assert [error["extensions"] for error in response["errors"]] == [
+            {"code": "MAX_ALIASES_EXCEEDED", "aliases": 30, "maxAliases": 15},
+            {"code": "MAX_COST_EXCEEDED", "cost": 6090, "maxCost": 5000},
+        ]
+        # only the user is loaded to authenticate the request
+        assert len(queries) <= 1
+
+    def test_complexity_is_checked_through_schema_execute(self):
+        request = RequestFactory().post("/graphql")
+        request.user = self.user
+        backend = CachedDocumentBackend()
+        query = "query{%s}" % " ".join(
+            "b%s: filterBookings(first: 1) { edges { node { uuid } } }" % i
+            for i in range(16)
+        )
+        # graphql() hands root_value and context_value on positionally
+        result = schema.execute(
+            query, root_value=None, context_value=request, backend=backend
+        )
+        assert result.invalid
+        assert result.errors[0].extensions["code"] == "MAX_ALIASES_EXCEEDED"
+
+        result = schema.execute(
+            self.bookings_query,
+            variables={"first": 1},
+            context_value=request,
+            backend=backend,
+        )
+        assert result.errors is None
+        assert result.data["filterBookings"]["edges"] == []
+
+    def test_connection_cost_follows_first_variable(self):
+        with self.settings(GRAPHQL_MAX_COST=100):
+            status, response = self.post(
+                {"query": self.bookings_query, "variables": {"first": 10}}
+            )
+            assert status == 200
+            assert response["data"]["filterBookings"]["edges"] == []
+
+            status, response = self.post(
+                {"query": self.bookings_query, "variables": {"first": 50}}
+            )
+            assert status == 400
+            assert response["errors"][0]["extensions"]["cost"] == 203
+
+            status, response = self.post({"query": self.bookings_query})
+            assert response["errors"][0]["extensions"]["cost"] == 403
+
+    def test_depth_counts_fields_in_fragments(self):
+        query = """
+            query { filterBookings(first: 1) { ...bookings } }
+            fragment bookings on BookingTypeConnection {
+              edges { node { office { name } } }
+            }
+        """
+        with self.settings(GRAPHQL_MAX_DEPTH=4):
+            status, response = self.post({"query": query})
+        assert status == 400
+        assert response["errors"][0]["extensions"] == {
+            "code": "MAX_DEPTH_EXCEEDED",
+            "depth": 5,
+            "maxDepth": 4,
+        }
+
+    def test_introspection_is_not_limited(self):
+        with self.settings(GRAPHQL_MAX_DEPTH=2, GRAPHQL_MAX_COST=1):
+            status, response = self.post({"query": introspection_query})
+        assert status == 200
+        assert response["data"]["__schema"]["queryType"]["name"] == "Query"
+
+
+@override_settings(GRAPHQL_TRACING=True)
+class TestTracing(helpers.AuthenticatedHTTPClientTestCase):
+    query = "query tracedBookings{allBookings{uuid office{name}}}"
+
+    def setUp(self):
+        super().setUp()
+        office = helpers.create_office()
+        for days in range(3):
+            helpers.create_booking(
+                self.user, office, arrow.utcnow().shift(days=days).date()
+            )
+
+    @override_settings(GRAPHQL_TRACING_EXTENSIONS=True)
+    def test_trace_is_returned_in_extensions(self):
+        response = self.post_graphql({"query": self.query}).json()
+        tracing = response["extensions"]["tracing"]
+        assert tracing["version"] == 1
+        # cached documents are not parsed again
+        assert tracing["parsing"]["duration"] >= 0
+        assert tracing["validation"]["duration"] > 0
+        assert tracing["authentication"]["duration"] > 0
+        resolvers = {
+            tuple(resolver["path"]): resolver
+            for resolver in tracing["execution"]["resolvers"]
+        }
+        all_bookings = resolvers[("allBookings",)]
+        assert all_bookings["parentType"] == "Query"
+        assert all_bookings["returnType"] == "[BookingType]"
+        # the extent of the archive, bookings and recurring bookings
+        assert all_bookings["sqlQueries"] == 3
+        assert all_bookings["duration"] >= all_bookings["sqlDuration"] > 0
+        assert ("allBookings", 2, "office", "name") in resolvers
+        # the user is loaded to authenticate the request
+        assert tracing["sql"]["queries"] == 4
+
+    def test_trace_is_left_out_of_results_by_default(self):
+        response = self.post_graphql({"query": self.query}).json()
+        assert "extensions" not in response
+
+    def test_metrics_are_exported_per_operation(self):
+        self.post_graphql({"query": self.query})
+        self.post_graphql({"query": self.query})
+        response = self.http_client.get("/metrics")
+        assert response.status_code == 200
+        metrics = response.content.decode()
+        assert (
+            'graphql_request_duration_seconds_count{operation="tracedBookings"} 2'
+            in metrics
+        )
+        assert (
+            'graphql_db_queries_bucket{operation="tracedBookings",le="5"} 2' in metrics
+        )
+        assert (
+            'graphql_resolver_duration_seconds_count{operation="tracedBookings",'
+            'field="Query.allBookings"} 2' in metrics
+        )
+        for phase in ("parsing", "validation", "authentication", "execution"):
+            assert (
+                'graphql_phase_duration_seconds_count{operation="tracedBookings",'
+                'phase="%s"}' % phase in metrics
+            )
+
+    def test_metrics_are_labelled_only_by_operations_of_the_document(self):
+        self.post_graphql({"query": self.query, "operationName": "spoofed"})
+        self.post_graphql({"query": "{me{username}}", "operationName": "spoofed"})
+        self.post_graphql({"query": "{me{username}}"})
+        metrics = self.http_client.get("/metrics").content.decode()
+        assert "spoofed" not in metrics
+        assert 'graphql_request_duration_seconds_count{operation="other"} 2' in metrics
+        assert (
+            'graphql_request_duration_seconds_count{operation="anonymous"} 1' in metrics
+        )
+
+
+class TestBulkBookingEndPoints(helpers.AuthenticatedClientTestCase):
+    def test_create_bookings(self):
+        office = helpers.create_office()
+        today = arrow.utcnow()
+        bookings = [
+            {
+                "officeId": str(office.uuid),
+                "date": today.shift(days=i).date().isoformat(),
+            }
+            for i in range(31)
+        ]
+        # authentication, offices, the extent of the archive, existing and
+        # recurring bookings are read, then one transaction admits every day at
+        # once, inserts the bookings and counts them per squad
+        with self.assertNumQueries(14):
+            response = self.client.execute(
+                """
+                mutation createBookings($bookings: [BookingInput!]!) {
+                    createBookings(bookings: $bookings) {
+                        results { uuid error booking { date } }
+                    }
+                }
+                """,
+                variables={"bookings": bookings},
+            )
+        results = response.data.get("createBookings").get("results")
+        assert [result["error"] for result in results] == [None] * 31
+        assert Booking.objects.filter(user=self.user, office=office).count() == 31
+
+    def test_create_bookings_reports_errors_per_booking(self):
+        office = helpers.create_office()
+        today = arrow.utcnow()
+        helpers.create_booking(user=self.user, office=office, booking_date=today.date())
+        bookings = [
+            {"officeId": str(office.uuid), "date": today.date().isoformat()},
+            {
+                "officeId": str(office.uuid),
+                "date": today.shift(days=1).date().isoformat(),
+            },
+            {
+                "officeId": str(office.uuid),
+                "date": today.shift(days=1).date().isoformat(),
+            },
+            {"officeId": str(uuid4()), "date": today.shift(days=2).date().isoformat()},
+        ]
+        response = self.client.execute(
+            """
+            mutation createBookings($bookings: [BookingInput!]!) {
+                createBookings(bookings: $bookings) { results { error } }
+            }
+            """,
+            variables={"bookings": bookings},
+        )
+        results = response.data.get("createBookings").get("results")
+        assert [result["error"] for result in results] == [
+            "you can't book onto more than 1 office a day",
+            None,
+            "you can't book onto more than 1 office a day",
+            "This office does not exist",
+        ]
+        assert Booking.objects.filter(user=self.user).count() == 2
+
+    def test_update_bookings(self):
+        office_1 = helpers.create_office()
+        office_2 = helpers.create_office(name="office 2")
+        today = arrow.utcnow()
+        booking_1 = helpers.create_booking(
+            user=self.user, office=office_1, booking_date=today.date()
+        )
+        booking_2 = helpers.create_booking(
+            user=self.user, office=office_1, booking_date=today.shift(days=1).date()
+        )
+        response = self.client.execute(
+            """
+            mutation updateBookings($bookings: [BookingUpdateInput!]!) {
+                updateBookings(bookings: $bookings) { results { uuid error } }
+            }
+            """,
+            variables={
+                "bookings": [
+                    {"uuid": str(booking_1.uuid), "officeId": str(office_2.uuid)},
+                    {
+                        "uuid": str(booking_2.uuid),
+                        "date": today.date().isoformat(),
+                    },
+                    {"uuid": str(uuid4()), "date": today.date().isoformat()},
+                ]
+            },
+        )
+        results = response.data.get("updateBookings").get("results")
+        assert [result["error"] for result in results] == [
+            None,
+            "you can't book onto more than 1 office a day",
+            "this booking does not exist",
+        ]
+        assert Booking.objects.get(uuid=booking_1.uuid).office == office_2
+        assert (
+            Booking.objects.get(uuid=booking_2.uuid).date == today.shift(days=1).date()
+        )
+
+    update_bookings = """
+        mutation updateBookings($bookings: [BookingUpdateInput!]!) {
+            updateBookings(bookings: $bookings) { results { uuid error } }
+        }
+    """
+
+    def test_update_bookings_swaps_dates(self):
+        office = helpers.create_office()
+        today, tomorrow = datetime.date(2030, 1, 1), datetime.date(2030, 1, 2)
+        booking_1 = helpers.create_booking(self.user, office, today)
+        booking_2 = helpers.create_booking(self.user, office, tomorrow)
+        response = self.client.execute(
+            self.update_bookings,
+            variables={
+                "bookings": [
+                    {"uuid": str(booking_1.uuid), "date": tomorrow.isoformat()},
+                    {"uuid": str(booking_2.uuid), "date": today.isoformat()},
+                ]
+            },
+        )
+        results = response.data.get("updateBookings").get("results")
+        assert [result["error"] for result in results] == [None, None]
+        assert Booking.objects.get(uuid=booking_1.uuid).date == tomorrow
+        assert Booking.objects.get(uuid=booking_2.uuid).date == today
+
+    def test_bookings_keeping_their_date_keep_it_whatever_the_order(self):
+        office_1 = helpers.create_office()
+        office_2 = helpers.create_office(name="office 2")
+        today, tomorrow = datetime.date(2030, 1, 1), datetime.date(2030, 1, 2)
+        staying = helpers.create_booking(self.user, office_1, today)
+        moving = helpers.create_booking(self.user, office_1, tomorrow)
+        response = self.client.execute(
+            self.update_bookings,
+            variables={
+                "bookings": [
+                    {"uuid": str(moving.uuid), "date": today.isoformat()},
+                    {"uuid": str(staying.uuid), "officeId": str(office_2.uuid)},
+                ]
+            },
+        )
+        results = response.data.get("updateBookings").get("results")
+        assert [result["error"] for result in results] == [
+            "you can't book onto more than 1 office a day",
+            None,
+        ]
+        assert Booking.objects.get(uuid=staying.uuid).office == office_2
+        assert Booking.objects.get(uuid=moving.uuid).date == tomorrow
+
+    def test_delete_bookings(self):
+        office = helpers.create_office()
+        today = arrow.utcnow()
+        bookings = [
+            helpers.create_booking(
+                user=self.user, office=office, booking_date=today.shift(days=i).date()
+            )
+            for i in range(3)
+        ]
+        missing_uuid = uuid4()
+        response = self.client.execute(
+            """
+            mutation deleteBookings($uuids: [UUID!]!) {
+                deleteBookings(uuids: $uuids) { results { uuid error } }
+            }
+            """,
+            variables={
+                "uuids": [str(booking.uuid) for booking in bookings[:2]]
+                + [str(missing_uuid)]
+            },
+        )
+        results = response.data.get("deleteBookings").get("results")
+        assert [result["error"] for result in results] == [
+            None,
+            None,
+            "this booking does not exist",
+        ]
+        assert list(Booking.objects.all()) == bookings[2:]
+
+    @override_settings(BOOKINGS_MAX_BULK_SIZE=1)
+    def test_bulk_mutations_enforce_max_size(self):
+        response = self.client.execute(
+            """
+            mutation deleteBookings($uuids: [UUID!]!) {
+                deleteBookings(uuids: $uuids) { results { uuid error } }
+            }
+            """,
+            variables={"uuids": [str(uuid4()), str(uuid4())]},
+        )
+        assert (
+            str(response.errors[0]) == "you can't change more than 1 bookings at once"
+        )
+
+
+class TestOfficeCapacity(helpers.AuthenticatedClientTestCase):
+    create_booking = """
+        mutation createBooking($officeId: UUID!, $date: Date!) {
+            createBooking(officeId: $officeId, date: $date) { booking { uuid } }
+        }
+    """
+
+    def test_booking_a_full_office_fails(self):
+        office = Office.objects.create(uuid=uuid4(), name="office", capacity=1)
+        today = arrow.utcnow().date()
+        helpers.create_booking(
+            user=helpers.create_user(username="other", email="other@email.com"),
+            office=office,
+            booking_date=today,
+        )
+        OfficeOccupancy.objects.create(office=office, date=today, count=1)
+        response = self.client.execute(
+            self.create_booking,
+            variables={"officeId": str(office.uuid), "date": today.isoformat()},
+        )
+        assert str(response.errors[0]) == "this office is fully booked on that date"
+        assert not Booking.objects.filter(user=self.user)
+
+    def test_occupancy_follows_bookings(self):
+        office_1 = Office.objects.create(uuid=uuid4(), name="office 1", capacity=1)
+        office_2 = helpers.create_office(name="office 2")
+        today = arrow.utcnow().date()
+        response = self.client.execute(
+            self.create_booking,
+            variables={"officeId": str(office_1.uuid), "date": today.isoformat()},
+        )
+        booking_uuid = response.data["createBooking"]["booking"]["uuid"]
+        assert OfficeOccupancy.objects.get(office=office_1, date=today).count == 1
+
+        self.client.execute(
+            'mutation { updateBooking(uuid: "%s", officeId: "%s") { booking { uuid } } }'
+            % (booking_uuid, office_2.uuid)
+        )
+        assert OfficeOccupancy.objects.get(office=office_1, date=today).count == 0
+        assert OfficeOccupancy.objects.get(office=office_2, date=today).count == 1
+
+        self.client.execute(
+            'mutation { deleteBooking(uuid: "%s") { booking { uuid } } }' % booking_uuid
+        )
+        assert OfficeOccupancy.objects.get(office=office_2, date=today).count == 0
+
+    def test_create_bookings_refuses_full_days_only(self):
+        office = Office.objects.create(uuid=uuid4(), name="office", capacity=1)
+        today = arrow.utcnow()
+        OfficeOccupancy.objects.create(office=office, date=today.date(), count=1)
+        response = self.client.execute(
+            """
+            mutation createBookings($bookings: [BookingInput!]!) {
+                createBookings(bookings: $bookings) { results { error } }
+            }
+            """,
+            variables={
+                "bookings": [
+                    {
+                        "officeId": str(office.uuid),
+                        "date": today.shift(days=i).date().isoformat(),
+                    }
+                    for i in range(3)
+                ]
+            },
+        )
+        results = response.data.get("createBookings").get("results")
+        assert [result["error"] for result in results] == [
+            "this office is fully booked on that date",
+            None,
+            None,
+        ]
+        assert Booking.objects.filter(user=self.user).count() == 2
+
+
+class TestOfficeCapacityUnderContention(TransactionTestCase):
+    capacity = 40
+    users = 300
+    threads = 16
+
+    def test_concurrent_bookings_never_overbook(self):
+        office = Office.objects.create(
+            uuid=uuid4(), name="office", capacity=self.capacity
+        )
+        get_user_model().objects.bulk_create(
+            get_user_model()(username="user %s" % i, email="user%s@email.com" % i)
+            for i in range(self.users)
+        )
+        user_ids = list(get_user_model().objects.values_list("id", flat=True))
+        today = datetime.date.today()
+
+        def book(user_id):
+            try:
+                services.create_booking(
+                    Booking(uuid=uuid4(), office=office, user_id=user_id, date=today)
+                )
+                return True
+            except services.OfficeFullError:
+                return False
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(self.threads) as executor:
+            admitted = sum(executor.map(book, user_ids))
+        elapsed = time.perf_counter() - started
+        print(
+            "\n%s booking attempts from %s threads in %.2fs (%.0f/s)"
+            % (self.users, self.threads, elapsed, self.users / elapsed)
+        )
+
+        assert admitted == self.capacity
+        assert Booking.objects.filter(office=office).count() == self.capacity
+        assert OfficeOccupancy.objects.get(office=office).count == self.capacity
+
+
+class TestOfficeOccupancy(helpers.AuthenticatedClientTestCase):
+    query = """
+        query officeOccupancy($officeId: UUID!, $from: Date!, $to: Date!) {
+            officeOccupancy(officeId: $officeId, from: $from, to: $to) {
+                date count capacity squads { squad count }
+            }
+        }
+    """
+
+    def book(self, office, date):
+        return self.client.execute(
+            """
+            mutation createBooking($officeId: UUID!, $date: Date!) {
+                createBooking(officeId: $officeId, date: $date) { booking { uuid } }
+            }
+            """,
+            variables={"officeId": str(office.uuid), "date": date.isoformat()},
+        )
+
+    def test_office_occupancy_counts_bookings_per_day_and_squad(self):
+        office = Office.objects.create(uuid=uuid4(), name="office", capacity=10)
+        today = arrow.utcnow()
+        self.user.squad = "lunar"
+        self.user.save()
+        self.book(office, today.date())
+        self.book(office, today.shift(days=1).date())
+        self.client.authenticate(
+            helpers.create_user(username="other", email="other@email.com")
+        )
+        self.book(office, today.date())
+
+        # the user was verified by the previous request
+        with self.assertNumQueries(3):
+            response = self.client.execute(
+                self.query,
+                variables={
+                    "officeId": str(office.uuid),
+                    "from": today.date().isoformat(),
+                    "to": today.shift(days=2).date().isoformat(),
+                },
+            )
+        assert response.data.get("officeOccupancy") == [
+            {
+                "date": today.date().isoformat(),
+                "count": 2,
+                "capacity": 10,
+                "squads": [
+                    {"squad": None, "count": 1},
+                    {"squad": "lunar", "count": 1},
+                ],
+            },
+            {
+                "date": today.shift(days=1).date().isoformat(),
+                "count": 1,
+                "capacity": 10,
+                "squads": [{"squad": "lunar", "count": 1}],
+            },
+            {
+                "date": today.shift(days=2).date().isoformat(),
+                "count": 0,
+                "capacity": 10,
+                "squads": [],
+            },
+        ]
+
+    def test_rebuild_occupancy_matches_incremental_counts(self):
+        office = helpers.create_office()
+        today = arrow.utcnow()
+        for days in range(3):
+            self.book(office, today.shift(days=days).date())
+        self.client.execute(
+            'mutation { deleteBooking(uuid: "%s") { booking { uuid } } }'
+            % Booking.objects.get(date=today.date()).uuid
+        )
+        counted = set(
+            SquadOccupancy.objects.filter(count__gt=0).values_list(
+                "office_id", "date", "squad", "count"
+            )
+        )
+        call_command("rebuild_occupancy", stdout=StringIO())
+        assert (
+            set(
+                SquadOccupancy.objects.values_list(
+                    "office_id", "date", "squad", "count"
+                )
+            )
+            == counted
+        )
+        assert OfficeOccupancy.objects.filter(office=office).count() == 2
+
+    def test_bulk_deletes_release_their_desks(self):
+        office = helpers.create_office()
+        today = arrow.utcnow()
+        for days in range(4):
+            self.book(office, today.shift(days=days).date())
+        bookings = list(Booking.objects.order_by("date"))
+        self.client.execute(
+            "mutation deleteBookings($uuids: [UUID!]!) {"
+            " deleteBookings(uuids: $uuids) { results { error } } }",
+            variables={"uuids": [str(booking.uuid) for booking in bookings[:2]]},
+        )
+        # a booking moved since it was read is left where it is
+        moved = Booking.objects.get(uuid=bookings[2].uuid)
+        previous_key = services.booking_key(moved)
+        moved.date = today.shift(days=9).date()
+        services.update_booking(moved, previous_key)
+        assert services.delete_bookings(bookings[2:]) == [bookings[3]]
+        assert list(Booking.objects.values_list("uuid", flat=True)) == [
+            bookings[2].uuid
+        ]
+        counted = set(OfficeOccupancy.objects.values_list("date", "count"))
+        call_command("rebuild_occupancy", stdout=StringIO())
+        rebuilt = set(OfficeOccupancy.objects.values_list("date", "count"))
+        assert counted - {(date, 0) for date, _ in counted} == rebuilt
+
+
+class TestOfficeCache(helpers.AuthenticatedHTTPClientTestCase):
+    query = "query allOffices{allOffices{uuid name}}"
+
+    def test_all_offices_is_served_from_the_cache(self):
+        office = helpers.create_office()
+        self.client.execute(self.query)
+        with self.assertNumQueries(0):
+            response = self.client.execute(self.query)
+        assert response.data.get("allOffices")[0].get("name") == office.name
+
+    def test_office_mutations_invalidate_the_cache(self):
+        office = helpers.create_office()
+        self.client.execute(self.query)
+        self.client.execute(
+            'mutation { updateOffice(name: "new office", uuid: "%s") { office { uuid } } }'
+            % office.uuid
+        )
+        response = self.client.execute(self.query)
+        assert response.data.get("allOffices")[0].get("name") == "new office"
+
+        self.client.execute(
+            'mutation { deleteOffice(uuid: "%s") { office { uuid } } }' % office.uuid
+        )
+        assert self.client.execute(self.query).data.get("allOffices") == []
+
+    def test_booking_offices_are_loaded_through_the_cache(self):
+        office = helpers.create_office()
+        booking = helpers.create_booking(
+            user=self.user, office=office, booking_date=datetime.date.today()
+        )
+        query = 'mutation { updateBooking(uuid: "%s") { booking { office { name } } } }'
+        self.client.execute(query % booking.uuid)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.execute(query % booking.uuid)
+        data = response.data.get("updateBooking").get("booking")
+        assert data.get("office").get("name") == office.name
+        assert not any(
+            "bookings_office" in query["sql"] for query in context.captured_queries
+        )
+
+    def test_cacheable_get_queries_send_an_etag(self):
+        helpers.create_office()
+        response = self.http_client.get("/graphql", {"query": self.query})
+        assert response["Cache-Control"] == "private, max-age=60"
+        assert response["ETag"]
+
+        response = self.http_client.get(
+            "/graphql", {"query": self.query}, HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        assert response.status_code == 304
+
+    def test_other_queries_are_not_cacheable(self):
+        response = self.http_client.get(
+            "/graphql", {"query": "query { allOffices { uuid } me { username } }"}
+        )
+        assert response.status_code == 200
+        assert not response.has_header("ETag")
+        assert not response.has_header("Cache-Control")
+
+
+class TestTokenCache(helpers.AuthenticatedClientTestCase):
+    def setUp(self):
+        super().setUp()
+        self.token = get_token(self.user)
+
+    def test_tokens_are_verified_once(self):
+        user = get_user_by_token(self.token)
+        with self.assertNumQueries(0):
+            cached = get_user_by_token(self.token)
+        assert cached == user
+        assert cached is not user
+
+    def test_authentication_needs_no_queries_once_cached(self):
+        query = (
+            'query { officeOccupancy(officeId: "%s", from: "2030-01-02", to: "2030-01-01") { date } }'
+            % uuid4()
+        )
+        self.client.execute(query)
+        with self.assertNumQueries(0):
+            response = self.client.execute(query)
+        assert response.errors[0].message == "`to` can't be before `from`"
+
+    def test_changed_users_are_verified_again(self):
+        get_user_by_token(self.token)
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(JSONWebTokenError):
+            get_user_by_token(self.token)
+
+    def test_revoking_a_refresh_token_forgets_the_users_tokens(self):
+        refresh_token = create_refresh_token(self.user)
+        get_user_by_token(self.token)
+        refresh_token.revoke()
+        assert self.token not in token_cache.entries
+
+    def test_tokens_are_forgotten_once_expired(self):
+        cache = TokenCache(max_size=10, timeout=60)
+        cache.set(self.token, self.user, {"exp": time.time() - 1})
+        assert cache.get(self.token) is None
+        with override_settings(
+            GRAPHQL_JWT={**settings.GRAPHQL_JWT, "JWT_VERIFY_EXPIRATION": False}
+        ):
+            cache.set(self.token, self.user, {"exp": time.time() - 1})
+            assert cache.get(self.token) == self.user
+
+    def test_least_recently_used_tokens_are_evicted(self):
+        cache = TokenCache(max_size=2, timeout=60)
+        for token in ["a", "b"]:
+            cache.set(token, self.user, {})
+        cache.get("a")
+        cache.set("c", self.user, {})
+        assert list(cache.entries) == ["a", "c"]
+        cache.forget(self.user)
+        assert not cache.entries and not cache.tokens
+
+
+class TestPasswordHashing(helpers.AuthenticatedClientTestCase):
+    login = """
+    mutation {
+      tokenAuth(username: "hashed", password: "super_secret_password123") {
+        success token
+      }
+    }
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(hashers.pool.shutdown)
+        self.user = helpers.create_user("hashed", "hashed@email.com")
+        self.user.set_password("super_secret_password123")
+        self.user.save()
+        self.user.status.verified = True
+        self.user.status.save()
+
+    def test_passwords_are_hashed_on_the_pool_like_django_does(self):
+        assert hashers.pool.executor is not None
+        assert PBKDF2PasswordHasher().verify(
+            "super_secret_password123", self.user.password
+        )
+        response = self.client.execute(self.login)
+        assert response.errors is None
+        assert response.data["tokenAuth"]["success"]
+
+    def test_register_hashes_on_the_pool(self):
+        hashers.pool.shutdown()
+        response = self.client.execute(
+            """
+            mutation {
+              register(
+                username: "registered", email: "registered@email.com",
+                club: "dekker", squad: "lunar",
+                password1: "super_secret_password123",
+                password2: "super_secret_password123"
+              ) { success }
+            }
+            """
+        )
+        assert response.data["register"]["success"]
+        user = get_user_model().objects.get(username="registered")
+        assert user.check_password("super_secret_password123")
+        assert hashers.pool.executor is not None
+
+    @override_settings(PASSWORD_HASHING_WORKERS=1, PASSWORD_HASHING_QUEUE_SIZE=0)
+    def test_logins_fail_fast_once_the_queue_is_full(self):
+        with ThreadPoolExecutor(1) as executor:
+            busy = executor.submit(hashers.pool.run, time.sleep, 1)
+            while hashers.pool.pending < 1:
+                time.sleep(0.01)
+            response = self.client.execute(self.login)
+            assert response.errors[0].message == hashers.HASHING_BUSY_ERROR
+            assert "password_hashing_queue_depth 1\n" in metrics.render()
+            busy.result()
+        assert hashers.pool.pending == 0
+        response = self.client.execute(self.login)
+        assert response.data["tokenAuth"]["success"]
+
+    @override_settings(PASSWORD_HASHING_WORKERS=1, PASSWORD_HASHING_QUEUE_SIZE=0)
+    def test_hashes_outside_logins_wait_for_no_worker(self):
+        with ThreadPoolExecutor(1) as executor:
+            busy = executor.submit(hashers.pool.run, time.sleep, 1)
+            while hashers.pool.pending < 1:
+                time.sleep(0.01)
+            self.user.set_password("another_password123")
+            busy.result()
+        assert self.user.check_password("another_password123")
+
+    def test_dead_workers_fail_logins_cleanly(self):
+        with mock.patch.object(
+            hashers.pool.executor, "submit", side_effect=BrokenProcessPool
+        ):
+            response = self.client.execute(self.login)
+        assert response.errors[0].message == hashers.HASHING_FAILED_ERROR
+        # the next hashes start a new pool
+        assert hashers.pool.executor is None
+        response = self.client.execute(self.login)
+        assert response.data["tokenAuth"]["success"]
+        # other callers hash in their own thread instead
+        with mock.patch.object(
+            hashers.pool.executor, "submit", side_effect=BrokenProcessPool
+        ):
+            assert self.user.check_password("super_secret_password123")
+
+    @override_settings(PASSWORD_HASHING_WORKERS=0)
+    def test_passwords_are_hashed_inline_without_workers(self):
+        hashers.pool.shutdown()
+        response = self.client.execute(self.login)
+        assert response.data["tokenAuth"]["success"]
+        assert hashers.pool.executor is None
+
+
+class TestAsyncGraphQLView(TransactionTestCase):
+    async def test_async_endpoint_executes_queries_concurrently(self):
+        user, office = await sync_to_async(self.create_user_and_office)()
+        client = AsyncClient()
+        authorization = "%s %s" % (jwt_settings.JWT_AUTH_HEADER_PREFIX, get_token(user))
+        # each query waits for all the others, which only works if they overlap
+        barrier = threading.Barrier(10, timeout=5)
+        get_offices = bookings_schema.get_offices
+
+        def wait_for_the_others():
+            barrier.wait()
+            return get_offices()
+
+        with mock.patch.object(bookings_schema, "get_offices", wait_for_the_others):
+            responses = await asyncio.gather(
+                *[
+                    client.post(
+                        "/graphql/async",
+                        {"query": "query { allOffices { uuid } }"},
+                        content_type="application/json",
+                        authorization=authorization,
+                    )
+                    for _ in range(10)
+                ]
+            )
+        assert not barrier.broken
+        for response in responses:
+            assert response.status_code == 200
+            assert response.json()["data"]["allOffices"] == [{"uuid": str(office.uuid)}]
+
+    @staticmethod
+    def create_user_and_office():
+        cache.clear()
+        return helpers.create_user(), helpers.create_office()
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class TestReadReplicas(TransactionTestCase):
+    query = {"query": "query { allBookings(first: 10) { date } }"}
+
+    def setUp(self):
+        token_cache.clear()
+        self.replica = helpers.Replica()
+        self.addCleanup(self.replica.close)
+        self.user = helpers.create_user()
+        self.office = helpers.create_office()
+        self.replica.sync()
+        self.client = self.create_client()
+
+    def create_client(self):
+        return Client(
+            HTTP_AUTHORIZATION="%s %s"
+            % (jwt_settings.JWT_AUTH_HEADER_PREFIX, get_token(self.user))
+        )
+
+    def post(self, data, client=None):
+        response = (client or self.client).post(
+            "/graphql", json.dumps(data), content_type="application/json"
+        )
+        assert response.status_code == 200, response.content
+        return response
+
+    def create_booking(self):
+        return {
+            "query": 'mutation { createBooking(officeId: "%s", date: "%s") { booking { date office { name } } } }'
+            % (self.office.uuid, datetime.date.today().isoformat())
+        }
+
+    def test_queries_read_from_replicas(self):
+        helpers.create_booking(self.user, self.office, datetime.date.today())
+        assert self.post(self.query).json()["data"]["allBookings"] == []
+        self.replica.sync()
+        assert len(self.post(self.query).json()["data"]["allBookings"]) == 1
+        # anything outside of the GraphQL endpoint reads from the primary
+        assert Booking.objects.all().db == "default"
+
+    def test_clients_read_their_writes_from_the_primary(self):
+        response = self.post(self.create_booking())
+        assert response.json()["data"]["createBooking"]["booking"] == {
+            "date": datetime.date.today().isoformat(),
+            "office": {"name": "office"},
+        }
+        assert Booking.objects.using("default").count() == 1
+        cookie = response.cookies[db.PIN_COOKIE]
+        assert cookie["max-age"] == settings.DATABASE_REPLICATION_LAG
+
+        assert len(self.post(self.query).json()["data"]["allBookings"]) == 1
+        response = self.post(self.query, self.create_client())
+        assert response.json()["data"]["allBookings"] == []
+        assert db.PIN_COOKIE not in response.cookies
+
+    def test_caches_are_filled_from_the_primary(self):
+        helpers.create_office(name="new office")
+        self.user.squad = "orion"
+        self.user.save()
+        response = self.post({"query": "query { allOffices { name } me { squad } }"})
+        assert response.json()["data"] == {
+            "allOffices": [{"name": "new office"}, {"name": "office"}],
+            "me": {"squad": "ORION"},
+        }
+        yesterday = datetime.date.today() - datetime.timedelta(days=1)
+        helpers.create_booking(self.user, self.office, yesterday)
+        archive.archive_bookings(datetime.date.today())
+        cache.delete(archive.ARCHIVED_UNTIL_KEY)
+        with db.read_from_replicas():
+            assert archive.get_archived_until() == yesterday
+
+    def test_batches_read_their_writes(self):
+        response = self.post([self.query, self.create_booking(), self.query])
+        before, _, after = response.json()
+        assert before["data"]["allBookings"] == []
+        assert len(after["data"]["allBookings"]) == 1
+
+    def test_unusable_connections_are_closed(self):
+        connection.ensure_connection()
+        with mock.patch.dict(connection.settings_dict, CONN_HEALTH_CHECKS=True):
+            db.close_unusable_connections()
+            assert connection.connection is not None
+            with mock.patch.object(connection, "is_usable", return_value=False):
+                db.close_unusable_connections()
+        assert connection.connection is None
+
+
+class TestBookingEvents(TransactionTestCase):
+    def test_booking_changes_are_published_to_their_offices(self):
+        user = helpers.create_user()
+        office, other_office = helpers.create_office(), helpers.create_office()
+        received = {office.uuid: [], other_office.uuid: []}
+        backend = events.get_backend()
+        unsubscribes = [
+            backend.subscribe(events.office_channel(uuid), messages.append)
+            for uuid, messages in received.items()
+        ]
+        today = datetime.date.today()
+        try:
+            booking = services.create_booking(
+                Booking(uuid=uuid4(), office=office, user=user, date=today)
+            )
+            previous_key = services.booking_key(booking)
+            booking.office = other_office
+            services.update_booking(booking, previous_key)
+            services.delete_booking(booking)
+        finally:
+            for unsubscribe in unsubscribes:
+                unsubscribe()
+
+        assert [message["kind"] for message in received[office.uuid]] == [
+            events.CREATED,
+            events.UPDATED,
+        ]
+        assert [message["kind"] for message in received[other_office.uuid]] == [
+            events.UPDATED,
+            events.DELETED,
+        ]
+        moved = events.from_message(received[other_office.uuid][0])
+        assert moved["uuid"] == booking.uuid
+        assert moved["office_id"] == other_office.uuid
+        assert moved["previous_office_id"] == office.uuid
+        assert moved["previous_date"] == today
+
+    def test_bulk_deletes_publish_the_bookings_they_deleted(self):
+        office = helpers.create_office()
+        today = datetime.date.today()
+        bookings = [
+            services.create_booking(
+                Booking(uuid=uuid4(), office=office, user=user, date=today)
+            )
+            for user in (
+                helpers.create_user(),
+                helpers.create_user("other", "other@email.com"),
+            )
+        ]
+        received = []
+        unsubscribe = events.get_backend().subscribe(
+            events.office_channel(office.uuid), received.append
+        )
+        try:
+            services.delete_booking(bookings[0])
+            # the other booking of the office day is still deleted
+            assert services.delete_bookings(bookings) == bookings[1:]
+        finally:
+            unsubscribe()
+
+        assert [events.from_message(message)["uuid"] for message in received] == [
+            booking.uuid for booking in bookings
+        ]
+        assert OfficeOccupancy.objects.get(office=office, date=today).count == 0
+
+    def test_events_are_published_only_once_committed(self):
+        user = helpers.create_user()
+        office = helpers.create_office()
+        received = []
+        unsubscribe = events.get_backend().subscribe(
+            events.office_channel(office.uuid), received.append
+        )
+        try:
+            with transaction.atomic():
+                services.create_bookings(
+                    [
+                        Booking(uuid=uuid4(), office=office, user=user, date=day)
+                        for day in [
+                            datetime.date(2030, 1, 1),
+                            datetime.date(2030, 1, 2),
+                        ]
+                    ]
+                )
+                assert received == []
+        finally:
+            unsubscribe()
+        assert [message["date"] for message in received] == ["2030-01-01", "2030-01-02"]
+
+
+@override_settings(GRAPHQL_WS_KEEPALIVE=0)
+class TestBookingSubscriptions(TransactionTestCase):
+    subscription = """
+        subscription bookingEvents($officeId: UUID!, $from: Date!, $to: Date!) {
+            bookingEvents(officeId: $officeId, from: $from, to: $to) {
+                kind
+                booking { uuid date office { name } user { username } }
+                previousDate
+            }
+        }
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = helpers.create_user()
+        self.office = helpers.create_office("office")
+        self.other_office = helpers.create_office("other office")
+        self.today = datetime.date.today()
+
+    async def connect(self, payload=None):
+        from config.asgi import application
+
+        websocket = helpers.WebSocket(application, "/graphql", ["graphql-ws"])
+        assert await websocket.connect() == {
+            "type": "websocket.accept",
+            "subprotocol": "graphql-ws",
+        }
+        await websocket.send_json({"type": "connection_init", "payload": payload})
+        return websocket
+
+    async def subscribe(self, websocket, id="1"):
+        variables = {
+            "officeId": str(self.office.uuid),
+            "from": self.today.isoformat(),
+            "to": (self.today + datetime.timedelta(days=1)).isoformat(),
+        }
+        await websocket.send_json(
+            {
+                "id": id,
+                "type": "start",
+                "payload": {"query": self.subscription, "variables": variables},
+            }
+        )
+
+    def book(self, office, days=0):
+        return services.create_booking(
+            Booking(
+                uuid=uuid4(),
+                office=office,
+                user=self.user,
+                date=self.today + datetime.timedelta(days=days),
+            )
+        )
+
+    async def test_subscribers_receive_events_of_their_office_and_dates(self):
+        websocket = await self.connect({"authToken": get_token(self.user)})
+        assert await websocket.receive_json() == {"type": "connection_ack"}
+        await self.subscribe(websocket)
+        # operations run in order, so once this is answered the subscription
+        # is listening
+        await websocket.send_json(
+            {"id": "2", "type": "start", "payload": {"query": "{ __typename }"}}
+        )
+        assert await websocket.receive_json() == {
+            "type": "data",
+            "id": "2",
+            "payload": {"data": {"__typename": "Query"}},
+        }
+        assert await websocket.receive_json() == {"type": "complete", "id": "2"}
+
+        book = sync_to_async(self.book)
+        await book(self.other_office)
+        await book(self.office, days=2)
+        booking = await book(self.office, days=1)
+        assert await websocket.receive_json() == {
+            "type": "data",
+            "id": "1",
+            "payload": {
+                "data": {
+                    "bookingEvents": {
+                        "kind": "CREATED",
+                        "booking": {
+                            "uuid": str(booking.uuid),
+                            "date": booking.date.isoformat(),
+                            "office": {"name": "office"},
+                            "user": {"username": "user"},
+                        },
+                        "previousDate": None,
+                    }
+                }
+            },
+        }
+
+        await sync_to_async(services.delete_booking)(booking)
+        message = await websocket.receive_json()
+        assert message["payload"]["data"]["bookingEvents"]["kind"] == "DELETED"
+
+        await websocket.send_json({"id": "1", "type": "stop"})
+        assert await websocket.receive_json() == {"type": "complete", "id": "1"}
+        await websocket.close()
+        subscribers = events.get_backend().subscribers
+        assert events.office_channel(self.office.uuid) not in subscribers
+
+    async def test_subscriptions_need_a_logged_in_user(self):
+        websocket = await self.connect()
+        assert await websocket.receive_json() == {"type": "connection_ack"}
+        await self.subscribe(websocket)
+        message = await websocket.receive_json()
+        assert message["type"] == "data"
+        assert message["payload"]["errors"][0]["message"] == "not logged in"
+        await websocket.close()
+
+    async def test_invalid_tokens_close_the_connection(self):
+        websocket = await self.connect({"authToken": "invalid"})
+        message = await websocket.receive_json()
+        assert message["type"] == "connection_error"
+        assert await websocket.receive() == {"type": "websocket.close", "code": 1000}
+
+    async def test_other_protocols_are_refused(self):
+        from config.asgi import application
+
+        websocket = helpers.WebSocket(application, "/graphql", ["graphql-transport-ws"])
+        assert (await websocket.connect())["type"] == "websocket.close"
+
+
+class TestQueryBudgets(helpers.QueryBudgetTestCase):
+    """Run every public operation against a few thousand rows.
+
+    The budgets are what each operation needs today; raise one only when
+    the extra queries or rows are expected.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = datetime.date.today()
+        cls.offices, cls.users = helpers.create_fixtures(start=cls.today)
+
+    def setUp(self):
+        super().setUp()
+        self.office = self.offices[0]
+        self.bookings = [
+            helpers.create_booking(
+                self.user, self.office, self.today + datetime.timedelta(days=day)
+            )
+            for day in range(30, 40)
+        ]
+
+    def date(self, days):
+        return (self.today + datetime.timedelta(days=days)).isoformat()
+
+    def test_all_bookings(self):
+        self.assert_within_budget(
+            "query{allBookings(first: 100){uuid date office{name} user{username}}}",
+            queries=4,
+            rows=102,
+        )
+
+    def test_all_offices(self):
+        self.assert_within_budget(
+            "query{allOffices{uuid name capacity}}", queries=2, rows=11
+        )
+
+    def test_filter_bookings(self):
+        self.assert_within_budget(
+            """
+            query filterBookings($squad: String) {
+              filterBookings(first: 100, user_Squad: $squad) {
+                edges { node { uuid date office { name } user { username squad } } }
+                pageInfo { hasNextPage endCursor }
+              }
+            }
+            """,
+            {"squad": "lunar"},
+            queries=4,
+            rows=103,
+        )
+
+    def test_office_occupancy(self):
+        self.assert_within_budget(
+            """
+            query occupancy($office: UUID!, $from: Date!, $to: Date!) {
+              officeOccupancy(officeId: $office, from: $from, to: $to) {
+                date count capacity squads { squad count }
+              }
+            }
+            """,
+            {
+                "office": str(self.office.uuid),
+                "from": self.date(0),
+                "to": self.date(30),
+            },
+            queries=4,
+            rows=122,
+        )
+
+    def test_me(self):
+        self.assert_within_budget("query{me{username squad}}", queries=1, rows=1)
+
+    def test_create_booking(self):
+        self.assert_within_budget(
+            """
+            mutation createBooking($office: UUID!, $date: Date!) {
+              createBooking(officeId: $office, date: $date) { booking { uuid } }
+            }
+            """,
+            {"office": str(self.office.uuid), "date": self.date(50)},
+            queries=11,
+            rows=2,
+        )
+
+    def test_update_booking(self):
+        self.assert_within_budget(
+            """
+            mutation updateBooking($uuid: UUID!, $office: UUID!) {
+              updateBooking(uuid: $uuid, officeId: $office) { booking { uuid } }
+            }
+            """,
+            {"uuid": str(self.bookings[0].uuid), "office": str(self.offices[1].uuid)},
+            queries=13,
+            rows=3,
+        )
+
+    def test_delete_booking(self):
+        self.assert_within_budget(
+            """
+            mutation deleteBooking($uuid: UUID!) {
+              deleteBooking(uuid: $uuid) { booking { uuid } }
+            }
+            """,
+            {"uuid": str(self.bookings[0].uuid)},
+            queries=8,
+            rows=2,
+        )
+
+    def test_create_bookings(self):
+        self.assert_within_budget(
+            """
+            mutation createBookings($bookings: [BookingInput!]!) {
+              createBookings(bookings: $bookings) {
+                results { error booking { uuid office { name } } }
+              }
+            }
+            """,
+            {
+                "bookings": [
+                    {"officeId": str(office.uuid), "date": self.date(50 + i)}
+                    for i, office in enumerate(self.offices)
+                ]
+            },
+            queries=15,
+            rows=22,
+        )
+
+    def test_update_bookings(self):
+        self.assert_within_budget(
+            """
+            mutation updateBookings($bookings: [BookingUpdateInput!]!) {
+              updateBookings(bookings: $bookings) {
+                results { error booking { uuid office { name } } }
+              }
+            }
+            """,
+            {
+                "bookings": [
+                    {"uuid": str(booking.uuid), "officeId": str(office.uuid)}
+                    for booking, office in zip(self.bookings, self.offices[1:])
+                ]
+            },
+            queries=17,
+            rows=29,
+        )
+
+    def test_delete_bookings(self):
+        self.assert_within_budget(
+            """
+            mutation deleteBookings($uuids: [UUID!]!) {
+              deleteBookings(uuids: $uuids) { results { error } }
+            }
+            """,
+            {"uuids": [str(booking.uuid) for booking in self.bookings]},
+            queries=10,
+            rows=11,
+        )
+
+    def test_office_mutations(self):
+        response = self.assert_within_budget(
+            'mutation{createOffice(name: "new", capacity: 10){office{uuid}}}',
+            queries=2,
+            rows=1,
+        )
+        uuid = response.data["createOffice"]["office"]["uuid"]
+        self.assert_within_budget(
+            'mutation{updateOffice(uuid: "%s", name: "renamed"){office{name}}}' % uuid,
+            queries=3,
+            rows=2,
+        )
+        self.assert_within_budget(
+            'mutation{deleteOffice(uuid: "%s"){office{name}}}' % uuid,
+            queries=6,
+            rows=2,
+        )
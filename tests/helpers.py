@@ -1,12 +1,27 @@
-from datetime import date
+import asyncio
+import json
+import os
+import re
+import tempfile
+from collections import Counter
+from datetime import date, timedelta
+from io import StringIO
 from uuid import uuid4
 
 import pytest
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import Client
+from graphql_jwt.settings import jwt_settings
+from graphql_jwt.shortcuts import get_token
 from graphql_jwt.testcases import JSONWebTokenTestCase
 
+from bookings import presence
 from bookings.models import Office, Booking
+from users.backends import token_cache
 
 
 def create_office(name: str = "office"):
@@ -32,5 +47,232 @@ def create_booking(user: settings.AUTH_USER_MODEL, office: Office, booking_date:
 class AuthenticatedClientTestCase(JSONWebTokenTestCase):
     @pytest.mark.django_db
     def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        presence.index.clear()
         self.user = create_user()
         self.client.authenticate(self.user)
+
+
+class AuthenticatedHTTPClientTestCase(AuthenticatedClientTestCase):
+    def setUp(self):
+        super().setUp()
+        self.http_client = Client(
+            HTTP_AUTHORIZATION="%s %s"
+            % (jwt_settings.JWT_AUTH_HEADER_PREFIX, get_token(self.user))
+        )
+
+    def post_graphql(self, data, **extra):
+        return self.http_client.post(
+            "/graphql", json.dumps(data), content_type="application/json", **extra
+        )
+
+
+class WebSocket:
+    """Talk to an ASGI app over a WebSocket without a server."""
+
+    def __init__(self, app, path, subprotocols=(), headers=()):
+        self.app = app
+        self.scope = {
+            "type": "websocket",
+            "path": path,
+            "subprotocols": list(subprotocols),
+            "headers": list(headers),
+        }
+        self.incoming = asyncio.Queue()
+        self.outgoing = asyncio.Queue()
+        self.task = None
+
+    async def connect(self):
+        self.task = asyncio.ensure_future(
+            self.app(self.scope, self.incoming.get, self.outgoing.put)
+        )
+        await self.incoming.put({"type": "websocket.connect"})
+        return await self.receive()
+
+    async def send_json(self, message):
+        await self.incoming.put(
+            {"type": "websocket.receive", "text": json.dumps(message)}
+        )
+
+    async def receive(self, timeout=5):
+        return await asyncio.wait_for(self.outgoing.get(), timeout)
+
+    async def receive_json(self, timeout=5):
+        message = await self.receive(timeout)
+        assert message["type"] == "websocket.send", message
+        return json.loads(message["text"])
+
+    async def close(self):
+        await self.incoming.put({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait_for(self.task, 5)
+
+
+def create_fixtures(offices=10, users=50, days=20, start=None):
+    """Bulk create offices and users with a booking for every user each day."""
+    start = start or date.today()
+    offices = Office.objects.bulk_create(
+        Office(uuid=uuid4(), name="office %02d" % i, capacity=users)
+        for i in range(offices)
+    )
+    squads = get_user_model().Squad.values
+    get_user_model().objects.bulk_create(
+        get_user_model()(
+            username="fixture%s" % i,
+            email="fixture%s@email.com" % i,
+            squad=squads[i % len(squads)],
+        )
+        for i in range(users)
+    )
+    # SQLite doesn't return the ids of bulk inserted rows
+    users = list(
+        get_user_model().objects.filter(username__startswith="fixture").order_by("id")
+    )
+    Booking.objects.bulk_create(
+        (
+            Booking(
+                uuid=uuid4(),
+                user=user,
+                office=offices[(i + day) % len(offices)],
+                date=start + timedelta(days=day),
+            )
+            for i, user in enumerate(users)
+            for day in range(days)
+        ),
+        batch_size=500,
+    )
+    call_command("rebuild_occupancy", stdout=StringIO())
+    return offices, users
+
+
+class Replica:
+    """A SQLite file standing in for a read replica of the test database.
+
+    It holds what was committed to the test database when ``sync`` was
+    last called, as a replica lagging behind would.
+    """
+
+    def __init__(self, alias="replica"):
+        self.alias = alias
+        self.directory = tempfile.TemporaryDirectory()
+        connections.databases[alias] = {
+            **connections.databases[DEFAULT_DB_ALIAS],
+            "NAME": os.path.join(self.directory.name, "replica.sqlite3"),
+        }
+
+    def sync(self):
+        primary, replica = connections[DEFAULT_DB_ALIAS], connections[self.alias]
+        primary.ensure_connection()
+        replica.ensure_connection()
+        primary.connection.backup(replica.connection)
+
+    def close(self):
+        connections[self.alias].close()
+        del connections[self.alias]
+        del connections.databases[self.alias]
+        self.directory.cleanup()
+
+
+class RowCountingCursor:
+    def __init__(self, cursor, query):
+        self.cursor = cursor
+        self.query = query
+
+    def fetchone(self):
+        row = self.cursor.fetchone()
+        if row is not None:
+            self.query["rows"] += 1
+        return row
+
+    def fetchmany(self, *args):
+        rows = self.cursor.fetchmany(*args)
+        self.query["rows"] += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self.cursor.fetchall()
+        self.query["rows"] += len(rows)
+        return rows
+
+    def __iter__(self):
+        for row in self.cursor:
+            self.query["rows"] += 1
+            yield row
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+
+def query_shape(sql):
+    """``sql`` with its literals and lists of parameters collapsed."""
+    sql = re.sub(r"'(?:[^']|'')*'|\b\d+\b|%s", "?", sql)
+    return re.sub(r"IN \((?:\?, )*\?\)", "IN (...)", sql)
+
+
+class QueryRecorder:
+    """Record the SQL run in the block and how many rows each fetched."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        query = {"sql": sql, "rows": 0}
+        self.queries.append(query)
+        result = execute(sql, params, many, context)
+        context["cursor"].cursor = RowCountingCursor(context["cursor"].cursor, query)
+        return result
+
+    def __enter__(self):
+        self.wrapper = connection.execute_wrapper(self)
+        self.wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.wrapper.__exit__(*exc_info)
+
+    @property
+    def rows(self):
+        return sum(query["rows"] for query in self.queries)
+
+    def shapes(self):
+        shapes = Counter()
+        rows = Counter()
+        for query in self.queries:
+            shape = query_shape(query["sql"])
+            shapes[shape] += 1
+            rows[shape] += query["rows"]
+        return [
+            "%sx, %s rows: %s" % (count, rows[shape], shape)
+            for shape, count in shapes.most_common()
+        ]
+
+
+class QueryBudgetTestCase(AuthenticatedClientTestCase):
+    """Test case asserting how much SQL operations may run.
+
+    Operations over their budget of queries or fetched rows fail with the
+    shape of every query they ran, most frequent first.
+    """
+
+    def assert_within_budget(self, query, variables=None, *, queries, rows):
+        with QueryRecorder() as recorder:
+            response = self.client.execute(query, variables)
+        assert response.errors is None, response.errors
+        failures = []
+        if len(recorder.queries) > queries:
+            failures.append(
+                "ran %s queries, over the budget of %s"
+                % (len(recorder.queries), queries)
+            )
+        if recorder.rows > rows:
+            failures.append(
+                "fetched %s rows, over the budget of %s" % (recorder.rows, rows)
+            )
+        if failures:
+            pytest.fail(
+                "\n".join(
+                    ["Operation %s:" % " and ".join(failures)] + recorder.shapes()
+                ),
+                pytrace=False,
+            )
+        return response
@@ -0,0 +1,128 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from graphql_jwt.backends import JSONWebTokenBackend
+from graphql_jwt.refresh_token.signals import refresh_token_revoked
+from graphql_jwt.settings import jwt_settings
+from graphql_jwt.utils import get_credentials, get_payload, get_user_by_payload
+
+from config.db import read_from_primary
+
+
+class TokenCache:
+    """A bounded LRU map of verified tokens to snapshots of their user.
+
+    Entries last ``timeout`` seconds at most, and never outlive the token
+    when ``JWT_VERIFY_EXPIRATION`` is on. Each process has its own cache,
+    so users changed or logged out in another process are seen within
+    ``timeout`` seconds.
+    """
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        # the tokens of each user id and username, to forget them together
+        self.tokens = {}
+
+    def get(self, token):
+        with self.lock:
+            entry = self.entries.get(token)
+            if entry is None:
+                return None
+            expires, user = entry
+            if expires <= time.time():
+                self.remove(token)
+                return None
+            self.entries.move_to_end(token)
+        # requests may change their user, never the cached one
+        return copy.copy(user)
+
+    def set(self, token, user, payload):
+        if not self.timeout or not self.max_size:
+            return
+        expires = time.time() + self.timeout
+        if jwt_settings.JWT_VERIFY_EXPIRATION and "exp" in payload:
+            leeway = jwt_settings.JWT_LEEWAY
+            if isinstance(leeway, timedelta):
+                leeway = leeway.total_seconds()
+            expires = min(expires, payload["exp"] + leeway)
+        with self.lock:
+            self.remove(token)
+            self.entries[token] = (expires, copy.copy(user))
+            for key in user_keys(user):
+                self.tokens.setdefault(key, set()).add(token)
+            while len(self.entries) > self.max_size:
+                self.remove(next(iter(self.entries)))
+
+    def remove(self, token):
+        _, user = self.entries.pop(token, (None, None))
+        if user is None:
+            return
+        for key in user_keys(user):
+            tokens = self.tokens.get(key, set())
+            tokens.discard(token)
+            if not tokens:
+                self.tokens.pop(key, None)
+
+    def forget(self, user):
+        """Drop the tokens of ``user``, by id as well as by username."""
+        with self.lock:
+            for key in user_keys(user):
+                for token in list(self.tokens.get(key, ())):
+                    self.remove(token)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.tokens.clear()
+
+
+def user_keys(user):
+    return [("id", user.pk), ("username", user.get_username())]
+
+
+token_cache = TokenCache(settings.JWT_CACHE_MAX_SIZE, settings.JWT_CACHE_TIMEOUT)
+
+
+def get_user_by_token(token, context=None):
+    """Verify ``token`` and return its user, from ``token_cache`` if there."""
+    user = token_cache.get(token)
+    if user is None:
+        payload = get_payload(token, context)
+        with read_from_primary():
+            user = get_user_by_payload(payload)
+        if user is not None:
+            token_cache.set(token, user, payload)
+    return user
+
+
+class CachedJSONWebTokenBackend(JSONWebTokenBackend):
+    """``JSONWebTokenBackend`` skipping verification of recently seen tokens."""
+
+    def authenticate(self, request=None, **kwargs):
+        if request is None or getattr(request, "_jwt_token_auth", False):
+            return None
+        token = get_credentials(request, **kwargs)
+        if token is None:
+            return None
+        return get_user_by_token(token, request)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def user_changed(sender, instance, **kwargs):
+    token_cache.forget(instance)
+
+
+@receiver(refresh_token_revoked)
+def refresh_token_was_revoked(sender, refresh_token, **kwargs):
+    token_cache.forget(refresh_token.user)
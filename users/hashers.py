@@ -0,0 +1,119 @@
+import contextvars
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from graphql import GraphQLError
+
+from config import metrics
+
+HASHING_BUSY_ERROR = "Too many logins at once, try again in a moment"
+HASHING_FAILED_ERROR = "Couldn't check the password, try again in a moment"
+
+# whether hashes fail rather than wait once the pool is busy
+fail_fast = contextvars.ContextVar("password_hashing_fail_fast", default=False)
+
+
+class HashingBusyError(GraphQLError):
+    def __init__(self):
+        super().__init__(
+            HASHING_BUSY_ERROR, extensions={"code": "PASSWORD_HASHING_BUSY"}
+        )
+
+
+class HashingFailedError(GraphQLError):
+    def __init__(self):
+        super().__init__(
+            HASHING_FAILED_ERROR, extensions={"code": "PASSWORD_HASHING_FAILED"}
+        )
+
+
+@contextmanager
+def failing_fast():
+    """Turn hashes made within away with ``HashingBusyError`` once the pool
+    is busy, and with ``HashingFailedError`` when a worker dies."""
+    token = fail_fast.set(True)
+    try:
+        yield
+    finally:
+        fail_fast.reset(token)
+
+
+class HashingPool:
+    """Run password hashes on a pool of worker processes.
+
+    Hashes are slow on purpose, so a burst of logins or sign-ups would
+    otherwise take every CPU and request thread of the process from the
+    requests around them. At most ``PASSWORD_HASHING_WORKERS`` hashes run
+    at once and ``PASSWORD_HASHING_QUEUE_SIZE`` more wait for a worker.
+    Further ones fail straight away within ``failing_fast``, as do those
+    of a worker that died, and otherwise run in the calling thread, as
+    they do with no workers.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.executor = None
+        self.pending = 0
+
+    def run(self, fn, *args):
+        workers = settings.PASSWORD_HASHING_WORKERS
+        if not workers:
+            return fn(*args)
+        with self.lock:
+            if self.pending >= workers + settings.PASSWORD_HASHING_QUEUE_SIZE:
+                executor = None
+            else:
+                if self.executor is None:
+                    # forking a process running threads may copy their held locks
+                    self.executor = ProcessPoolExecutor(
+                        workers, mp_context=multiprocessing.get_context("spawn")
+                    )
+                executor = self.executor
+                self.set_pending(self.pending + 1)
+        if executor is None:
+            if fail_fast.get():
+                raise HashingBusyError()
+            return fn(*args)
+        try:
+            return executor.submit(fn, *args).result()
+        except BrokenProcessPool:
+            # a worker died, start a new pool for the next hashes
+            with self.lock:
+                if self.executor is executor:
+                    self.executor = None
+            executor.shutdown(wait=False)
+        finally:
+            with self.lock:
+                self.set_pending(self.pending - 1)
+        if fail_fast.get():
+            raise HashingFailedError()
+        return fn(*args)
+
+    def set_pending(self, pending):
+        self.pending = pending
+        metrics.password_hashing_queue_depth.set(pending)
+
+    def shutdown(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown()
+
+
+pool = HashingPool()
+
+
+def encode(password, salt, iterations):
+    return PBKDF2PasswordHasher().encode(password, salt, iterations)
+
+
+class PooledPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """``PBKDF2PasswordHasher`` hashing on ``pool``, with the same hashes."""
+
+    def encode(self, password, salt, iterations=None):
+        return pool.run(encode, password, salt, iterations or self.iterations)
@@ -0,0 +1,111 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.test import Client, override_settings
+
+from bookings import benchmark
+from users.hashers import HASHING_BUSY_ERROR, pool
+
+BOOKINGS_QUERY = json.dumps(
+    {"query": "query { allBookings(first: 20) { uuid date office { name } } }"}
+)
+
+LOGIN_QUERY = """
+mutation login($username: String!, $password: String!) {
+  tokenAuth(username: $username, password: $password) { success token }
+}
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the latency of booking queries on their own and during a "
+        "storm of tokenAuth logins, with passwords hashed in the request "
+        "threads and on the hashing pool, on a throwaway database. Prints "
+        "the results as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--logins", type=int, default=400)
+        parser.add_argument("--concurrency", type=int, default=32)
+        parser.add_argument("--bookings", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        results = {}
+        with benchmark.test_database():
+            _, users = benchmark.create_org(users=100, bookings=options["bookings"])
+            authorization = benchmark.authorization(users[0])
+            results["idle"] = {"bookings": self.query(authorization, **options)}
+            pooled = settings.PASSWORD_HASHING_WORKERS
+            for name, workers in [("inline", 0), ("pool", pooled)]:
+                with override_settings(PASSWORD_HASHING_WORKERS=workers):
+                    # spawn the workers before the storm is timed
+                    self.login(users[0])
+                    results[name] = self.storm(users, authorization, **options)
+                pool.shutdown()
+        results["peak_rss_mb"] = benchmark.peak_rss_mb()
+        self.stdout.write(benchmark.dump(results))
+
+    def storm(self, users, authorization, **options):
+        timer = benchmark.Timer()
+        rejected = []
+        done = threading.Event()
+
+        def login(i):
+            if done.is_set():
+                return
+            with timer.time():
+                busy = self.login(users[i % len(users)])
+            rejected.append(busy)
+            close_old_connections()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(options["concurrency"]) as executor:
+            futures = [executor.submit(login, i) for i in range(options["logins"])]
+            bookings = self.query(authorization, **options)
+            # what is left of the storm is not measured against anything
+            done.set()
+            for future in futures:
+                future.result()
+        logins = benchmark.summarize(
+            timer.latencies, time.perf_counter() - start, errors=sum(rejected)
+        )
+        return {"bookings": bookings, "logins": logins}
+
+    @staticmethod
+    def query(authorization, **options):
+        timer = benchmark.Timer()
+        start = time.perf_counter()
+        for _ in range(options["requests"]):
+            with timer.time():
+                response = Client().post(
+                    "/graphql",
+                    BOOKINGS_QUERY,
+                    content_type="application/json",
+                    HTTP_AUTHORIZATION=authorization,
+                )
+            assert "errors" not in response.json(), response.content
+        close_old_connections()
+        return benchmark.summarize(timer.latencies, time.perf_counter() - start)
+
+    @staticmethod
+    def login(user):
+        """Log ``user`` in, returning whether the hashing pool turned it away."""
+        variables = {"username": user.username, "password": benchmark.PASSWORD}
+        response = Client().post(
+            "/graphql",
+            json.dumps({"query": LOGIN_QUERY, "variables": variables}),
+            content_type="application/json",
+        )
+        response = response.json()
+        if "errors" in response:
+            assert response["errors"][0]["message"] == HASHING_BUSY_ERROR, response
+            return True
+        assert response["data"]["tokenAuth"]["success"], response
+        return False
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.16 on 2026-10-18 12:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_alter_extendeduser_squad'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='extendeduser',
+            index=models.Index(fields=['squad'], name='user_squad_idx'),
+        ),
+    ]
@@ -23,3 +23,6 @@ class ExtendedUser(AbstractUser):
 
     SQUAD_FIELD = "squad"
     CLUB_FIELD = "club"
+
+    class Meta(AbstractUser.Meta):
+        indexes = [models.Index(fields=["squad"], name="user_squad_idx")]
@@ -3,12 +3,27 @@ import graphene
 from graphql_auth import mutations
 from graphql_auth.schema import UserQuery, MeQuery
 
+from users.hashers import failing_fast
+
 
 class AuthQuery(UserQuery, MeQuery, graphene.ObjectType):
     pass
 
 
+def fail_fast_when_busy(field):
+    """Turn ``field`` away with a GraphQL error when passwords can't be
+    hashed straight away, rather than hold up its request."""
+    resolve = field.resolver
+
+    def resolver(*args, **kwargs):
+        with failing_fast():
+            return resolve(*args, **kwargs)
+
+    field.resolver = resolver
+    return field
+
+
 class AuthMutation(graphene.ObjectType):
-    register = mutations.Register.Field()
+    register = fail_fast_when_busy(mutations.Register.Field())
     verify_account = mutations.VerifyAccount.Field()
-    token_auth = mutations.ObtainJSONWebToken.Field()
+    token_auth = fail_fast_when_busy(mutations.ObtainJSONWebToken.Field())